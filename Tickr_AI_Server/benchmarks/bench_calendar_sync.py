@@ -0,0 +1,104 @@
+"""/sync_events against the fake Calendar: API calls per sync versus re-inserting every ticket.
+
+Run from Tickr_AI_Server/:
+    python benchmarks/bench_calendar_sync.py --tickets 1000 --changed 10
+
+Syncs the same ticket set repeatedly through the real endpoint: a first sync, an unchanged re-sync,
+a re-sync after a few tickets changed (plus one edited and one deleted in Calendar), and a full-set
+sync that drops tickets. Reports Calendar calls, HTTP round trips and time for each, next to what
+/create_events costs to "re-sync" by inserting everything again.
+"""
+import argparse
+import asyncio
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+# Keep the server's on-disk state out of the working tree
+_STATE_DIR = tempfile.mkdtemp(prefix="tickr-bench-")
+atexit.register(shutil.rmtree, _STATE_DIR, ignore_errors=True)
+os.environ.setdefault("TOKEN_STORE_PATH", os.path.join(_STATE_DIR, "tokens.sqlite3"))
+os.environ.setdefault("JOB_QUEUE_PATH", os.path.join(_STATE_DIR, "jobs.sqlite3"))
+os.environ.setdefault("GEMINI_API_KEY", "offline-benchmark")
+os.environ.setdefault("CALENDAR_RPM", "10000000")
+
+from fakes import FakeCalendarService, FakeCalendarServices
+
+
+def make_tickets(count: int, revision: int = 0, changed: int = 0):
+    from models import Ticket
+
+    return [
+        Ticket(
+            id=f"ticket-{i}",
+            title=f"Task {i}" + (f" (rev {revision})" if i < changed else ""),
+            assignee=f"user{i % 7}",
+            due_date=f"2025-06-{i % 28 + 1:02d}T17:00:00.000Z",
+            priority="MID",
+            description=f"Work item {i}",
+        )
+        for i in range(count)
+    ]
+
+
+async def measure(service: FakeCalendarService, label: str, call) -> dict:
+    calls, trips = sum(service.calls.values()), service.round_trips
+    start = time.perf_counter()
+    response = await call()
+    return {
+        "step": label,
+        "calls": sum(service.calls.values()) - calls,
+        "round_trips": service.round_trips - trips,
+        "ms": (time.perf_counter() - start) * 1000,
+        "message": response.get("message", ""),
+    }
+
+
+async def main_async(args):
+    import main
+    from models import BulkInsertEventRequest, SyncEventsRequest
+
+    service = FakeCalendarService(latency=args.calendar_latency)
+    main.calendar_services = FakeCalendarServices(service)
+    tickets = make_tickets(args.tickets)
+
+    def sync(tickets, delete_missing=False):
+        return lambda: main.sync_events(SyncEventsRequest(user_id="bench", tickets=tickets, delete_missing=delete_missing))
+
+    rows = [
+        await measure(service, "first sync", sync(tickets)),
+        await measure(service, "unchanged re-sync", sync(tickets)),
+    ]
+    event_ids = [record.event_id for record in main.calendar_sync_store.load("bench").records.values()]
+    service.edit(event_ids[-1], location="Room 4")
+    service.remove(event_ids[-2])
+    rows.append(await measure(service, f"{args.changed} changed", sync(make_tickets(args.tickets, 1, args.changed))))
+    rows.append(await measure(
+        service, "drop 10% (full set)", sync(make_tickets(args.tickets * 9 // 10, 1, args.changed), delete_missing=True)
+    ))
+    rows.append(await measure(
+        service, "create_events again", lambda: main.create_events(BulkInsertEventRequest(user_id="bench", tickets=tickets))
+    ))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tickets", type=int, default=1000, help="Tickets in the synced set")
+    parser.add_argument("--changed", type=int, default=10, help="Tickets changed between syncs")
+    parser.add_argument("--calendar-latency", type=float, default=0.05, help="Fake Calendar round-trip time in seconds")
+    args = parser.parse_args()
+
+    rows = asyncio.run(main_async(args))
+    print(f"{'step':<22}{'calls':>8}{'trips':>8}{'ms':>10}  result")
+    for row in rows:
+        print(f"{row['step']:<22}{row['calls']:>8}{row['round_trips']:>8}{row['ms']:>10.1f}  {row['message']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""Provider-side prompt caching against a local fake CacheService: lifecycle checks and prompt size saved.
+
+Run from Tickr_AI_Server/:
+    python benchmarks/bench_context_cache.py -n 200
+
+Walks one cache through create, reuse, TTL renewal, invalidation after a prompt file edit, provider-side
+eviction, expiry and a prefix below the minimum cacheable size, then compares the characters sent per
+request with and without caching. Exits 1 if any lifecycle step misbehaves.
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from context_cache import ContextCachedModel, ContextCacheManager
+from fakes import FakeContextCacheBackend, FakeLLM, make_history
+from ingest import format_line
+from models import PromptType
+from prompts import PROMPTS_DIR, PromptRegistry
+
+MODEL = "gemini-2.0-flash"
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+async def run(args) -> int:
+    prompts_dir = tempfile.mkdtemp(prefix="tickr-prompts-")
+    shutil.rmtree(prompts_dir)
+    shutil.copytree(PROMPTS_DIR, prompts_dir)
+    try:
+        clock = Clock()
+        backend = FakeContextCacheBackend(clock=clock)
+        manager = ContextCacheManager(backend, ttl=args.ttl, renew_margin=args.ttl / 10, retry_interval=args.ttl, clock=clock)
+        llm = FakeLLM(latency=0.0, context_caches=backend)
+        model = ContextCachedModel(MODEL, llm, llm, manager)
+        registry = PromptRegistry(prompts_dir, check_interval=0.0)
+        chat = "\n".join(format_line(msg) for msg in make_history(args.messages))
+        failures = []
+
+        def check(step: str, ok: bool) -> None:
+            print(f"  {'ok  ' if ok else 'FAIL'} {step}")
+            if not ok:
+                failures.append(step)
+
+        def prompt(split: bool = True):
+            compiled = registry.get(PromptType.TICKETS)
+            fmt = compiled.format_split if split else compiled.format
+            return fmt(chat, counts=3, timestamp="2024-02-20T09:00:00", days_of_week="TUESDAY")
+
+        print("lifecycle:")
+        first = prompt()
+        check("split prompt keeps the static prefix byte-identical", first.static == prompt().static)
+        await model.ainvoke(first)
+        check("first request creates a cache", backend.created == 1)
+
+        for _ in range(args.requests):
+            await model.ainvoke(prompt())
+        check("later requests reuse it", backend.created == 1 and llm.calls == args.requests + 1)
+
+        clock.now += args.ttl * 0.95
+        await model.ainvoke(prompt())
+        check("TTL is renewed near expiry", backend.renewed == 1 and backend.created == 1)
+
+        path = os.path.join(prompts_dir, "tickets.inp")
+        with open(path, "a", encoding="utf-8") as f:
+            f.write("\nKeep titles under 80 characters.\n")
+        os.utime(path, (clock.now, os.stat(path).st_mtime + 10))
+        await model.ainvoke(prompt())
+        check("prompt file edit invalidates the old cache", backend.deleted == 1 and backend.created == 2)
+
+        backend.caches.clear()
+        calls = llm.calls
+        await model.ainvoke(prompt())
+        check("provider eviction falls back to the full prompt", llm.calls == calls + 1)
+        await model.ainvoke(prompt())
+        check("and the next request recreates the cache", backend.created == 3)
+
+        clock.now += args.ttl * 2
+        await model.ainvoke(prompt())
+        check("an expired handle is recreated", backend.created == 4)
+
+        small = FakeContextCacheBackend(min_chars=10 ** 6, clock=clock)
+        small_manager = ContextCacheManager(small, ttl=args.ttl, retry_interval=args.ttl, clock=clock)
+        small_llm = FakeLLM(latency=0.0, context_caches=small)
+        small_model = ContextCachedModel(MODEL, small_llm, small_llm, small_manager)
+        for _ in range(3):
+            await small_model.ainvoke(prompt())
+        check("a prefix below the minimum size is sent in full", small_llm.calls == 3 and small.created == 0)
+        check("and creation is not retried on every request", small_manager.stats()["backing_off"] == 1)
+
+        full = len(prompt(split=False))
+        split = prompt()
+        print(
+            f"\nprompt: {full} chars in full, {len(split.dynamic)} sent with the prefix cached "
+            f"({len(split.static)} cached, {len(split.static) / len(split):.0%} of the prompt)"
+        )
+        print(f"  ~{(full - len(split.dynamic)) // 4} fewer input tokens billed at the full rate per request")
+        for failure in failures:
+            print(f"REGRESSION {failure}")
+        return 1 if failures else 0
+    finally:
+        shutil.rmtree(prompts_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", "--requests", type=int, default=200, help="Requests served from one cache")
+    parser.add_argument("--messages", type=int, default=40, help="Chat messages per request")
+    parser.add_argument("--ttl", type=float, default=3600.0, help="Cache TTL in (simulated) seconds")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    main()
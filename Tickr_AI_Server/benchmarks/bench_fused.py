@@ -0,0 +1,92 @@
+"""Fused extraction vs three separate calls: /ticket, /summary and /overview over the same chat.
+
+Run from Tickr_AI_Server/:
+    python benchmarks/bench_fused.py --chats 20 --messages 200
+
+For each chat the bot's three commands run back to back, first as separate TICKETS, SUMMARY and
+LONG_OVERVIEW extractions, then with `fused` set so one COMBINED call serves all three. Reports model
+calls, estimated input/output tokens and wall time per chat for both modes.
+"""
+import argparse
+import asyncio
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+# Keep the server's on-disk state out of the working tree
+_STATE_DIR = tempfile.mkdtemp(prefix="tickr-bench-")
+atexit.register(shutil.rmtree, _STATE_DIR, ignore_errors=True)
+os.environ.setdefault("TOKEN_STORE_PATH", os.path.join(_STATE_DIR, "tokens.sqlite3"))
+os.environ.setdefault("JOB_QUEUE_PATH", os.path.join(_STATE_DIR, "jobs.sqlite3"))
+os.environ.setdefault("GEMINI_API_KEY", "offline-benchmark")
+
+from fakes import FakeLLM, make_history
+
+COMMANDS = ("TICKETS", "SUMMARY", "LONG_OVERVIEW")
+
+
+async def run_mode(main, llm: FakeLLM, args, fused: bool, seed_offset: int) -> dict:
+    from models import ChatRequest
+
+    calls, input_tokens, output_tokens = llm.calls, llm.input_tokens, llm.output_tokens
+    start = time.perf_counter()
+    for chat in range(args.chats):
+        messages = make_history(args.messages, seed=seed_offset + chat)
+        for command in COMMANDS:
+            request = ChatRequest(
+                messages=messages,
+                prompt_type=command,
+                counts=args.counts,
+                timestamp="2024-02-20T09:00:00",
+                days_of_week="TUESDAY",
+                fused=fused,
+            )
+            await main.run_extraction(request)
+    elapsed = time.perf_counter() - start
+    return {
+        "mode": "fused" if fused else "separate",
+        "calls": (llm.calls - calls) / args.chats,
+        "input_tokens": (llm.input_tokens - input_tokens) / args.chats,
+        "output_tokens": (llm.output_tokens - output_tokens) / args.chats,
+        "ms": elapsed / args.chats * 1000,
+    }
+
+
+async def main_async(args):
+    import main
+
+    llm = FakeLLM(latency=args.llm_latency, output_token_latency=args.token_latency)
+    main.llm_router.backends = {name: llm for name in main.llm_router.backends}
+    # Distinct chats per mode so neither run is served from the other's response cache
+    return [await run_mode(main, llm, args, fused=False, seed_offset=0), await run_mode(main, llm, args, fused=True, seed_offset=10_000)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chats", type=int, default=20, help="Chats to run the three commands over")
+    parser.add_argument("--messages", type=int, default=200, help="Messages per chat")
+    parser.add_argument("--counts", type=int, default=3, help="Tickets asked for by /ticket")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="Fake model time to first token in seconds")
+    parser.add_argument("--token-latency", type=float, default=0.002, help="Fake model seconds per output token")
+    args = parser.parse_args()
+
+    results = asyncio.run(main_async(args))
+    print(f"{'mode':<10}{'calls':>8}{'in tok':>10}{'out tok':>10}{'total tok':>11}{'ms/chat':>10}")
+    for result in results:
+        total = result["input_tokens"] + result["output_tokens"]
+        print(
+            f"{result['mode']:<10}{result['calls']:>8.1f}{result['input_tokens']:>10.0f}"
+            f"{result['output_tokens']:>10.0f}{total:>11.0f}{result['ms']:>10.1f}"
+        )
+    separate, fused = results
+    saved = 1 - (fused["input_tokens"] + fused["output_tokens"]) / (separate["input_tokens"] + separate["output_tokens"])
+    print(f"fused: {saved:.0%} fewer tokens, {separate['ms'] / fused['ms']:.2f}x faster per chat")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""Per-request prompt construction overhead: file read + template build vs the precompiled registry.
+
+Run from Tickr_AI_Server/:  python benchmarks/bench_prompts.py [-n 2000]
+"""
+import argparse
+import datetime
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from langchain_core.output_parsers import PydanticOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+
+from models import PromptType
+from prompts import DEFAULT_HUMAN, HUMAN_TEMPLATES, PROMPT_FILES, PROMPTS_DIR, PromptRegistry, output_model
+
+CHAT_SLICE = "\n".join(f"- user{i % 5}#000{i % 5}: message number {i} about the login page" for i in range(200))
+
+
+def legacy_format(prompt_type: PromptType) -> str:
+    # What /extract did before the registry: read the file, rebuild the template and format instructions
+    with open(os.path.join(PROMPTS_DIR, PROMPT_FILES[prompt_type]), "r", encoding="utf-8") as f:
+        system_prompt = f.read()
+    parser = PydanticOutputParser(pydantic_object=output_model(prompt_type))
+    now = datetime.datetime.now()
+    template = ChatPromptTemplate.from_messages([
+        ("system", system_prompt),
+        ("human", HUMAN_TEMPLATES.get(prompt_type, DEFAULT_HUMAN)),
+    ]).partial(
+        today=datetime.date.today().isoformat(),
+        counts=3,
+        timestamp=now.isoformat(),
+        days_of_week=now.strftime("%A").upper(),
+        existing_tickets="",
+    )
+    return template.format(chat_slice=CHAT_SLICE, format_instructions=parser.get_format_instructions())
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("-n", "--number", type=int, default=2000, help="Iterations per prompt type")
+    args = arg_parser.parse_args()
+
+    registry = PromptRegistry()
+    registry.load_all()
+
+    print(f"{'prompt type':<16}{'before (us)':>14}{'after (us)':>14}{'speedup':>10}")
+    for prompt_type in PROMPT_FILES:
+        before = timeit.timeit(lambda: legacy_format(prompt_type), number=args.number) / args.number
+        after = timeit.timeit(lambda: registry.get(prompt_type).format(CHAT_SLICE), number=args.number) / args.number
+        print(f"{prompt_type.value:<16}{before * 1e6:>14.1f}{after * 1e6:>14.1f}{before / after:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
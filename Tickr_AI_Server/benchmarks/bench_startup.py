@@ -0,0 +1,128 @@
+"""Cold-start benchmark: how long `import main` takes in a fresh interpreter, and what it pulls in.
+
+Run from Tickr_AI_Server/:
+    python benchmarks/bench_startup.py --runs 5
+
+Fails (exit 1) when import time exceeds --max-ms or regresses past --baseline, or when a module
+that should load lazily (see --lazy) is imported at startup.
+"""
+import argparse
+import json
+import os
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+from typing import Dict, List
+
+SERVER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# Loaded on first use of a route or by the background warm-up, never by `import main`
+LAZY_MODULES = (
+    "langchain_google_genai",
+    "langchain_core",
+    "langsmith",
+    "googleapiclient.discovery",
+    "google_auth_oauthlib",
+    "google_auth_httplib2",
+)
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import main
+elapsed = time.perf_counter() - start
+lazy = sys.argv[1].split(",") if sys.argv[1] else []
+print(json.dumps({"import_ms": elapsed * 1000, "modules": len(sys.modules), "eager": [m for m in lazy if m in sys.modules]}))
+"""
+
+_IMPORTTIME = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)$")
+
+
+def probe_env(state_dir: str) -> Dict[str, str]:
+    env = dict(os.environ)
+    # Keep the server's on-disk state out of the working tree
+    env.setdefault("TOKEN_STORE_PATH", os.path.join(state_dir, "tokens.sqlite3"))
+    env.setdefault("JOB_QUEUE_PATH", os.path.join(state_dir, "jobs.sqlite3"))
+    env.setdefault("GEMINI_API_KEY", "offline-benchmark")
+    return env
+
+
+def run_probe(env: Dict[str, str], lazy: List[str]) -> dict:
+    out = subprocess.run(
+        [sys.executable, "-c", _PROBE, ",".join(lazy)], cwd=SERVER_DIR, env=env, capture_output=True, text=True, check=True
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def slowest_imports(env: Dict[str, str], top: int) -> List[dict]:
+    """Direct imports of `main` ranked by cumulative time, from `python -X importtime`."""
+    out = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"], cwd=SERVER_DIR, env=env, capture_output=True, text=True, check=True
+    )
+    rows = []
+    for line in out.stderr.splitlines():
+        match = _IMPORTTIME.match(line)
+        # Depth 1 below main: two spaces of indentation in the importtime tree
+        if match and len(match[3]) == 3:
+            rows.append({"module": match[4], "cumulative_ms": int(match[2]) / 1000})
+    return sorted(rows, key=lambda row: row["cumulative_ms"], reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters to time")
+    parser.add_argument("--top", type=int, default=10, help="Slowest direct imports to list")
+    parser.add_argument("--lazy", default=",".join(LAZY_MODULES), help="Modules that must not be imported by `import main`")
+    parser.add_argument("--output", help="Write a JSON report here")
+    parser.add_argument("--baseline", help="JSON report to compare the median import time against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown vs baseline")
+    parser.add_argument("--max-ms", type=float, default=0.0, help="Absolute limit for the median import time")
+    args = parser.parse_args()
+    lazy = [module for module in args.lazy.split(",") if module]
+
+    state_dir = tempfile.mkdtemp(prefix="tickr-startup-")
+    try:
+        env = probe_env(state_dir)
+        # The first run warms the OS file cache and writes .pyc files; it is not counted
+        run_probe(env, lazy)
+        probes = [run_probe(env, lazy) for _ in range(args.runs)]
+        slowest = slowest_imports(env, args.top)
+    finally:
+        shutil.rmtree(state_dir, ignore_errors=True)
+
+    times = [probe["import_ms"] for probe in probes]
+    result = {
+        "median_ms": statistics.median(times),
+        "min_ms": min(times),
+        "max_ms": max(times),
+        "modules": probes[-1]["modules"],
+        "eager": probes[-1]["eager"],
+        "slowest": slowest,
+    }
+
+    print(f"import main: median {result['median_ms']:.1f}ms (min {result['min_ms']:.1f}, max {result['max_ms']:.1f}), {result['modules']} modules")
+    for row in slowest:
+        print(f"  {row['cumulative_ms']:>9.1f}ms  {row['module']}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"config": {"runs": args.runs, "lazy": lazy}, "result": result}, f, indent=2)
+
+    failures = [f"{module} is imported at startup" for module in result["eager"]]
+    if args.max_ms and result["median_ms"] > args.max_ms:
+        failures.append(f"median import {result['median_ms']:.1f}ms > {args.max_ms:.1f}ms")
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            previous = json.load(f)["result"]["median_ms"]
+        if result["median_ms"] > previous * (1 + args.tolerance):
+            failures.append(f"median import {result['median_ms']:.1f}ms vs baseline {previous:.1f}ms")
+    for failure in failures:
+        print(f"REGRESSION {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
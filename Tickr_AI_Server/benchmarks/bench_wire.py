@@ -0,0 +1,96 @@
+"""/extract body size and server-side decode + validation time per wire format.
+
+Run from Tickr_AI_Server/:
+    python benchmarks/bench_wire.py --sizes 50,500,5000
+
+Compares the plain JSON ChatRequest against the columnar `columns` encoding, each raw, gzip- and
+zstd-compressed (and msgpack when installed). Decode time covers what the server does per request:
+inflate through DecodeBodyMiddleware's decoder, parse, and validate into ChatRequest.
+"""
+import argparse
+import gzip
+import json
+import os
+import sys
+import timeit
+from typing import Callable, Dict, List, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from fakes import make_history
+from models import ChatRequest
+from wire import _Decoder, msgpack_to_json
+
+CHUNK = 64 * 1024
+
+
+def payloads(size: int) -> Dict[str, dict]:
+    messages = make_history(size)
+    # Real Discord tags are long and repeat on every message
+    messages = [msg.model_copy(update={"author": f"{msg.author.split('#')[0]}.dev#{hash(msg.author) % 10000:04d}"}) for msg in messages]
+    authors = sorted({msg.author for msg in messages})
+    index = {author: i for i, author in enumerate(authors)}
+    base = {"prompt_type": "TICKETS", "counts": 5, "timestamp": "2024-02-20T09:00:00Z"}
+    return {
+        "json": {**base, "messages": [{"id": msg.id, "author": msg.author, "content": msg.content} for msg in messages]},
+        "columns": {
+            **base,
+            "columns": {
+                "authors": authors,
+                "author": [index[msg.author] for msg in messages],
+                "content": [msg.content for msg in messages],
+                "id": [msg.id for msg in messages],
+            },
+        },
+    }
+
+
+def encodings() -> List[Tuple[str, Callable[[bytes], bytes]]]:
+    found = [("raw", lambda body: body), ("gzip", lambda body: gzip.compress(body, compresslevel=6))]
+    try:
+        import zstandard
+
+        found.append(("zstd", zstandard.ZstdCompressor(level=3).compress))
+    except ImportError:
+        pass
+    return found
+
+
+def decode(body: bytes, encoding: str, msgpack_body: bool) -> ChatRequest:
+    decoder = _Decoder("identity" if encoding == "raw" else encoding, limit=1 << 30)
+    data = b"".join(decoder.decompress(body[i:i + CHUNK]) for i in range(0, len(body), CHUNK)) + decoder.flush()
+    if msgpack_body:
+        data = msgpack_to_json(data)
+    return ChatRequest.model_validate(json.loads(data))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="50,500,5000", help="Comma-separated message counts")
+    parser.add_argument("-n", "--number", type=int, default=20, help="Decodes timed per format")
+    args = parser.parse_args()
+
+    try:
+        import msgpack
+    except ImportError:
+        msgpack = None
+
+    print(f"{'msgs':>6}  {'format':<18}{'bytes':>10}{'vs json':>9}{'decode ms':>11}")
+    for size in [int(size) for size in args.sizes.split(",") if size]:
+        variants = payloads(size)
+        baseline = len(json.dumps(variants["json"], ensure_ascii=False).encode("utf-8"))
+        for shape, payload in variants.items():
+            serialized = [(shape, json.dumps(payload, ensure_ascii=False).encode("utf-8"), False)]
+            if msgpack is not None:
+                serialized.append((f"{shape}+msgpack", msgpack.packb(payload), True))
+            for name, body, msgpack_body in serialized:
+                for encoding, compress in encodings():
+                    wire = compress(body)
+                    decode(wire, encoding, msgpack_body)
+                    seconds = timeit.timeit(lambda: decode(wire, encoding, msgpack_body), number=args.number) / args.number
+                    label = name if encoding == "raw" else f"{name}+{encoding}"
+                    print(f"{size:>6}  {label:<18}{len(wire):>10}{len(wire) / baseline:>9.2f}{seconds * 1000:>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,394 @@
+"""Deterministic local stand-ins for Gemini and Google Calendar, built from the testing_prompts_c fixtures."""
+import asyncio
+import itertools
+import json
+import os
+import random
+import re
+import time
+from typing import Dict, List, Optional
+
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+from models import Message, PromptType
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "testing_prompts_c")
+
+_HEADER = re.compile(r"^\[(?P<date>[^\]]+)\]\s+(?P<author>\S+)\s*(?P<content>.*)$")
+_FENCE = re.compile(r"^```(?:json)?\s*|\s*```$")
+
+
+def load_sample_messages(samples_dir: Optional[str] = None) -> List[Message]:
+    """Parse the `[date] Author#1234 text` chat logs in samples/ into messages."""
+    samples_dir = samples_dir or os.path.join(FIXTURES_DIR, "samples")
+    messages: List[Message] = []
+    for name in sorted(os.listdir(samples_dir)):
+        author, lines, in_reactions = None, [], False
+        with open(os.path.join(samples_dir, name), "r", encoding="utf-8") as f:
+            for raw in f:
+                line = raw.strip()
+                match = _HEADER.match(line)
+                if match:
+                    if author and lines:
+                        messages.append(Message(author=author, content=" ".join(lines)))
+                    author, lines, in_reactions = match["author"], [], False
+                    if match["content"]:
+                        lines.append(match["content"])
+                elif line == "{Reactions}":
+                    in_reactions = True
+                elif line and author and not in_reactions:
+                    lines.append(line)
+        if author and lines:
+            messages.append(Message(author=author, content=" ".join(lines)))
+    return messages
+
+
+def make_history(size: int, seed: int = 0, samples_dir: Optional[str] = None) -> List[Message]:
+    """Cycle the sample messages up to `size`, tagging each so histories are unique per seed."""
+    base = load_sample_messages(samples_dir)
+    return [
+        Message(id=str(seed * 1_000_000 + i + 1), author=msg.author, content=f"{msg.content} ({seed}:{i})")
+        for i, msg in zip(range(size), itertools.cycle(base))
+    ]
+
+
+def _read(name: str) -> str:
+    with open(os.path.join(FIXTURES_DIR, "out", name), "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def _fixture_tasks() -> List[dict]:
+    return json.loads(_FENCE.sub("", _read("tasks2.json").strip()))
+
+
+def fixture_responses() -> Dict[str, str]:
+    """JSON responses per prompt type, shaped like the models the real prompts ask for."""
+    tasks = _fixture_tasks()
+    tickets = [
+        {
+            "title": task["description"].rstrip(".")[:60],
+            "assignee": task["person"],
+            "due_date": f"{task['deadline']}T23:59:59.999Z" if task["deadline"][:1].isdigit() else "2024-05-31T23:59:59.999Z",
+            "priority": "HIGH" if i == 0 else "MID",
+            "description": task["description"],
+        }
+        for i, task in enumerate(tasks)
+    ]
+    overview = {
+        "summary": _read("shortsum2.out"),
+        "tasks": [{"name": task["description"], "assignee": task["person"], "due_date": task["deadline"]} for task in tasks],
+        "team_roles": {task["person"]: task["description"] for task in tasks},
+        "tech_stack": ["Next.js", "Tailwind", "Gemini API", "Firebase", "Vercel"],
+    }
+    summary = {"summary": _read("longsum1.out")}
+    return {
+        PromptType.TICKETS.value: json.dumps({"tickets": tickets}, ensure_ascii=False),
+        PromptType.SUMMARY.value: json.dumps(summary, ensure_ascii=False),
+        "OVERVIEW": json.dumps(overview, ensure_ascii=False),
+        PromptType.COMBINED.value: json.dumps({"tickets": tickets, **summary, "overview": overview}, ensure_ascii=False),
+    }
+
+
+class FakeLLM:
+    """Drop-in for the bound Gemini model: fixed output per prompt type after a configurable delay."""
+
+    def __init__(
+        self,
+        latency: float = 0.05,
+        jitter: float = 0.0,
+        seed: int = 0,
+        responses: Optional[Dict[str, str]] = None,
+        chunk_chars: int = 32,
+        context_caches: Optional["FakeContextCacheBackend"] = None,
+        output_token_latency: float = 0.0,
+    ):
+        self.latency = latency
+        self.output_token_latency = output_token_latency
+        self.context_caches = context_caches
+        self.jitter = jitter
+        self.responses = responses or fixture_responses()
+        self.chunk_chars = chunk_chars
+        self.calls = 0
+        self.prompt_chars = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self._random = random.Random(seed)
+
+    def _respond(self, prompt, cached_content: Optional[str] = None) -> str:
+        text = prompt if isinstance(prompt, str) else str(prompt)
+        if cached_content is not None:
+            text = self.context_caches.read(cached_content) + text
+        self.calls += 1
+        self.prompt_chars += len(text)
+        if "return all three outputs" in text:
+            return self.responses[PromptType.COMBINED.value]
+        if "Extract exactly" in text:
+            return self.responses[PromptType.TICKETS.value]
+        if "comprehensive written summary" in text:
+            return self.responses[PromptType.SUMMARY.value]
+        return self.responses["OVERVIEW"]
+
+    async def _delay(self, content: str = "") -> None:
+        # Generation time grows with the response, which is what a fused call trades against
+        decode = len(content) // 4 * self.output_token_latency
+        await asyncio.sleep(max(0.0, self.latency + decode + self._random.uniform(-self.jitter, self.jitter)))
+
+    def _usage(self, prompt, content: str) -> dict:
+        input_tokens = len(str(prompt)) // 4
+        output_tokens = len(content) // 4
+        self.input_tokens += input_tokens
+        self.output_tokens += output_tokens
+        return {"input_tokens": input_tokens, "output_tokens": output_tokens, "total_tokens": input_tokens + output_tokens}
+
+    async def ainvoke(self, prompt, cached_content: Optional[str] = None, **kwargs) -> AIMessage:
+        content = self._respond(prompt, cached_content)
+        await self._delay(content)
+        return AIMessage(content=content, usage_metadata=self._usage(prompt, content))
+
+    async def astream(self, prompt, cached_content: Optional[str] = None, **kwargs):
+        content = self._respond(prompt, cached_content)
+        self._usage(prompt, content)
+        await self._delay(content)
+        for start in range(0, len(content), self.chunk_chars):
+            yield AIMessageChunk(content=content[start:start + self.chunk_chars])
+            await asyncio.sleep(0)
+
+
+class FakeContextCacheBackend:
+    """In-memory stand-in for the Gemini CacheService, with a minimum cacheable size and expiry."""
+
+    def __init__(self, min_chars: int = 0, clock=time.time):
+        self.min_chars = min_chars
+        self.clock = clock
+        self.caches: Dict[str, tuple] = {}
+        self.created = 0
+        self.renewed = 0
+        self.deleted = 0
+        self._ids = itertools.count(1)
+
+    def create(self, model: str, system_text: str, ttl: float):
+        if len(system_text) < self.min_chars:
+            raise RuntimeError(f"400 Cached content is too small. min_chars={self.min_chars}")
+        name = f"cachedContents/fake{next(self._ids)}"
+        expires = self.clock() + ttl
+        self.caches[name] = (system_text, expires)
+        self.created += 1
+        return name, expires
+
+    def renew(self, name: str, ttl: float) -> float:
+        text = self.read(name)
+        expires = self.clock() + ttl
+        self.caches[name] = (text, expires)
+        self.renewed += 1
+        return expires
+
+    def delete(self, name: str) -> None:
+        if self.caches.pop(name, None) is not None:
+            self.deleted += 1
+
+    def read(self, name: str) -> str:
+        entry = self.caches.get(name)
+        if entry is None or entry[1] <= self.clock():
+            self.caches.pop(name, None)
+            raise RuntimeError(f"404 CachedContent not found (or permission denied): {name}")
+        return entry[0]
+
+
+class FlakyLLM:
+    """Wraps a fake model to inject errors, 429s and slow responses for router testing."""
+
+    def __init__(
+        self,
+        inner: FakeLLM,
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        slow_rate: float = 0.0,
+        slow_latency: float = 1.0,
+        seed: int = 0,
+    ):
+        self.inner = inner
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self._random = random.Random(seed)
+
+    async def _misbehave(self) -> None:
+        roll = self._random.random()
+        if roll < self.rate_limit_rate:
+            raise RuntimeError("429 Resource has been exhausted (e.g. check quota).")
+        if roll < self.rate_limit_rate + self.error_rate:
+            raise RuntimeError("500 Internal error encountered.")
+        if self._random.random() < self.slow_rate:
+            await asyncio.sleep(self.slow_latency)
+
+    async def ainvoke(self, prompt, **kwargs) -> AIMessage:
+        await self._misbehave()
+        return await self.inner.ainvoke(prompt, **kwargs)
+
+    async def astream(self, prompt, **kwargs):
+        await self._misbehave()
+        async for chunk in self.inner.astream(prompt, **kwargs):
+            yield chunk
+
+
+class FakeHttpError(Exception):
+    """Carries `resp.status` like googleapiclient's HttpError."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(f"<HttpError {status}: {message}>")
+        self.resp = type("Response", (), {"status": status})()
+
+
+class _FakeRequest:
+    def __init__(self, service: "FakeCalendarService", method: str, **kwargs):
+        self.service = service
+        self.method = method
+        self.kwargs = kwargs
+
+    def execute(self, http=None) -> dict:
+        self.service.round_trips += 1
+        if self.service.latency:
+            # Runs in a worker thread like the real blocking client
+            time.sleep(self.service.latency)
+        return self.service._call(self)
+
+
+class _FakeBatch:
+    def __init__(self, service: "FakeCalendarService", callback):
+        self.service = service
+        self.callback = callback
+        self.requests = []
+
+    def add(self, request: _FakeRequest, request_id: str) -> None:
+        self.requests.append((request_id, request))
+
+    def execute(self, http=None) -> None:
+        if not self.requests:
+            return
+        self.service.round_trips += 1
+        if self.service.latency:
+            time.sleep(self.service.latency)
+        for request_id, request in self.requests:
+            try:
+                self.callback(request_id, self.service._call(request), None)
+            except FakeHttpError as e:
+                self.callback(request_id, None, e)
+
+
+class FakeCalendarService:
+    """In-memory Calendar v3 `events()` surface: insert, patch, delete, list with sync tokens, and batches.
+
+    Every change bumps the event's etag and is logged, so `list(syncToken=...)` returns only the events
+    changed since that token. `calls` counts API calls per method, including those inside batches.
+    """
+
+    def __init__(self, latency: float = 0.0, page_size: int = 2500):
+        self.latency = latency
+        self.page_size = page_size
+        self.events_by_id: Dict[str, dict] = {}
+        self.round_trips = 0
+        self.calls: Dict[str, int] = {}
+        self._ids = itertools.count(1)
+        self._version = 0
+        self._changed: Dict[str, int] = {}
+        # Tokens issued before this version are rejected with 410, as after a server-side expiry
+        self.oldest_sync_version = 0
+
+    def events(self) -> "FakeCalendarService":
+        return self
+
+    def insert(self, calendarId: str, body: dict) -> _FakeRequest:
+        return _FakeRequest(self, "insert", body=body)
+
+    def patch(self, calendarId: str, eventId: str, body: dict) -> _FakeRequest:
+        return _FakeRequest(self, "patch", eventId=eventId, body=body)
+
+    def delete(self, calendarId: str, eventId: str) -> _FakeRequest:
+        return _FakeRequest(self, "delete", eventId=eventId)
+
+    def list(self, calendarId: str, syncToken: Optional[str] = None, pageToken: Optional[str] = None, **kwargs) -> _FakeRequest:
+        return _FakeRequest(
+            self, "list", syncToken=syncToken, pageToken=pageToken,
+            showDeleted=kwargs.get("showDeleted", False), maxResults=kwargs.get("maxResults", 250),
+        )
+
+    def new_batch_http_request(self, callback=None) -> _FakeBatch:
+        return _FakeBatch(self, callback)
+
+    def _call(self, request: _FakeRequest) -> dict:
+        self.calls[request.method] = self.calls.get(request.method, 0) + 1
+        return getattr(self, f"_{request.method}")(**request.kwargs)
+
+    def _touch(self, event: dict) -> dict:
+        self._version += 1
+        event["etag"] = f'"{self._version}"'
+        self._changed[event["id"]] = self._version
+        return event
+
+    def _existing(self, event_id: str) -> dict:
+        event = self.events_by_id.get(event_id)
+        if event is None or event.get("status") == "cancelled":
+            raise FakeHttpError(410 if event else 404, f"event {event_id} not found")
+        return event
+
+    def _insert(self, body: dict) -> dict:
+        event_id = f"evt{next(self._ids)}"
+        event = {**body, "id": event_id, "status": "confirmed", "htmlLink": f"https://calendar.local/event?eid={event_id}"}
+        self.events_by_id[event_id] = self._touch(event)
+        return dict(event)
+
+    def _patch(self, eventId: str, body: dict) -> dict:
+        event = self._existing(eventId)
+        event.update(body)
+        return dict(self._touch(event))
+
+    def _delete(self, eventId: str) -> dict:
+        self._touch(self._existing(eventId))["status"] = "cancelled"
+        return {}
+
+    def _list(self, syncToken: Optional[str], pageToken: Optional[str], showDeleted: bool, maxResults: int) -> dict:
+        if pageToken:
+            since, offset = (int(part) for part in pageToken.split(":"))
+        else:
+            since, offset = -1, 0
+            if syncToken:
+                since = int(syncToken)
+                if since < self.oldest_sync_version:
+                    raise FakeHttpError(410, "Sync token is no longer valid, a full sync is required")
+        version = self._version
+        if since >= 0:
+            changed = sorted((v, event_id) for event_id, v in self._changed.items() if since < v <= version)
+            items = [self.events_by_id[event_id] for _, event_id in changed]
+        else:
+            items = [event for event in self.events_by_id.values() if showDeleted or event.get("status") != "cancelled"]
+        size = min(maxResults, self.page_size)
+        page = [dict(event) for event in items[offset:offset + size]]
+        if offset + size < len(items):
+            return {"items": page, "nextPageToken": f"{since}:{offset + size}"}
+        return {"items": page, "nextSyncToken": str(version)}
+
+    def edit(self, event_id: str, **fields) -> dict:
+        """Change an event as a user would in the Calendar UI."""
+        event = self._existing(event_id)
+        event.update(fields)
+        return dict(self._touch(event))
+
+    def remove(self, event_id: str) -> None:
+        """Delete an event as a user would in the Calendar UI."""
+        self._delete(event_id)
+
+
+class FakeCalendarServices:
+    """Stands in for CalendarServiceCache, handing every user the same fake service."""
+
+    def __init__(self, service: FakeCalendarService):
+        from calendar_utils import CalendarClient
+
+        self.client = CalendarClient(creds=None, service=service)
+
+    def invalidate(self, user_id: str) -> None:
+        pass
+
+    async def get(self, user_id: str):
+        return self.client
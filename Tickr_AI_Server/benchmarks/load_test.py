@@ -0,0 +1,227 @@
+"""Offline load test for the AI server with a fake LLM and fake Calendar service.
+
+Run from Tickr_AI_Server/:
+    python benchmarks/load_test.py --sizes 10,100,1000,10000 --concurrency 16 --requests 64
+
+Use --output to save a JSON report and --baseline/--max-p95-ms to fail (exit 1) on regressions in CI.
+With --runs N every scenario is run N times and the median of each latency figure is reported, so
+one slow run on a shared machine does not decide the comparison.
+"""
+import argparse
+import asyncio
+import atexit
+import json
+import os
+import resource
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+# Keep the server's on-disk state out of the working tree
+_STATE_DIR = tempfile.mkdtemp(prefix="tickr-bench-")
+atexit.register(shutil.rmtree, _STATE_DIR, ignore_errors=True)
+os.environ.setdefault("TOKEN_STORE_PATH", os.path.join(_STATE_DIR, "tokens.sqlite3"))
+os.environ.setdefault("JOB_QUEUE_PATH", os.path.join(_STATE_DIR, "jobs.sqlite3"))
+os.environ.setdefault("GEMINI_API_KEY", "offline-benchmark")
+# The fakes have no quota; the server's own limiters would otherwise turn larger runs into waits
+os.environ.setdefault("CALENDAR_RPM", "10000000")
+os.environ.setdefault("GEMINI_RPM", "10000000")
+os.environ.setdefault("GEMINI_TPM", "10000000000")
+
+import httpx
+
+from fakes import FakeCalendarService, FakeCalendarServices, FakeLLM, FlakyLLM, make_history
+
+ENDPOINTS = ("extract", "create_event", "create_events", "batch")
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def request_factory(endpoint: str, size: int, prompt_type: str) -> Callable[[int], tuple]:
+    ticket = {
+        "title": "Finalize the landing page design",
+        "assignee": "Ken#4481",
+        "due_date": "2024-05-30T23:59:59.999Z",
+        "priority": "HIGH",
+        "description": "Finalize the landing page design using Tailwind and Next.js for the demo.",
+    }
+
+    def chat_request(i: int) -> dict:
+        # A distinct history per request keeps the response cache out of the measurement
+        return {
+            "messages": [m.model_dump() for m in make_history(size, seed=i)],
+            "prompt_type": prompt_type,
+            "counts": 3,
+        }
+
+    if endpoint == "extract":
+        return lambda i: ("/extract", chat_request(i))
+    if endpoint == "batch":
+        return lambda i: ("/extract/batch", {"requests": [chat_request(i * 4 + k) for k in range(4)]})
+    if endpoint == "create_event":
+        return lambda i: ("/create_event", {"user_id": f"user{i}", "ticket": ticket})
+    if endpoint == "create_events":
+        return lambda i: ("/create_events", {"user_id": f"user{i}", "tickets": [ticket] * 10})
+    raise ValueError(f"Unknown endpoint: {endpoint}")
+
+
+async def run_scenario(app, endpoint: str, size: int, requests: int, concurrency: int, prompt_type: str, first: int = 0) -> Dict:
+    make_request = request_factory(endpoint, size, prompt_type)
+    # Build bodies up front so payload generation is not timed
+    bodies = [make_request(first + i) for i in range(requests)]
+    latencies: List[float] = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        async def one(path: str, body: dict) -> None:
+            nonlocal errors
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.post(path, json=body)
+                latencies.append(time.perf_counter() - start)
+                if response.status_code != 200:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(path, body) for path, body in bodies))
+        elapsed = time.perf_counter() - started
+
+    return {
+        "endpoint": endpoint,
+        "messages": size if endpoint in ("extract", "batch") else 0,
+        "requests": requests,
+        "errors": errors,
+        "rps": requests / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def median_result(runs: List[Dict]) -> Dict:
+    result = dict(runs[-1])
+    for name in ("rps", "p50_ms", "p95_ms", "p99_ms"):
+        result[name] = statistics.median(run[name] for run in runs)
+    result["errors"] = sum(run["errors"] for run in runs)
+    result["runs"] = len(runs)
+    result["p95_runs_ms"] = [run["p95_ms"] for run in runs]
+    return result
+
+
+def check_regressions(results: List[Dict], baseline_path: str, tolerance: float, max_p95_ms: float) -> List[str]:
+    failures = []
+    for result in results:
+        name = f"{result['endpoint']}[{result['messages']}]"
+        if result["errors"]:
+            failures.append(f"{name}: {result['errors']} failed requests")
+        if max_p95_ms and result["p95_ms"] > max_p95_ms:
+            failures.append(f"{name}: p95 {result['p95_ms']:.1f}ms > {max_p95_ms:.1f}ms")
+
+    if baseline_path:
+        with open(baseline_path, "r", encoding="utf-8") as f:
+            baseline = {(r["endpoint"], r["messages"]): r for r in json.load(f)["results"]}
+        for result in results:
+            previous = baseline.get((result["endpoint"], result["messages"]))
+            if previous and result["p95_ms"] > previous["p95_ms"] * (1 + tolerance):
+                failures.append(
+                    f"{result['endpoint']}[{result['messages']}]: p95 {result['p95_ms']:.1f}ms vs baseline {previous['p95_ms']:.1f}ms"
+                )
+    return failures
+
+
+async def main_async(args) -> List[Dict]:
+    import main
+
+    fake_llm = FakeLLM(latency=args.llm_latency, jitter=args.llm_jitter)
+    main.llm_router.backends = {name: fake_llm for name in main.llm_router.backends}
+    if args.llm_error_rate or args.llm_rate_limit_rate or args.llm_slow_rate:
+        # Only the primary model misbehaves, so failover and hedging show up in the results
+        main.llm_router.backends[main.GEMINI_MODEL] = FlakyLLM(
+            fake_llm,
+            error_rate=args.llm_error_rate,
+            rate_limit_rate=args.llm_rate_limit_rate,
+            slow_rate=args.llm_slow_rate,
+            slow_latency=args.llm_slow_latency,
+        )
+    main.calendar_services = FakeCalendarServices(FakeCalendarService(latency=args.calendar_latency))
+
+    results = []
+    for endpoint in args.endpoints:
+        sizes = args.sizes if endpoint in ("extract", "batch") else [0]
+        for size in sizes:
+            # Later runs use new request indexes, so their bodies miss the response cache too
+            runs = [
+                await run_scenario(main.app, endpoint, size, args.requests, args.concurrency, args.prompt_type, run * args.requests)
+                for run in range(args.runs)
+            ]
+            result = median_result(runs)
+            results.append(result)
+            print(
+                f"{endpoint:<14}{result['messages']:>8}{result['rps']:>10.1f}"
+                f"{result['p50_ms']:>10.1f}{result['p95_ms']:>10.1f}{result['p99_ms']:>10.1f}"
+                f"{result['peak_rss_mb']:>10.1f}{result['errors']:>8}"
+            )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="10,100,1000,10000", help="Comma-separated message-history sizes")
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS), help="Comma-separated endpoints to drive")
+    parser.add_argument("--requests", type=int, default=32, help="Requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=8, help="Requests in flight")
+    parser.add_argument("--runs", type=int, default=1, help="Runs per scenario; latencies are the median over runs")
+    parser.add_argument("--prompt-type", default="TICKETS", help="PromptType for extraction scenarios")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Fake LLM latency in seconds")
+    parser.add_argument("--llm-jitter", type=float, default=0.0, help="Uniform +/- jitter on the fake latency")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0, help="Share of primary-model calls that fail")
+    parser.add_argument("--llm-rate-limit-rate", type=float, default=0.0, help="Share of primary-model calls that return 429")
+    parser.add_argument("--llm-slow-rate", type=float, default=0.0, help="Share of primary-model calls that stall")
+    parser.add_argument("--llm-slow-latency", type=float, default=1.0, help="Extra delay for stalled calls in seconds")
+    parser.add_argument("--calendar-latency", type=float, default=0.01, help="Fake Calendar call latency in seconds")
+    parser.add_argument("--output", help="Write a JSON report here")
+    parser.add_argument("--baseline", help="JSON report to compare p95 latencies against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed p95 slowdown vs baseline")
+    parser.add_argument("--max-p95-ms", type=float, default=0.0, help="Absolute p95 limit for every scenario")
+    args = parser.parse_args()
+    args.sizes = [int(size) for size in args.sizes.split(",") if size]
+    args.endpoints = [endpoint for endpoint in args.endpoints.split(",") if endpoint]
+    for endpoint in args.endpoints:
+        if endpoint not in ENDPOINTS:
+            parser.error(f"unknown endpoint {endpoint}, expected one of {', '.join(ENDPOINTS)}")
+
+    print(f"{'endpoint':<14}{'msgs':>8}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'rss MB':>10}{'errors':>8}")
+    results = asyncio.run(main_async(args))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"config": {k: v for k, v in vars(args).items() if k not in ("output", "baseline")}, "results": results}, f, indent=2)
+
+    failures = check_regressions(results, args.baseline, args.tolerance, args.max_p95_ms)
+    for failure in failures:
+        print(f"REGRESSION {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
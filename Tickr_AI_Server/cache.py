@@ -0,0 +1,164 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+
+def make_key(*parts: Any) -> str:
+    """Build a stable content hash from JSON-serialisable parts."""
+    raw = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """TTL + LRU cache kept in memory, with an optional second tier that survives restarts.
+
+    The second tier is either a private SQLite file (`disk_path`) or a shared store
+    (see shared_state.py) that every worker reads and writes. The SQLite tier keeps at most
+    `max_disk_entries` rows; `purge()` (run periodically by `run_purge`) drops expired rows and
+    then the least recently used ones.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 256,
+        ttl: float = 3600.0,
+        disk_path: Optional[str] = None,
+        store=None,
+        max_disk_entries: int = 10000,
+    ):
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self.store = store
+        if disk_path and store is None:
+            os.makedirs(os.path.dirname(os.path.abspath(disk_path)), exist_ok=True)
+            self._db = sqlite3.connect(disk_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL, used REAL NOT NULL DEFAULT 0)"
+            )
+            columns = {row[1] for row in self._db.execute("PRAGMA table_info(responses)")}
+            if "used" not in columns:
+                # Files written before the disk tier was bounded
+                self._db.execute("ALTER TABLE responses ADD COLUMN used REAL NOT NULL DEFAULT 0")
+            self._db.execute("CREATE INDEX IF NOT EXISTS responses_used ON responses (used)")
+            self._db.commit()
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires = entry
+                if expires > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, expires FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    if row[1] > now:
+                        value = json.loads(row[0])
+                        self._db.execute("UPDATE responses SET used = ? WHERE key = ?", (now, key))
+                        self._db.commit()
+                        self._store(key, value, row[1])
+                        self.hits += 1
+                        self.disk_hits += 1
+                        return value
+                    self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._db.commit()
+
+        if self.store is not None:
+            # Outside the lock: a networked store may be slow and does its own locking
+            raw = self.store.get("responses", key)
+            if raw is not None:
+                value = json.loads(raw)
+                with self._lock:
+                    self._store(key, value, now + self.ttl)
+                    self.hits += 1
+                    self.disk_hits += 1
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key: str, value: Any) -> None:
+        now = time.time()
+        expires = now + self.ttl
+        with self._lock:
+            self._store(key, value, expires)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses (key, value, expires, used) VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(value, ensure_ascii=False), expires, now),
+                )
+                self._db.commit()
+        if self.store is not None:
+            self.store.set("responses", key, json.dumps(value, ensure_ascii=False), ttl=self.ttl)
+
+    def _store(self, key: str, value: Any, expires: float) -> None:
+        self._entries[key] = (value, expires)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def purge(self) -> int:
+        """Drop expired disk rows, then the least recently used beyond `max_disk_entries`; returns rows removed."""
+        if self._db is None:
+            return 0
+        with self._lock:
+            removed = self._db.execute("DELETE FROM responses WHERE expires <= ?", (time.time(),)).rowcount
+            removed += self._db.execute(
+                "DELETE FROM responses WHERE key NOT IN (SELECT key FROM responses ORDER BY used DESC LIMIT ?)",
+                (self.max_disk_entries,),
+            ).rowcount
+            self._db.commit()
+        return removed
+
+    async def run_purge(self, interval: float = 300.0) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self.purge)
+            except sqlite3.Error as e:
+                print(f"Response cache purge failed: {e}")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM responses")
+                self._db.commit()
+        if self.store is not None:
+            self.store.clear("responses")
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "disk": self._db is not None or self.store is not None,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,281 @@
+import asyncio
+import hashlib
+import json
+import threading
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from calendar_utils import BATCH_LIMIT, CalendarClient, build_event
+from dedup import TicketIndex, ticket_identity
+from models import Ticket
+
+# Private extended property that marks an event as the calendar copy of a ticket
+TICKET_PROPERTY = "tickrTicketId"
+# Fields of an event the sync owns; anything else the user changes in Calendar is left alone
+MANAGED_FIELDS = ("summary", "description", "start", "end", "colorId")
+
+
+@dataclass
+class SyncRecord:
+    event_id: Optional[str]
+    etag: Optional[str]
+    fingerprint: str
+    # Deleted in Calendar by the user: not recreated unless the ticket itself changes
+    cancelled: bool = False
+    # Dedup identity of tickets without an ID, so a renamed ticket keeps its event
+    signature: Optional[List[int]] = None
+    due_day: Optional[int] = None
+
+
+@dataclass
+class SyncState:
+    records: Dict[str, SyncRecord] = field(default_factory=dict)
+    sync_token: Optional[str] = None
+
+
+@dataclass
+class SyncOp:
+    action: str  # insert | patch | delete
+    ticket_id: str
+    body: Optional[dict] = None
+    fingerprint: Optional[str] = None
+    signature: Optional[List[int]] = None
+    due_day: Optional[int] = None
+
+
+def ticket_key(ticket: Ticket) -> str:
+    """The ticket's server-side ID, or a stable key from its title and assignee when it has none."""
+    if ticket.id:
+        return ticket.id
+    raw = f"{ticket.title.strip().lower()}\0{(ticket.assignee or '').strip().lower()}"
+    return "t" + hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def event_body(ticket: Ticket, ticket_id: str, color_id: Optional[str] = None) -> dict:
+    body = {name: value for name, value in build_event(ticket, color_id).items() if value is not None}
+    body["extendedProperties"] = {"private": {TICKET_PROPERTY: ticket_id}}
+    return body
+
+
+def fingerprint(body: dict) -> str:
+    managed = {name: body.get(name) for name in MANAGED_FIELDS}
+    return hashlib.sha256(json.dumps(managed, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def _status(error: Exception) -> Optional[int]:
+    return getattr(getattr(error, "resp", None), "status", None)
+
+
+def pull_changes(client: CalendarClient, state: SyncState) -> int:
+    """Apply Calendar-side changes since the last sync to `state`; returns the number of events seen.
+
+    With a sync token only events changed since then are listed. Without one (first sync, or the
+    token expired) every event is listed once to rebuild the mapping and obtain a token.
+    """
+    events = client.service.events()
+    params = {"calendarId": "primary", "maxResults": 2500, "showDeleted": True}
+    if state.sync_token:
+        params["syncToken"] = state.sync_token
+    seen = 0
+    page_token = None
+    by_event = {record.event_id: ticket_id for ticket_id, record in state.records.items()}
+    while True:
+        try:
+            page = events.list(**params, pageToken=page_token).execute(http=client.http())
+        except Exception as e:
+            if _status(e) != 410 or "syncToken" not in params:
+                raise
+            # Sync token expired: start over with a full listing
+            state.sync_token = None
+            params.pop("syncToken")
+            page_token = None
+            continue
+        for event in page.get("items", []):
+            seen += 1
+            _apply_remote(state, event, by_event)
+        page_token = page.get("nextPageToken")
+        if not page_token:
+            state.sync_token = page.get("nextSyncToken", state.sync_token)
+            return seen
+
+
+def _apply_remote(state: SyncState, event: dict, by_event: Dict[Optional[str], str]) -> None:
+    private = (event.get("extendedProperties") or {}).get("private") or {}
+    # The stored mapping wins: a renamed ticket's event may still carry its old key
+    ticket_id = by_event.get(event["id"]) or private.get(TICKET_PROPERTY)
+    if ticket_id is None:
+        return
+    record = state.records.get(ticket_id)
+    if event.get("status") == "cancelled":
+        if record is not None and record.event_id == event["id"]:
+            record.cancelled, record.etag = True, None
+        return
+    if record is None or record.event_id != event["id"]:
+        # Mapping lost or never stored: adopt the event as it is in Calendar
+        state.records[ticket_id] = SyncRecord(event["id"], event.get("etag"), fingerprint(event))
+    elif record.etag != event.get("etag"):
+        # Edited in Calendar; the ticket only overwrites it again once the ticket changes
+        record.etag = event.get("etag")
+
+
+def _identity(ticket: Ticket) -> Tuple[Optional[List[int]], Optional[int]]:
+    if ticket.id:
+        return None, None
+    signature, due_day = ticket_identity(ticket)
+    return list(signature), due_day
+
+
+def _match_renamed(state: SyncState, wanted: Dict[str, Ticket], index_options: Optional[dict] = None) -> set:
+    """Move the records of renamed ID-less tickets to their new keys; returns the keys that moved.
+
+    Such a ticket's key comes from its title and assignee, so a rename looks like a new ticket plus a
+    missing one. A new ticket takes over a missing one's event when the dedup index would call them
+    duplicates.
+    """
+    new = [ticket_id for ticket_id, ticket in wanted.items() if not ticket.id and ticket_id not in state.records]
+    missing = [
+        (ticket_id, record) for ticket_id, record in state.records.items()
+        if ticket_id not in wanted and record.signature is not None
+    ]
+    if not new or not missing:
+        return set()
+    index = TicketIndex(**{**(index_options or {}), "max_tickets": len(missing)})
+    for ticket_id, record in missing:
+        index.add_identity(ticket_id, tuple(record.signature), record.due_day)
+    moved = set()
+    for ticket_id in new:
+        match = index.find_similar(*ticket_identity(wanted[ticket_id]))
+        if match is not None:
+            index.remove(match[0])
+            state.records[ticket_id] = state.records.pop(match[0])
+            moved.add(ticket_id)
+    return moved
+
+
+def plan(
+    state: SyncState,
+    tickets: List[Ticket],
+    color_id: Optional[str] = None,
+    delete_missing: bool = False,
+    index_options: Optional[dict] = None,
+) -> Tuple[List[SyncOp], int]:
+    """Calendar calls needed to bring the events in line with `tickets`, and how many are already current.
+
+    `index_options` are the TicketIndex thresholds used to recognise renamed tickets without an ID.
+    """
+    ops: List[SyncOp] = []
+    unchanged = 0
+    wanted = {ticket_key(ticket): ticket for ticket in tickets}
+    renamed = _match_renamed(state, wanted, index_options)
+    for ticket_id, ticket in wanted.items():
+        body = event_body(ticket, ticket_id, color_id)
+        digest = fingerprint(body)
+        signature, due_day = _identity(ticket)
+        record = state.records.get(ticket_id)
+        if record is not None and record.fingerprint == digest:
+            record.signature, record.due_day = signature, due_day
+            unchanged += 1
+        elif record is None or record.cancelled:
+            ops.append(SyncOp("insert", ticket_id, body, digest, signature, due_day))
+        else:
+            fields = MANAGED_FIELDS + (("extendedProperties",) if ticket_id in renamed else ())
+            ops.append(SyncOp("patch", ticket_id, {name: body.get(name) for name in fields}, digest, signature, due_day))
+    if delete_missing:
+        for ticket_id, record in state.records.items():
+            if ticket_id not in wanted:
+                ops.append(SyncOp("delete", ticket_id))
+    return ops, unchanged
+
+
+def apply(client: CalendarClient, state: SyncState, ops: List[SyncOp]) -> List[dict]:
+    """Run `ops` as Calendar batch requests, one HTTP round trip per 50 calls, updating `state`."""
+    results: List[dict] = [{} for _ in ops]
+
+    def callback(request_id: str, response: Optional[dict], exception: Optional[Exception]) -> None:
+        index = int(request_id)
+        op = ops[index]
+        gone = exception is not None and _status(exception) in (404, 410)
+        if exception is not None and not (op.action == "delete" and gone):
+            if gone:
+                # Deleted in Calendar since the last pull; the next sync recreates it
+                state.records[op.ticket_id].cancelled = True
+            results[index] = {"ticket_id": op.ticket_id, "action": op.action, "error": str(exception)}
+            return
+        if op.action == "delete":
+            state.records.pop(op.ticket_id, None)
+            results[index] = {"ticket_id": op.ticket_id, "action": op.action}
+            return
+        state.records[op.ticket_id] = SyncRecord(
+            response.get("id"), response.get("etag"), op.fingerprint, signature=op.signature, due_day=op.due_day
+        )
+        results[index] = {
+            "ticket_id": op.ticket_id,
+            "action": op.action,
+            "id": response.get("id"),
+            "link": response.get("htmlLink"),
+        }
+
+    events = client.service.events()
+    for start in range(0, len(ops), BATCH_LIMIT):
+        batch = client.service.new_batch_http_request(callback=callback)
+        for index in range(start, min(start + BATCH_LIMIT, len(ops))):
+            op = ops[index]
+            if op.action == "insert":
+                request = events.insert(calendarId="primary", body=op.body)
+            elif op.action == "patch":
+                request = events.patch(calendarId="primary", eventId=state.records[op.ticket_id].event_id, body=op.body)
+            else:
+                event_id = state.records[op.ticket_id].event_id
+                if event_id is None or state.records[op.ticket_id].cancelled:
+                    # Already gone from Calendar; only the mapping is left to drop
+                    callback(str(index), {}, None)
+                    continue
+                request = events.delete(calendarId="primary", eventId=event_id)
+            batch.add(request, request_id=str(index))
+        batch.execute(http=client.http())
+    return results
+
+
+class CalendarSyncStore:
+    """Per-user ticket-to-event mapping and Calendar sync token.
+
+    With a shared `store`, the state is read and written there on every sync so all workers
+    share one mapping; otherwise it is kept in process.
+    """
+
+    def __init__(self, store=None):
+        self.store = store
+        self._states: Dict[str, SyncState] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._lock = threading.Lock()
+
+    def lock(self, user_id: str) -> asyncio.Lock:
+        """Held for a whole sync so two syncs for one user in this process never both insert a ticket."""
+        return self._locks.setdefault(user_id, asyncio.Lock())
+
+    def load(self, user_id: str) -> SyncState:
+        if self.store is not None:
+            raw = self.store.get("calendar_sync", user_id)
+            if not raw:
+                return SyncState()
+            data = json.loads(raw)
+            return SyncState(
+                records={ticket_id: SyncRecord(**record) for ticket_id, record in data["records"].items()},
+                sync_token=data.get("sync_token"),
+            )
+        with self._lock:
+            return self._states.setdefault(user_id, SyncState())
+
+    def save(self, user_id: str, state: SyncState) -> None:
+        if self.store is not None:
+            data = {"records": {ticket_id: asdict(record) for ticket_id, record in state.records.items()}, "sync_token": state.sync_token}
+            self.store.set("calendar_sync", user_id, json.dumps(data, ensure_ascii=False))
+        else:
+            with self._lock:
+                self._states[user_id] = state
+
+    def reset(self, user_id: str) -> None:
+        if self.store is not None:
+            self.store.delete("calendar_sync", user_id)
+        with self._lock:
+            self._states.pop(user_id, None)
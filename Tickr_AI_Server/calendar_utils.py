@@ -1,23 +1,147 @@
-# import datetime
-# import os
-# from google.oauth2.credentials import Credentials
-# from google_auth_oauthlib.flow import InstalledAppFlow
-# from googleapiclient.discovery import build
-
-# # If modifying these SCOPES, delete the token.json file
-# SCOPES = ['https://www.googleapis.com/auth/calendar.events']
-
-# def get_calendar_service():
-#     creds = None
-#     if os.path.exists('token.json'):
-#         creds    = Credentials.from_authorized_user_file('token.json', SCOPES)
-#     if not creds or not creds.valid:
-#         if creds and creds.expired and creds.refresh_token:
-#             creds.refresh()
-#         else:
-#             flow = InstalledAppFlow.from_client_secrets_file(
-#                 'credentials.json', SCOPES)
-#             creds = flow.run_local_server(port=0)
-#         with open('token.json', 'w') as token:
-#             token.write(creds.to_json())
-#     return build('calendar', 'v3', credentials=creds)
+import asyncio
+import json
+import os
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from google.oauth2.credentials import Credentials
+
+from token_store import TokenStore
+
+# Calendar batch requests accept at most 50 calls
+BATCH_LIMIT = 50
+
+# Local copy of the Calendar v3 discovery document, so building a service never fetches it
+CALENDAR_DISCOVERY_PATH = os.getenv("CALENDAR_DISCOVERY_PATH", "data/calendar.v3.json")
+
+_discovery: Optional[dict] = None
+_discovery_lock = threading.Lock()
+
+
+def discovery_document() -> Optional[dict]:
+    """Parsed Calendar discovery document, loaded once per process from the local copy.
+
+    The copy is seeded from the document bundled with google-api-python-client.
+    Returns None if neither exists, in which case `build()` falls back to fetching it.
+    """
+    global _discovery
+    if _discovery is None:
+        with _discovery_lock:
+            if _discovery is None:
+                try:
+                    with open(CALENDAR_DISCOVERY_PATH, "r", encoding="utf-8") as f:
+                        raw = f.read()
+                except FileNotFoundError:
+                    from googleapiclient.discovery_cache import get_static_doc
+
+                    raw = get_static_doc("calendar", "v3")
+                    if raw is None:
+                        return None
+                    os.makedirs(os.path.dirname(os.path.abspath(CALENDAR_DISCOVERY_PATH)), exist_ok=True)
+                    with open(CALENDAR_DISCOVERY_PATH, "w", encoding="utf-8") as f:
+                        f.write(raw)
+                _discovery = json.loads(raw)
+    return _discovery
+
+
+def build_service(creds: Credentials):
+    from googleapiclient.discovery import build, build_from_document
+
+    document = discovery_document()
+    if document is None:
+        return build("calendar", "v3", credentials=creds, cache_discovery=False)
+    return build_from_document(document, credentials=creds)
+
+
+def warm_up() -> None:
+    """Import the Calendar client stack and load the discovery document ahead of the first request."""
+    import httplib2  # noqa: F401
+    import google_auth_httplib2  # noqa: F401
+    import googleapiclient.discovery  # noqa: F401
+
+    discovery_document()
+
+
+def build_event(ticket, color_id: Optional[str] = None) -> dict:
+    return {
+        "summary": ticket.title,
+        "description": ticket.description,
+        "start": {
+            "dateTime": ticket.due_date
+        },
+        "end": {
+            "dateTime": ticket.due_date
+        },
+        "colorId": color_id
+    }
+
+
+@dataclass
+class CalendarClient:
+    creds: Credentials
+    service: Any
+    _local: threading.local = field(default_factory=threading.local, repr=False, compare=False)
+
+    def http(self):
+        """This thread's authorized transport, kept so its connections are reused across calls."""
+        # httplib2 is not thread-safe, so each worker thread gets its own transport
+        http = getattr(self._local, "http", None)
+        if http is None:
+            import httplib2
+            from google_auth_httplib2 import AuthorizedHttp
+
+            http = self._local.http = AuthorizedHttp(self.creds, http=httplib2.Http())
+        return http
+
+
+class CalendarServiceCache:
+    """Per-user cache of built Calendar services on top of the token store."""
+
+    def __init__(self, tokens: TokenStore):
+        self.tokens = tokens
+        self._clients: Dict[str, CalendarClient] = {}
+
+    def invalidate(self, user_id: str) -> None:
+        self._clients.pop(user_id, None)
+
+    async def get(self, user_id: str) -> Optional[CalendarClient]:
+        """Return a ready client for `user_id`, or None if the user never authorised."""
+        creds = await self.tokens.get(user_id)
+        if creds is None:
+            self.invalidate(user_id)
+            return None
+
+        # Services hold a reference to creds, so a refresh in place keeps them usable
+        client = self._clients.get(user_id)
+        if client is None or client.creds is not creds:
+            service = await asyncio.to_thread(build_service, creds)
+            client = CalendarClient(creds=creds, service=service)
+            self._clients[user_id] = client
+        return client
+
+
+def insert_event(client: CalendarClient, event: dict) -> dict:
+    return client.service.events().insert(calendarId="primary", body=event).execute(http=client.http())
+
+
+def insert_events(client: CalendarClient, events: List[dict]) -> List[dict]:
+    """Insert events using Calendar batch requests, one HTTP round trip per 50 events."""
+    results: List[dict] = [{} for _ in events]
+
+    def callback(request_id: str, response: Optional[dict], exception: Optional[Exception]) -> None:
+        index = int(request_id)
+        if exception is not None:
+            results[index] = {"error": str(exception)}
+        else:
+            results[index] = {"link": response.get("htmlLink"), "id": response.get("id")}
+
+    for start in range(0, len(events), BATCH_LIMIT):
+        batch = client.service.new_batch_http_request(callback=callback)
+        for index in range(start, min(start + BATCH_LIMIT, len(events))):
+            batch.add(
+                client.service.events().insert(calendarId="primary", body=events[index]),
+                request_id=str(index),
+            )
+        batch.execute(http=client.http())
+    return results
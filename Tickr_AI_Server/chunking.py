@@ -0,0 +1,145 @@
+import asyncio
+import re
+from typing import Awaitable, Callable, List, Optional, TypeVar
+
+from models import CombinedPayload, Message, Payload, ProjectOverview, Summary, Ticket
+
+T = TypeVar("T")
+
+PRIORITY_ORDER = {"HIGH": 0, "MID": 1, "LOW": 2}
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 ASCII characters per token; Hangul and other non-ASCII text is closer to one token per character
+    non_ascii = sum(1 for ch in text if ord(ch) > 127)
+    return (len(text) - non_ascii) // 4 + non_ascii + 1
+
+
+def split_messages(messages: List[Message], max_tokens: int) -> List[List[Message]]:
+    """Pack messages into chunks under `max_tokens`, breaking between speaker turns where possible."""
+    # A turn is a run of consecutive messages by the same author
+    turns: List[List[Message]] = []
+    for msg in messages:
+        if turns and turns[-1][-1].author == msg.author:
+            turns[-1].append(msg)
+        else:
+            turns.append([msg])
+
+    chunks: List[List[Message]] = []
+    current: List[Message] = []
+    used = 0
+    for turn in turns:
+        turn_tokens = sum(estimate_tokens(f"- {m.author}: {m.content}") for m in turn)
+        if current and used + turn_tokens > max_tokens:
+            chunks.append(current)
+            current, used = [], 0
+        if turn_tokens <= max_tokens:
+            current.extend(turn)
+            used += turn_tokens
+            continue
+        # A single turn over budget has to be split between its messages
+        for msg in turn:
+            msg_tokens = estimate_tokens(f"- {msg.author}: {msg.content}")
+            if current and used + msg_tokens > max_tokens:
+                chunks.append(current)
+                current, used = [], 0
+            current.append(msg)
+            used += msg_tokens
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+async def map_chunks(
+    chunks: List[List[Message]],
+    fn: Callable[[List[Message]], Awaitable[T]],
+    parallelism: int,
+) -> List[T]:
+    """Run `fn` over every chunk with at most `parallelism` calls in flight, preserving order."""
+    semaphore = asyncio.Semaphore(max(1, parallelism))
+
+    async def run(chunk: List[Message]) -> T:
+        async with semaphore:
+            return await fn(chunk)
+
+    return await asyncio.gather(*(run(chunk) for chunk in chunks))
+
+
+def _normalize_title(title: str) -> str:
+    return re.sub(r"[\W_]+", " ", title.lower()).strip()
+
+
+def reduce_payloads(payloads: List[Payload], counts: Optional[int] = None) -> Payload:
+    """Merge per-chunk ticket payloads, dropping tickets with the same normalised title."""
+    seen = {}
+    for payload in payloads:
+        for ticket in payload.tickets or []:
+            key = _normalize_title(ticket.title)
+            existing = seen.get(key)
+            if existing is None:
+                seen[key] = ticket
+            elif PRIORITY_ORDER.get(ticket.priority, 1) < PRIORITY_ORDER.get(existing.priority, 1):
+                seen[key] = ticket
+
+    tickets: List[Ticket] = sorted(seen.values(), key=lambda t: PRIORITY_ORDER.get(t.priority, 1))
+    if counts:
+        tickets = tickets[:counts]
+    return Payload(tickets=tickets)
+
+
+def _split_sections(text: str) -> List[tuple]:
+    sections = []
+    header, body = "", []
+    for line in text.splitlines():
+        if line.lstrip().startswith("#"):
+            sections.append((header, "\n".join(body).strip()))
+            header, body = line.strip(), []
+        else:
+            body.append(line)
+    sections.append((header, "\n".join(body).strip()))
+    return [(h, b) for h, b in sections if h or b]
+
+
+def merge_summaries(summaries: List[Summary]) -> Summary:
+    """Merge markdown summaries section by section, keeping the first-seen header order."""
+    sections = {}
+    for summary in summaries:
+        for header, body in _split_sections(summary.summary):
+            sections.setdefault(header, [])
+            if body:
+                sections[header].append(body)
+
+    parts = []
+    for header, bodies in sections.items():
+        body = "\n\n".join(bodies)
+        parts.append(f"{header}\n{body}" if header else body)
+    return Summary(summary="\n\n".join(parts))
+
+
+def merge_overviews(overviews: List[ProjectOverview]) -> Optional[ProjectOverview]:
+    """Merge per-chunk overviews: concatenated summaries, all tasks, and the union of roles, stack and progress."""
+    if not overviews:
+        return None
+    team_roles, tech_stack, progress = {}, [], {}
+    for overview in overviews:
+        team_roles.update(overview.team_roles)
+        tech_stack.extend(tool for tool in overview.tech_stack or [] if tool not in tech_stack)
+        for state, items in (overview.progress or {}).items():
+            progress.setdefault(state, []).extend(item for item in items if item not in progress[state])
+    return ProjectOverview(
+        summary="\n\n".join(overview.summary for overview in overviews),
+        tasks=[task for overview in overviews for task in overview.tasks],
+        team_roles=team_roles,
+        tech_stack=tech_stack or None,
+        progress=progress or None,
+    )
+
+
+def reduce_combined(payloads: List[CombinedPayload], counts: Optional[int] = None) -> CombinedPayload:
+    """Merge per-chunk COMBINED payloads field by field."""
+    summaries = [Summary(summary=payload.summary) for payload in payloads if payload.summary]
+    return CombinedPayload(
+        tickets=reduce_payloads(payloads, counts).tickets,
+        overview=merge_overviews([payload.overview for payload in payloads if payload.overview]),
+        summary=merge_summaries(summaries).summary if summaries else None,
+    )
@@ -0,0 +1,250 @@
+import asyncio
+import datetime
+import hashlib
+import json
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import metrics
+from prompts import SplitPrompt
+
+
+class GeminiContextCacheBackend:
+    """Explicit context caches through the Gemini CacheService (google-ai-generativelanguage)."""
+
+    def __init__(self, api_key: Optional[str]):
+        self.api_key = api_key
+        self._client = None
+        self._lock = threading.Lock()
+
+    def _service(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    from google.ai import generativelanguage_v1beta as glm
+
+                    self._client = glm.CacheServiceClient(client_options={"api_key": self.api_key})
+        return self._client
+
+    def create(self, model: str, system_text: str, ttl: float) -> Tuple[str, float]:
+        from google.ai import generativelanguage_v1beta as glm
+        from google.protobuf import duration_pb2
+
+        cached = self._service().create_cached_content(
+            cached_content=glm.CachedContent(
+                model=model if model.startswith("models/") else f"models/{model}",
+                system_instruction=glm.Content(parts=[glm.Part(text=system_text)]),
+                ttl=duration_pb2.Duration(seconds=int(ttl)),
+            )
+        )
+        return cached.name, cached.expire_time.timestamp()
+
+    def renew(self, name: str, ttl: float) -> float:
+        from google.ai import generativelanguage_v1beta as glm
+        from google.protobuf import duration_pb2, field_mask_pb2
+
+        cached = self._service().update_cached_content(
+            cached_content=glm.CachedContent(name=name, ttl=duration_pb2.Duration(seconds=int(ttl))),
+            update_mask=field_mask_pb2.FieldMask(paths=["ttl"]),
+        )
+        return cached.expire_time.timestamp()
+
+    def delete(self, name: str) -> None:
+        self._service().delete_cached_content(name=name)
+
+
+@dataclass
+class CacheHandle:
+    name: str
+    expires: float
+    model: str
+    prompt_type: str
+    digest: str
+
+
+class ContextCacheManager:
+    """Keeps one provider-side cache per (model, static prefix), renewing it before it expires
+    and deleting the previous one when a prompt file change produces a new prefix.
+
+    Handles are also written to the shared store, if any, so all workers reuse the same cache.
+    """
+
+    def __init__(
+        self,
+        backend,
+        ttl: float = 3600.0,
+        renew_margin: float = 300.0,
+        retry_interval: float = 3600.0,
+        store=None,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.backend = backend
+        self.ttl = ttl
+        self.renew_margin = renew_margin
+        self.retry_interval = retry_interval
+        self.store = store
+        self.clock = clock
+        self._handles: Dict[str, CacheHandle] = {}
+        self._current: Dict[Tuple[str, str], str] = {}
+        self._failed: Dict[str, float] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    @staticmethod
+    def _key(model: str, static: str) -> Tuple[str, str]:
+        digest = hashlib.sha256(static.encode("utf-8")).hexdigest()[:16]
+        return f"{model}:{digest}", digest
+
+    def _lookup(self, key: str) -> Optional[CacheHandle]:
+        handle = self._handles.get(key)
+        if handle is None and self.store is not None:
+            raw = self.store.get("context_caches", key)
+            if raw:
+                handle = self._handles[key] = CacheHandle(**json.loads(raw))
+        return handle
+
+    def _remember(self, key: str, handle: CacheHandle) -> None:
+        self._handles[key] = handle
+        if self.store is not None:
+            self.store.set("context_caches", key, json.dumps(asdict(handle)), ttl=max(1.0, handle.expires - self.clock()))
+
+    def _forget(self, key: str) -> Optional[CacheHandle]:
+        handle = self._handles.pop(key, None)
+        if self.store is not None:
+            self.store.delete("context_caches", key)
+        return handle
+
+    async def handle(self, model: str, prompt: SplitPrompt) -> Optional[str]:
+        """Return a live cache name for the prompt's static prefix, creating or renewing it as needed."""
+        if self.backend is None:
+            return None
+        key, digest = self._key(model, prompt.static)
+        if self._failed.get(key, 0.0) > self.clock():
+            return None
+
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            previous = self._current.get((model, prompt.prompt_type))
+            if previous is not None and previous != key:
+                # The prompt file changed: the old prefix will never be asked for again
+                await self._delete(previous)
+                metrics.context_cache_events.inc(event="invalidate")
+            self._current[(model, prompt.prompt_type)] = key
+
+            handle = self._lookup(key)
+            now = self.clock()
+            if handle is not None and handle.expires <= now:
+                self._forget(key)
+                handle = None
+            if handle is not None and handle.expires - now < self.renew_margin:
+                try:
+                    handle.expires = await asyncio.to_thread(self.backend.renew, handle.name, self.ttl)
+                    self._remember(key, handle)
+                    metrics.context_cache_events.inc(event="renew")
+                except Exception as e:
+                    print(f"Context cache renew failed for {handle.name}: {e}")
+                    self._forget(key)
+                    handle = None
+            if handle is None:
+                try:
+                    name, expires = await asyncio.to_thread(self.backend.create, model, prompt.static, self.ttl)
+                except Exception as e:
+                    # Commonly: prefix below the model's minimum cacheable size. Do not retry for a while
+                    print(f"Context cache create failed for {model}/{prompt.prompt_type}: {e}")
+                    self._failed[key] = now + self.retry_interval
+                    metrics.context_cache_events.inc(event="create_failed")
+                    return None
+                handle = CacheHandle(name=name, expires=expires, model=model, prompt_type=prompt.prompt_type, digest=digest)
+                self._remember(key, handle)
+                metrics.context_cache_events.inc(event="create")
+            else:
+                metrics.context_cache_events.inc(event="hit")
+            return handle.name
+
+    async def invalidate(self, name: str) -> None:
+        """Drop a handle the provider no longer recognises."""
+        for key, handle in list(self._handles.items()):
+            if handle.name == name:
+                self._forget(key)
+
+    async def _delete(self, key: str) -> None:
+        handle = self._forget(key)
+        if handle is not None:
+            try:
+                await asyncio.to_thread(self.backend.delete, handle.name)
+            except Exception as e:
+                print(f"Context cache delete failed for {handle.name}: {e}")
+
+    async def close(self) -> None:
+        for key in list(self._handles):
+            await self._delete(key)
+
+    def stats(self) -> Dict[str, Any]:
+        now = self.clock()
+        return {
+            "enabled": self.backend is not None,
+            "handles": [
+                {
+                    "model": handle.model,
+                    "prompt_type": handle.prompt_type,
+                    "digest": handle.digest,
+                    "expires_in": round(handle.expires - now, 1),
+                    "expires_at": datetime.datetime.fromtimestamp(handle.expires, datetime.timezone.utc).isoformat(),
+                }
+                for handle in self._handles.values()
+            ],
+            "backing_off": sum(1 for until in self._failed.values() if until > now),
+        }
+
+
+def _is_missing_cache(error: Exception) -> bool:
+    text = str(error).lower()
+    return "cachedcontent" in text.replace(" ", "").replace("_", "") and ("not found" in text or "not exist" in text or "expired" in text)
+
+
+class ContextCachedModel:
+    """Router backend that sends only the per-request suffix of a SplitPrompt when its prefix is cached.
+
+    `cached_model` must not bind tools or a system instruction: Gemini rejects both alongside cached content.
+    Any other prompt, or a prefix that could not be cached, goes to `model` in full.
+    """
+
+    def __init__(self, name: str, model, cached_model, manager: ContextCacheManager):
+        self.name = name
+        self.model = model
+        self.cached_model = cached_model
+        self.manager = manager
+
+    def warm(self):
+        for model in (self.model, self.cached_model):
+            if hasattr(model, "warm"):
+                model.warm()
+
+    async def _cached(self, prompt) -> Optional[str]:
+        if isinstance(prompt, SplitPrompt):
+            return await self.manager.handle(self.name, prompt)
+        return None
+
+    async def ainvoke(self, prompt, **kwargs):
+        cache_name = await self._cached(prompt)
+        if cache_name is not None:
+            try:
+                result = await self.cached_model.ainvoke(prompt.dynamic, cached_content=cache_name, **kwargs)
+                metrics.context_cache_chars.inc(len(prompt.static), prompt_type=prompt.prompt_type)
+                return result
+            except Exception as e:
+                if not _is_missing_cache(e):
+                    raise
+                await self.manager.invalidate(cache_name)
+        return await self.model.ainvoke(prompt, **kwargs)
+
+    async def astream(self, prompt, **kwargs):
+        cache_name = await self._cached(prompt)
+        if cache_name is not None:
+            metrics.context_cache_chars.inc(len(prompt.static), prompt_type=prompt.prompt_type)
+            async for chunk in self.cached_model.astream(prompt.dynamic, cached_content=cache_name, **kwargs):
+                yield chunk
+            return
+        async for chunk in self.model.astream(prompt, **kwargs):
+            yield chunk
@@ -0,0 +1,422 @@
+import datetime
+import re
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Tuple
+
+DUE_DATE_FORMAT = "%Y-%m-%dT%H:%M:%S.%fZ"
+# Date-only deadlines are due at the end of that day
+END_OF_DAY = datetime.time(23, 59, 59, 999000)
+
+MONTHS = {
+    "jan": 1, "feb": 2, "mar": 3, "apr": 4, "may": 5, "jun": 6,
+    "jul": 7, "aug": 8, "sep": 9, "oct": 10, "nov": 11, "dec": 12,
+}
+WEEKDAYS = {"monday": 0, "tuesday": 1, "wednesday": 2, "thursday": 3, "friday": 4, "saturday": 5, "sunday": 6}
+KO_WEEKDAYS = {"월": 0, "화": 1, "수": 2, "목": 3, "금": 4, "토": 5, "일": 6}
+NUMBER_WORDS = {"a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7, "ten": 10}
+
+_MONTH_NAME = r"(jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|aug(?:ust)?|sep(?:t(?:ember)?)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?)"
+_WEEKDAY = r"(monday|tuesday|wednesday|thursday|friday|saturday|sunday)"
+
+@dataclass
+class DateMention:
+    start: int
+    end: int
+    date: datetime.date
+    time: Optional[datetime.time] = None
+    relative: bool = True
+    # Also reads as something other than a date ("3/4 done", "I may 2 hours"); see `in_context`
+    ambiguous: bool = False
+    # Zone of the reference the date and time were resolved in; None means UTC
+    tzinfo: Optional[datetime.tzinfo] = None
+
+    def due_date(self) -> str:
+        return format_due_date(self.date, self.time, self.tzinfo)
+
+
+def format_due_date(date: datetime.date, time: Optional[datetime.time] = None, tzinfo: Optional[datetime.tzinfo] = None) -> str:
+    """Format as the strict due date `Ticket` accepts: YYYY-MM-DDTHH:MM:SS.000Z.
+
+    `date` and `time` are wall-clock values in `tzinfo` (UTC when None); this is the one place they
+    are converted to UTC.
+    """
+    moment = datetime.datetime.combine(date, time or END_OF_DAY)
+    if tzinfo is not None:
+        moment = moment.replace(tzinfo=tzinfo).astimezone(datetime.timezone.utc)
+    return moment.strftime(DUE_DATE_FORMAT)[:-4] + "Z"
+
+
+def reference_time(timestamp: Optional[str] = None) -> datetime.datetime:
+    """Parse a request timestamp (ISO 8601, `Z` allowed) keeping its UTC offset; naive ones are UTC. Default now.
+
+    Relative dates are resolved on the reference's own calendar, so "tomorrow" means the sender's tomorrow.
+    """
+    if timestamp:
+        try:
+            moment = datetime.datetime.fromisoformat(timestamp.strip().replace("Z", "+00:00"))
+            return moment if moment.tzinfo is not None else moment.replace(tzinfo=datetime.timezone.utc)
+        except ValueError:
+            pass
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+def _offset_label(reference: datetime.datetime) -> str:
+    """" +09:00" for a reference outside UTC, so annotated local times cannot be read as UTC."""
+    offset = reference.utcoffset()
+    if not offset:
+        return ""
+    minutes = int(offset.total_seconds()) // 60
+    hours, minutes = divmod(abs(minutes), 60)
+    return f" {'-' if offset < datetime.timedelta(0) else '+'}{hours:02d}:{minutes:02d}"
+
+
+def _safe_date(year: int, month: int, day: int) -> Optional[datetime.date]:
+    try:
+        return datetime.date(year, month, day)
+    except ValueError:
+        return None
+
+
+def _upcoming(reference: datetime.date, month: int, day: int) -> Optional[datetime.date]:
+    """Month/day without a year: this year, or next year if that is more than a month in the past."""
+    date = _safe_date(reference.year, month, day)
+    if date is not None and (reference - date).days > 31:
+        date = _safe_date(reference.year + 1, month, day)
+    return date
+
+
+def _next_weekday(reference: datetime.date, weekday: int, allow_today: bool = False) -> datetime.date:
+    days = (weekday - reference.weekday()) % 7
+    if days == 0 and not allow_today:
+        days = 7
+    return reference + datetime.timedelta(days=days)
+
+
+def _week_day(reference: datetime.date, weeks: int, weekday: int) -> datetime.date:
+    """`weekday` of the week `weeks` after the reference's (weeks start on Monday)."""
+    monday = reference - datetime.timedelta(days=reference.weekday())
+    return monday + datetime.timedelta(weeks=weeks, days=weekday)
+
+
+def _add_months(reference: datetime.date, months: int) -> datetime.date:
+    month = reference.month - 1 + months
+    year, month = reference.year + month // 12, month % 12 + 1
+    for day in (reference.day, 30, 29, 28):
+        date = _safe_date(year, month, day)
+        if date is not None:
+            return date
+    return reference
+
+
+def _end_of_month(reference: datetime.date) -> datetime.date:
+    return _add_months(reference.replace(day=1), 1) - datetime.timedelta(days=1)
+
+
+def _count(word: str) -> int:
+    return int(word) if word.isdigit() else NUMBER_WORDS.get(word.lower(), 1)
+
+
+def _week_offset(word: Optional[str]) -> int:
+    word = (word or "").lower()
+    if word in ("next", "다음", "담"):
+        return 1
+    if word == "다다음":
+        return 2
+    return 0
+
+
+# Each pattern only runs when the lowercased text contains one of its gate substrings
+DIGITS = tuple("0123456789")
+_MONTH_GATE = tuple(MONTHS)
+
+# Handlers return (date, time, relative); time is None for date-only expressions
+_Resolved = Tuple[Optional[datetime.date], Optional[datetime.time], bool]
+
+
+def _iso(m: re.Match, ref: datetime.date) -> _Resolved:
+    date = _safe_date(int(m[1]), int(m[2]), int(m[3]))
+    time = datetime.time(int(m[4]), int(m[5]), int(m[6] or 0)) if m[4] and int(m[4]) < 24 and int(m[5]) < 60 else None
+    return date, time, False
+
+
+def _day_month_year(m: re.Match, ref: datetime.date) -> _Resolved:
+    day, month, year = int(m[1]), int(m[2]), int(m[3])
+    if month > 12 and day <= 12:
+        # MM-DD-YYYY rather than DD-MM-YYYY
+        day, month = month, day
+    return _safe_date(year, month, day), None, False
+
+
+def _month_day(m: re.Match, ref: datetime.date) -> _Resolved:
+    return _upcoming(ref, int(m[1]), int(m[2])), None, True
+
+
+def _month_name_day(m: re.Match, ref: datetime.date) -> _Resolved:
+    month, day = MONTHS[m[1][:3].lower()], int(m[2])
+    if m[3]:
+        return _safe_date(int(m[3]), month, day), None, False
+    return _upcoming(ref, month, day), None, True
+
+
+def _day_month_name(m: re.Match, ref: datetime.date) -> _Resolved:
+    month, day = MONTHS[m[2][:3].lower()], int(m[1])
+    if m[3]:
+        return _safe_date(int(m[3]), month, day), None, False
+    return _upcoming(ref, month, day), None, True
+
+
+def _relative_day(m: re.Match, ref: datetime.date) -> _Resolved:
+    word = re.sub(r"\s+", " ", m[0].lower())
+    offsets = {
+        "today": 0, "tonight": 0, "eod": 0, "end of day": 0, "end of the day": 0, "tomorrow": 1,
+        "day after tomorrow": 2, "the day after tomorrow": 2, "yesterday": -1,
+        "오늘": 0, "금일": 0, "내일": 1, "명일": 1, "모레": 2, "내일모레": 2, "내일 모레": 2, "글피": 3, "어제": -1,
+    }
+    return ref + datetime.timedelta(days=offsets[word]), None, True
+
+
+def _in_units(m: re.Match, ref: datetime.date) -> _Resolved:
+    count, unit = _count(m[1]), m[2].lower()
+    if unit.startswith(("month", "개월", "달")):
+        return _add_months(ref, count), None, True
+    days = count * 7 if unit.startswith(("week", "주")) else count
+    return ref + datetime.timedelta(days=days), None, True
+
+
+def _period(m: re.Match, ref: datetime.date) -> _Resolved:
+    offset, unit = _week_offset(m[1]), m[2].lower()
+    if unit.startswith("month"):
+        return (_add_months(ref.replace(day=1), 1) if offset else _end_of_month(ref)), None, True
+    if unit == "weekend":
+        return _week_day(ref, offset, 5), None, True
+    # "this week" / "next week" as a deadline: the Friday of that week
+    return max(ref, _week_day(ref, offset, 4)), None, True
+
+
+def _end_of(m: re.Match, ref: datetime.date) -> _Resolved:
+    word = m[0].lower()
+    if "week" in word or word == "eow":
+        return max(ref, _week_day(ref, 0, 4)), None, True
+    return _end_of_month(ref), None, True
+
+
+def _weekday(m: re.Match, ref: datetime.date) -> _Resolved:
+    qualifier, weekday = (m[1] or "").lower(), WEEKDAYS[m[2].lower()]
+    if qualifier == "next":
+        # "next Friday": the Friday of next week, not the coming one
+        return _week_day(ref, 1, weekday), None, True
+    # Bare or "this"/"coming" weekday: the next one after the reference ("this" may mean today)
+    return _next_weekday(ref, weekday, allow_today=qualifier == "this"), None, True
+
+
+def _ko_weekday(m: re.Match, ref: datetime.date) -> _Resolved:
+    weekday = KO_WEEKDAYS[m[2]]
+    if m[1]:
+        return _week_day(ref, _week_offset(m[1]), weekday), None, True
+    return _next_weekday(ref, weekday), None, True
+
+
+def _ko_week(m: re.Match, ref: datetime.date) -> _Resolved:
+    offset = _week_offset(m[1])
+    if m[2]:
+        return _week_day(ref, offset, 5), None, True
+    return max(ref, _week_day(ref, offset, 4)), None, True
+
+
+def _ko_weekend(m: re.Match, ref: datetime.date) -> _Resolved:
+    return _next_weekday(ref, 5, allow_today=True), None, True
+
+
+def _ko_month_day(m: re.Match, ref: datetime.date) -> _Resolved:
+    month, day = int(m[2]), int(m[3])
+    if m[1]:
+        return _safe_date(int(m[1]), month, day), None, False
+    return _upcoming(ref, month, day), None, True
+
+
+def _ko_day(m: re.Match, ref: datetime.date) -> _Resolved:
+    # "15일까지": the 15th of this month, or of next month once it has passed
+    day = int(m[1])
+    date = _safe_date(ref.year, ref.month, day)
+    if date is None or date < ref:
+        date = _safe_date(*_add_months(ref.replace(day=1), 1).timetuple()[:2], day)
+    return date, None, True
+
+
+def _ko_next_month(m: re.Match, ref: datetime.date) -> _Resolved:
+    return _add_months(ref.replace(day=1), 1), None, True
+
+
+_DATE_PATTERNS: List[Tuple[re.Pattern, Callable[[re.Match, datetime.date], _Resolved], Tuple[str, ...]]] = [
+    (re.compile(r"\b(\d{4})[-/.](\d{1,2})[-/.](\d{1,2})(?:[T ](\d{1,2}):(\d{2})(?::(\d{2})(?:\.\d+)?)?(?:Z|[+-]\d{2}:?\d{2})?)?\b"), _iso, DIGITS),
+    (re.compile(r"\b(\d{1,2})[-/.](\d{1,2})[-/.](\d{4})\b"), _day_month_year, DIGITS),
+    (re.compile(r"(?<![\d/])(\d{1,2})/(\d{1,2})(?![\d/])"), _month_day, ("/",)),
+    (re.compile(_MONTH_NAME + r"\.?\s+(\d{1,2})(?:st|nd|rd|th)?\b(?:,?\s+(\d{4})\b)?", re.IGNORECASE), _month_name_day, _MONTH_GATE),
+    (re.compile(r"\b(\d{1,2})(?:st|nd|rd|th)?\s+(?:of\s+)?" + _MONTH_NAME + r"\b(?:,?\s+(\d{4})\b)?", re.IGNORECASE), _day_month_name, _MONTH_GATE),
+    (re.compile(r"\b(?:(?:the\s+)?day\s+after\s+tomorrow|today|tonight|tomorrow|yesterday|eod|end\s+of\s+(?:the\s+)?day)\b", re.IGNORECASE), _relative_day, ("today", "tonight", "tomorrow", "yesterday", "eod", "end of")),
+    (re.compile(r"\bin\s+(\d+|an?|one|two|three|four|five|six|seven|ten)\s+(days?|weeks?|months?)\b", re.IGNORECASE), _in_units, ("day", "week", "month")),
+    (re.compile(r"\b(\d+|an?|one|two|three|four|five|six|seven|ten)\s+(days?|weeks?|months?)\s+from\s+(?:now|today)\b", re.IGNORECASE), _in_units, ("from now", "from today")),
+    (re.compile(r"\b(this|next|coming)\s+(week|weekend|month)\b", re.IGNORECASE), _period, ("week", "month")),
+    (re.compile(r"\b(?:end\s+of\s+(?:the\s+)?(?:week|month)|eow|eom)\b", re.IGNORECASE), _end_of, ("end of", "eow", "eom")),
+    (re.compile(r"\b(?:(next|this|coming)\s+)?" + _WEEKDAY + r"\b", re.IGNORECASE), _weekday, ("day",)),
+    (re.compile(r"(내일\s?모레|오늘|금일|내일|명일|모레|글피|어제)"), _relative_day, ("오늘", "금일", "내일", "명일", "모레", "글피", "어제")),
+    (re.compile(r"(\d+)\s*(일|주|개월|달)\s*(?:후|뒤|이내|안에)"), _in_units, ("후", "뒤", "이내", "안에")),
+    (re.compile(r"(?:(이번|다음|담|다다음)\s*주\s*)?([월화수목금토일])요일"), _ko_weekday, ("요일",)),
+    (re.compile(r"(이번|다음|담|다다음)\s*주(말)?"), _ko_week, ("주",)),
+    (re.compile(r"주말"), _ko_weekend, ("주말",)),
+    (re.compile(r"(?:(\d{4})\s*년\s*)?(\d{1,2})\s*월\s*(\d{1,2})\s*일"), _ko_month_day, ("월",)),
+    (re.compile(r"(?<![\d월])(\d{1,2})\s*일\s*(?=까지|에|날|전까지)"), _ko_day, ("일",)),
+    (re.compile(r"(?:이번\s*)?(?:달|월)\s*말|월말"), _end_of, ("말",)),
+    (re.compile(r"다음\s*달"), _ko_next_month, ("달",)),
+]
+
+_TIME_PATTERNS: List[Tuple[re.Pattern, Tuple[str, ...]]] = [
+    (re.compile(r"\b(?:at\s+|by\s+)?(\d{1,2})(?::(\d{2}))?\s*([ap])\.?m\.?(?![a-z])", re.IGNORECASE), ("am", "pm", "a.m", "p.m")),
+    (re.compile(r"\b(?:at\s+|by\s+)?([01]?\d|2[0-3]):([0-5]\d)\b(?!\s*[ap]\.?m)", re.IGNORECASE), (":",)),
+    (re.compile(r"(오전|오후|아침|점심|저녁|밤|새벽|낮)?\s*(\d{1,2})\s*시(?!간|작)(?:\s*(\d{1,2})\s*분|\s*(반))?"), ("시",)),
+    (re.compile(r"\b(noon)\b|(정오)", re.IGNORECASE), ("noon", "정오")),
+]
+_PM = {"p", "오후", "저녁", "밤"}
+# Month names that are also common words, so "may 2" alone is not taken for a date
+_AMBIGUOUS_MONTHS = {"may", "mar", "march"}
+# What makes an ambiguous mention a date: "by 3/4", "due May 2", "Fri 3/4", "5/3까지"
+_CONTEXT_BEFORE = re.compile(
+    r"(?:\b(?:by|due|date|on|until|till|til|before|after|from|since|starting|deadline|mon|tues?|wed|thu(?:rs?)?|fri|sat|sun)\.?"
+    r"|" + _WEEKDAY + r"|마감)[\s:,]*$",
+    re.IGNORECASE,
+)
+_CONTEXT_AFTER = re.compile(r"^\s*(?:까지|전까지|마감|deadline)", re.IGNORECASE)
+# A time this close after (or before) a date belongs to it: "tomorrow at 7pm", "내일 저녁 7시"
+_JOIN_GAP = re.compile(r"^[\s,]*(?:at|by|before|until|around|에|까지)?[\s,]*$", re.IGNORECASE)
+
+
+def _time(m: re.Match) -> Optional[datetime.time]:
+    groups = m.groups()
+    if m.re is _TIME_PATTERNS[3][0]:
+        return datetime.time(12, 0)
+    if m.re is _TIME_PATTERNS[2][0]:
+        marker, hour, minute = groups[0], int(groups[1]), int(groups[2] or (30 if groups[3] else 0))
+        if marker in _PM and hour < 12:
+            hour += 12
+        elif marker == "낮" and hour < 6:
+            hour += 12
+    elif m.re is _TIME_PATTERNS[0][0]:
+        hour, minute = int(groups[0]) % 12, int(groups[1] or 0)
+        if groups[2].lower() == "p":
+            hour += 12
+    else:
+        hour, minute = int(groups[0]), int(groups[1])
+    if hour > 23 or minute > 59:
+        return None
+    return datetime.time(hour, minute)
+
+
+def _scan(patterns, text: str, lowered: str) -> List[re.Match]:
+    """All matches of the gated-in patterns, keeping the earliest and then longest where they overlap."""
+    matches = [
+        m
+        for pattern, gate in patterns
+        if any(word in lowered for word in gate)
+        for m in pattern.finditer(text)
+        if m.end() > m.start()
+    ]
+    matches.sort(key=lambda m: (m.start(), -(m.end() - m.start())))
+    kept, end = [], -1
+    for m in matches:
+        if m.start() >= end:
+            kept.append(m)
+            end = m.end()
+    return kept
+
+
+def find_dates(text: str, reference: datetime.datetime) -> List[DateMention]:
+    """Date expressions in `text` (English and Korean) resolved against `reference`, in order."""
+    ref = reference.date()
+    lowered = text.lower()
+    mentions: List[DateMention] = []
+    for m in _scan([(pattern, gate) for pattern, _, gate in _DATE_PATTERNS], text, lowered):
+        handler = next(handler for pattern, handler, _ in _DATE_PATTERNS if pattern is m.re)
+        date, time, relative = handler(m, ref)
+        if date is not None:
+            ambiguous = m.re is _DATE_PATTERNS[2][0] or (
+                m.re is _DATE_PATTERNS[3][0] and not m[3] and m[1].lower() in _AMBIGUOUS_MONTHS
+            )
+            mentions.append(DateMention(m.start(), m.end(), date, time, relative, ambiguous, reference.tzinfo))
+
+    taken = [(mention.start, mention.end) for mention in mentions]
+    for m in _scan(_TIME_PATTERNS, text, lowered):
+        if any(start < m.end() and m.start() < end for start, end in taken):
+            continue
+        time = _time(m)
+        if time is None:
+            continue
+        owner = next(
+            (
+                mention for mention in mentions
+                if mention.time is None and (
+                    _JOIN_GAP.match(text[mention.end:m.start()]) if mention.end <= m.start() else _JOIN_GAP.match(text[m.end():mention.start])
+                )
+            ),
+            None,
+        )
+        if owner is not None:
+            owner.time = time
+            owner.start, owner.end = min(owner.start, m.start()), max(owner.end, m.end())
+        else:
+            # A bare time ("at 7pm", "저녁 7시") is today
+            mentions.append(DateMention(m.start(), m.end(), ref, time, True, tzinfo=reference.tzinfo))
+    mentions.sort(key=lambda mention: mention.start)
+    return mentions
+
+
+def in_context(text: str, mention: DateMention) -> bool:
+    """Whether an ambiguous mention reads as a date: it has a time, or a deadline word or weekday next to it."""
+    if not mention.ambiguous or mention.time is not None:
+        return True
+    return bool(_CONTEXT_BEFORE.search(text[max(0, mention.start - 24):mention.start]) or _CONTEXT_AFTER.match(text[mention.end:]))
+
+
+def annotate(text: str, reference: datetime.datetime) -> str:
+    """Append the resolved date after each relative expression: "tomorrow [=2024-02-22]"."""
+    mentions = [mention for mention in find_dates(text, reference) if mention.relative and in_context(text, mention)]
+    if not mentions:
+        return text
+    parts, last = [], 0
+    offset = _offset_label(reference)
+    for mention in mentions:
+        resolved = mention.date.isoformat() + (mention.time.strftime(" %H:%M") + offset if mention.time else "")
+        parts.append(text[last:mention.end])
+        parts.append(f" [={resolved}]")
+        last = mention.end
+    parts.append(text[last:])
+    return "".join(parts)
+
+
+def normalize_due_date(value: str, reference: Optional[datetime.datetime] = None) -> str:
+    """Rewrite a due date into the strict format, or return it unchanged if it cannot be resolved.
+
+    Without a reference only absolute dates are accepted; relative ones ("tomorrow") need one.
+    Values without an offset are wall-clock time in the reference's zone (UTC without a reference).
+    """
+    if not isinstance(value, str):
+        return value
+    text = value.strip()
+    try:
+        datetime.datetime.strptime(text, DUE_DATE_FORMAT)
+        return text
+    except ValueError:
+        pass
+    try:
+        moment = datetime.datetime.fromisoformat(text.replace("Z", "+00:00"))
+        has_time = "T" in text or " " in text
+        tzinfo = moment.tzinfo or (reference.tzinfo if reference is not None else None)
+        return format_due_date(moment.date(), moment.time() if has_time else None, tzinfo)
+    except ValueError:
+        pass
+    mentions = [
+        mention for mention in find_dates(text, reference or datetime.datetime.now())
+        if reference is not None or not mention.relative
+    ]
+    if not mentions:
+        return value
+    return mentions[0].due_date()
@@ -0,0 +1,209 @@
+import datetime
+import json
+import re
+import threading
+import uuid
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from models import Ticket
+
+# One-permutation MinHash: a single hash per shingle, spread over NUM_BINS bins
+NUM_BINS = 32
+BANDS = 8
+ROWS = NUM_BINS // BANDS
+_EMPTY = 0xFFFFFFFF
+
+_NON_WORD = re.compile(r"[^\w가-힣]+")
+
+
+def shingles(text: str, size: Optional[int] = None) -> set:
+    # Character shingles work for both spaced English and agglutinative Korean text;
+    # Hangul syllables carry more information each, so mostly-Korean text uses shorter shingles
+    text = _NON_WORD.sub(" ", text.lower()).strip()
+    if size is None:
+        hangul = sum(1 for ch in text if "가" <= ch <= "힣")
+        size = 2 if hangul * 2 > len(text.replace(" ", "")) else 4
+    if len(text) <= size:
+        return {text} if text else set()
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+def signature(features: set) -> Tuple[int, ...]:
+    bins = [_EMPTY] * NUM_BINS
+    for feature in features:
+        h = zlib.crc32(feature.encode("utf-8"))
+        index = h % NUM_BINS
+        value = h // NUM_BINS
+        if value < bins[index]:
+            bins[index] = value
+    # Densify: empty bins borrow the next filled bin so sparse texts still compare
+    if any(v != _EMPTY for v in bins):
+        for i in range(NUM_BINS):
+            j = i
+            while bins[j % NUM_BINS] == _EMPTY:
+                j += 1
+            if j != i:
+                bins[i] = bins[j % NUM_BINS] + (j - i) * 0x10000000
+    return tuple(bins)
+
+
+def similarity(a: Tuple[int, ...], b: Tuple[int, ...]) -> float:
+    return sum(1 for x, y in zip(a, b) if x == y) / NUM_BINS
+
+
+def _due_day(due_date: Optional[str]) -> Optional[int]:
+    try:
+        return datetime.date.fromisoformat(due_date[:10]).toordinal()
+    except (TypeError, ValueError):
+        return None
+
+
+def ticket_identity(ticket: Ticket) -> Tuple[Tuple[int, ...], Optional[int]]:
+    """What two tickets are compared on: a MinHash signature of the title and description, and the due day."""
+    return signature(shingles(f"{ticket.title} {ticket.description}")), _due_day(ticket.due_date)
+
+
+@dataclass
+class IndexedTicket:
+    id: str
+    ticket: Optional[Ticket]
+    signature: Tuple[int, ...]
+    due_day: Optional[int]
+
+
+class TicketIndex:
+    """Near-duplicate index over one guild's open tickets, using LSH over MinHash signatures."""
+
+    def __init__(self, threshold: float = 0.5, strong_threshold: float = 0.85, date_window: int = 3, max_tickets: int = 500):
+        self.threshold = threshold
+        self.strong_threshold = strong_threshold
+        self.date_window = date_window
+        self.max_tickets = max_tickets
+        self._tickets: "OrderedDict[str, IndexedTicket]" = OrderedDict()
+        self._buckets: Dict[Tuple[int, bytes], set] = {}
+
+    def _bands(self, sig: Tuple[int, ...]):
+        for band in range(BANDS):
+            rows = sig[band * ROWS:(band + 1) * ROWS]
+            yield band, b"".join(v.to_bytes(5, "little") for v in rows)
+
+    def find_duplicate(self, ticket: Ticket) -> Optional[Tuple[str, float]]:
+        return self.find_similar(*ticket_identity(ticket))
+
+    def find_similar(self, sig: Tuple[int, ...], due_day: Optional[int]) -> Optional[Tuple[str, float]]:
+        candidates = set()
+        for key in self._bands(sig):
+            candidates |= self._buckets.get(key, set())
+
+        best = None
+        for ticket_id in candidates:
+            entry = self._tickets[ticket_id]
+            score = similarity(sig, entry.signature)
+            if score < self.threshold:
+                continue
+            # Similar text with far-apart due dates is usually a recurring task, not a duplicate
+            near = due_day is None or entry.due_day is None or abs(due_day - entry.due_day) <= self.date_window
+            if (near or score >= self.strong_threshold) and (best is None or score > best[1]):
+                best = (ticket_id, score)
+        return best
+
+    def add(self, ticket: Ticket, ticket_id: Optional[str] = None) -> str:
+        return self.add_identity(ticket_id or uuid.uuid4().hex[:12], *ticket_identity(ticket), ticket=ticket)
+
+    def add_identity(self, ticket_id: str, sig: Tuple[int, ...], due_day: Optional[int], ticket: Optional[Ticket] = None) -> str:
+        """Index a ticket known only by its identity, e.g. one recorded by an earlier calendar sync."""
+        self._tickets[ticket_id] = IndexedTicket(ticket_id, ticket, sig, due_day)
+        for key in self._bands(sig):
+            self._buckets.setdefault(key, set()).add(ticket_id)
+        while len(self._tickets) > self.max_tickets:
+            self.remove(next(iter(self._tickets)))
+        return ticket_id
+
+    def remove(self, ticket_id: str) -> bool:
+        entry = self._tickets.pop(ticket_id, None)
+        if entry is None:
+            return False
+        for key in self._bands(entry.signature):
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.discard(ticket_id)
+                if not bucket:
+                    del self._buckets[key]
+        return True
+
+    def open_tickets(self) -> List[IndexedTicket]:
+        return list(self._tickets.values())
+
+
+class TicketIndexStore:
+    """Per-guild ticket indexes.
+
+    With a shared `store`, each guild's open tickets live there and the index is rebuilt
+    from them on access, so every worker deduplicates against the same tickets.
+    """
+
+    def __init__(self, store=None, **index_options):
+        self.store = store
+        self.index_options = index_options
+        self._indexes: Dict[str, TicketIndex] = {}
+        self._lock = threading.Lock()
+
+    def _index(self, guild_id: str) -> TicketIndex:
+        if self.store is not None:
+            index = TicketIndex(**self.index_options)
+            for entry in json.loads(self.store.get("tickets", guild_id) or "[]"):
+                index.add(Ticket.model_validate(entry["ticket"]), entry["id"])
+            return index
+        index = self._indexes.get(guild_id)
+        if index is None:
+            index = self._indexes[guild_id] = TicketIndex(**self.index_options)
+        return index
+
+    def _persist(self, guild_id: str, index: TicketIndex) -> None:
+        if self.store is not None:
+            entries = [{"id": entry.id, "ticket": entry.ticket.model_dump()} for entry in index.open_tickets()]
+            self.store.set("tickets", guild_id, json.dumps(entries, ensure_ascii=False))
+
+    def get(self, guild_id: str) -> TicketIndex:
+        with self._lock:
+            return self._index(guild_id)
+
+    def remove(self, guild_id: str, ticket_id: str) -> bool:
+        with self._lock:
+            index = self._index(guild_id)
+            removed = index.remove(ticket_id)
+            if removed:
+                self._persist(guild_id, index)
+            return removed
+
+    def dedupe(self, guild_id: str, tickets: List[Ticket], merge: bool = False) -> List[Ticket]:
+        """Flag (or drop, when `merge`) tickets that duplicate open ones, and index the rest."""
+        with self._lock:
+            index = self._index(guild_id)
+            kept = []
+            for ticket in tickets:
+                duplicate = index.find_duplicate(ticket)
+                if duplicate is not None:
+                    if merge:
+                        continue
+                    ticket = ticket.model_copy(update={"id": None, "duplicate_of": duplicate[0]})
+                else:
+                    ticket = ticket.model_copy(update={"id": index.add(ticket), "duplicate_of": None})
+                kept.append(ticket)
+            self._persist(guild_id, index)
+            return kept
+
+    def context(self, guild_id: str, limit: int = 30) -> str:
+        """Compact listing of open tickets to put in the prompt instead of re-deriving them."""
+        with self._lock:
+            entries = self._index(guild_id).open_tickets()[-limit:]
+        if not entries:
+            return ""
+        lines = [
+            f"- {entry.ticket.title} ({entry.ticket.assignee or 'Unassigned'}, due {entry.ticket.due_date[:10]})"
+            for entry in entries
+        ]
+        return "\n### Existing Open Tickets (do not create these again)\n" + "\n".join(lines) + "\n"
@@ -0,0 +1,29 @@
+"""Multi-worker deployment: `gunicorn -c gunicorn.conf.py main:app` from Tickr_AI_Server/.
+
+Set SHARED_STATE_URL so workers share caches, tokens, channel state and job status:
+    sqlite:///data/shared.sqlite3   all workers on one host
+    redis://host:6379/0             workers on several hosts (needs the `redis` package)
+"""
+import multiprocessing
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# Workers read this to split the outbound Gemini/Calendar quotas between them
+os.environ["WEB_CONCURRENCY"] = str(workers)
+
+# The app opens SQLite connections at import, so it must load in each worker, not before fork
+preload_app = False
+
+# /extract can hold a connection for a whole model call
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = 5
+
+# Recycle workers now and then to bound memory growth, staggered so they do not restart together
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "2000"))
+max_requests_jitter = max_requests // 10
+
+accesslog = "-"
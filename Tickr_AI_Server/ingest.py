@@ -0,0 +1,136 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional
+
+from models import Message
+
+
+def format_line(msg: Message) -> str:
+    return f"- {msg.author}: {msg.content}"
+
+
+def _id_key(message_id: str):
+    # Discord snowflakes are numeric and increase over time; fall back to string order otherwise
+    return (0, int(message_id), "") if message_id.isdigit() else (1, 0, message_id)
+
+
+@dataclass
+class ChannelState:
+    cursor: Optional[str] = None
+    digest: List[str] = field(default_factory=list)
+    updated: float = 0.0
+
+
+class ChannelStateStore:
+    """Per-channel cursor and rolling digest of already-processed chat.
+
+    With a shared `store`, state is read through on every call so all workers see the same cursor.
+    """
+
+    def __init__(self, digest_chars: int = 4000, line_chars: int = 200, path: Optional[str] = None, store=None):
+        self.digest_chars = digest_chars
+        self.line_chars = line_chars
+        self.store = store
+        self._states: Dict[str, ChannelState] = {}
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS channels (channel_id TEXT PRIMARY KEY, cursor TEXT, digest TEXT NOT NULL, updated REAL NOT NULL)"
+            )
+            self._db.commit()
+
+    def get(self, channel_id: str) -> ChannelState:
+        with self._lock:
+            return self._load(channel_id)
+
+    def _load(self, channel_id: str) -> ChannelState:
+        if self.store is not None:
+            raw = self.store.get("channels", channel_id)
+            return ChannelState(**json.loads(raw)) if raw else ChannelState()
+        state = self._states.get(channel_id)
+        if state is None:
+            state = ChannelState()
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT cursor, digest, updated FROM channels WHERE channel_id = ?", (channel_id,)
+                ).fetchone()
+                if row is not None:
+                    state = ChannelState(cursor=row[0], digest=json.loads(row[1]), updated=row[2])
+            self._states[channel_id] = state
+        return state
+
+    def new_messages(self, channel_id: str, messages: List[Message]) -> List[Message]:
+        """Drop messages at or before the stored cursor and return the rest oldest-first.
+
+        Messages without an ID cannot be placed against the cursor and are dropped; ChatRequest
+        rejects incremental requests containing them.
+        """
+        state = self.get(channel_id)
+        messages = sorted((msg for msg in messages if msg.id), key=lambda msg: _id_key(msg.id))
+        if state.cursor is not None:
+            cursor = _id_key(state.cursor)
+            messages = [msg for msg in messages if _id_key(msg.id) > cursor]
+        return messages
+
+    def build_chat_slice(self, channel_id: str, messages: List[Message]) -> str:
+        state = self.get(channel_id)
+        new_lines = "\n".join(format_line(msg) for msg in messages)
+        if not state.digest:
+            return new_lines
+        return (
+            "(Earlier messages, already processed - use for context only)\n"
+            + "\n".join(state.digest)
+            + "\n\n(New messages)\n"
+            + new_lines
+        )
+
+    def commit(self, channel_id: str, messages: List[Message], seen: Optional[List[Message]] = None) -> ChannelState:
+        """Fold `messages` into the digest and advance the cursor past `seen` (defaults to `messages`)."""
+        with self._lock:
+            state = self._load(channel_id)
+            for msg in messages:
+                line = format_line(msg)
+                if len(line) > self.line_chars:
+                    line = line[: self.line_chars - 3] + "..."
+                state.digest.append(line)
+            for msg in messages if seen is None else seen:
+                if msg.id and (state.cursor is None or _id_key(msg.id) > _id_key(state.cursor)):
+                    state.cursor = msg.id
+
+            # Keep only the most recent lines that fit the digest budget
+            total = 0
+            keep = 0
+            for line in reversed(state.digest):
+                total += len(line) + 1
+                if total > self.digest_chars:
+                    break
+                keep += 1
+            state.digest = state.digest[len(state.digest) - keep:]
+            state.updated = time.time()
+
+            if self.store is not None:
+                self.store.set("channels", channel_id, json.dumps(asdict(state), ensure_ascii=False))
+            elif self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO channels (channel_id, cursor, digest, updated) VALUES (?, ?, ?, ?)",
+                    (channel_id, state.cursor, json.dumps(state.digest, ensure_ascii=False), state.updated),
+                )
+                self._db.commit()
+            return state
+
+    def reset(self, channel_id: str) -> None:
+        with self._lock:
+            self._states.pop(channel_id, None)
+            if self.store is not None:
+                self.store.delete("channels", channel_id)
+            elif self._db is not None:
+                self._db.execute("DELETE FROM channels WHERE channel_id = ?", (channel_id,))
+                self._db.commit()
+
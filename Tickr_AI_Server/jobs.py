@@ -0,0 +1,273 @@
+import asyncio
+import ipaddress
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import urllib.parse
+import urllib.request
+import uuid
+from typing import Awaitable, Callable, Iterable, List, Optional
+
+# Lower lanes are served first
+INTERACTIVE_LANE = 0
+BULK_LANE = 1
+
+
+class QueueFull(Exception):
+    """Raised when the queue already holds `max_pending` jobs."""
+
+
+class InvalidCallback(ValueError):
+    """Raised for a callback URL the server refuses to call."""
+
+
+def check_callback_url(url: str, allowed_hosts: Iterable[str] = ()) -> None:
+    """Refuse non-http(s) callbacks, and callbacks to private, loopback or link-local addresses.
+
+    With `allowed_hosts`, only those hosts (or their subdomains) are accepted, private or not.
+    """
+    parts = urllib.parse.urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise InvalidCallback("callback_url must be an http(s) URL")
+    host = parts.hostname.lower().rstrip(".")
+    allowed_hosts = [allowed.lower() for allowed in allowed_hosts]
+    if allowed_hosts:
+        if not any(host == allowed or host.endswith("." + allowed) for allowed in allowed_hosts):
+            raise InvalidCallback(f"callback host {host} is not allowed")
+        return
+    try:
+        infos = socket.getaddrinfo(host, parts.port or (443 if parts.scheme == "https" else 80), proto=socket.IPPROTO_TCP)
+    except (socket.gaierror, UnicodeError) as e:
+        raise InvalidCallback(f"callback host {host} does not resolve") from e
+    for info in infos:
+        address = ipaddress.ip_address(info[4][0].split("%")[0])
+        if not address.is_global or address.is_multicast:
+            raise InvalidCallback(f"callback host {host} resolves to a non-public address")
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    # A redirect could point the callback at an internal address after the check
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+class JobQueue:
+    """Worker pool over a SQLite-backed job table with priority lanes.
+
+    Workers claim jobs from the table under a renewable lease, so several processes can share
+    one queue file: a job whose worker died is picked up again once its lease runs out.
+    With a shared `store`, job status is also published there so any host can answer polls.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[dict], Awaitable[dict]],
+        path: str = "data/jobs.sqlite3",
+        workers: int = 2,
+        max_pending: int = 100,
+        result_ttl: float = 3600.0,
+        callback_retries: int = 3,
+        lease: float = 30.0,
+        poll_interval: float = 0.5,
+        store=None,
+        interactive_workers: int = 1,
+        callback_allowed_hosts: Iterable[str] = (),
+    ):
+        self.handler = handler
+        self.workers = workers
+        self.interactive_workers = interactive_workers
+        self.callback_allowed_hosts = list(callback_allowed_hosts)
+        self.max_pending = max_pending
+        self.result_ttl = result_ttl
+        self.callback_retries = callback_retries
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self.store = store
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._wake: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                lane INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                request TEXT NOT NULL,
+                result TEXT,
+                error TEXT,
+                callback_url TEXT,
+                created REAL NOT NULL,
+                updated REAL NOT NULL
+            )"""
+        )
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(jobs)")}
+        for column, kind in (("owner", "TEXT"), ("lease_until", "REAL")):
+            if column not in columns:
+                self._db.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, lane, created)")
+        self._db.commit()
+
+    def _execute(self, sql: str, params: tuple = ()) -> List[tuple]:
+        with self._lock, self._db:
+            return self._db.execute(sql, params).fetchall()
+
+    def _update(self, sql: str, params: tuple = ()) -> int:
+        with self._lock, self._db:
+            return self._db.execute(sql, params).rowcount
+
+    async def start(self) -> None:
+        self._wake = asyncio.Event()
+        # Reserved workers only take interactive jobs, so those never wait behind a full pool of bulk work
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)] + [
+            asyncio.create_task(self._worker(max_lane=INTERACTIVE_LANE)) for _ in range(self.interactive_workers)
+        ]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def pending(self) -> int:
+        return self._execute("SELECT COUNT(*) FROM jobs WHERE status IN ('queued', 'running')")[0][0]
+
+    def submit(self, request: dict, lane: int = BULK_LANE, callback_url: Optional[str] = None) -> str:
+        if self._wake is None:
+            raise RuntimeError("Job queue is not running")
+        if self.pending() >= self.max_pending:
+            raise QueueFull(f"{self.max_pending} jobs already pending")
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        self._execute(
+            "INSERT INTO jobs (id, lane, status, request, callback_url, created, updated) VALUES (?, ?, 'queued', ?, ?, ?, ?)",
+            (job_id, lane, json.dumps(request, ensure_ascii=False), callback_url, now, now),
+        )
+        self._publish(job_id)
+        self._wake.set()
+        return job_id
+
+    def _get_local(self, job_id: str) -> Optional[dict]:
+        rows = self._execute(
+            "SELECT id, lane, status, result, error, created, updated FROM jobs WHERE id = ?", (job_id,)
+        )
+        if not rows:
+            return None
+        job_id, lane, status, result, error, created, updated = rows[0]
+        return {
+            "id": job_id,
+            "lane": lane,
+            "status": status,
+            "result": json.loads(result) if result else None,
+            "error": error,
+            "created": created,
+            "updated": updated,
+        }
+
+    def get(self, job_id: str) -> Optional[dict]:
+        job = self._get_local(job_id)
+        if job is None and self.store is not None:
+            raw = self.store.get("jobs", job_id)
+            job = json.loads(raw) if raw else None
+        return job
+
+    def _publish(self, job_id: str) -> None:
+        if self.store is not None:
+            job = self._get_local(job_id)
+            if job is not None:
+                self.store.set("jobs", job_id, json.dumps(job, ensure_ascii=False), ttl=self.result_ttl)
+
+    def _claim(self, max_lane: int = BULK_LANE) -> Optional[str]:
+        """Take the oldest queued job in the highest-priority lane up to `max_lane`, or one whose lease expired."""
+        while True:
+            now = time.time()
+            rows = self._execute(
+                "SELECT id FROM jobs WHERE (status = 'queued' OR (status = 'running' AND lease_until < ?)) AND lane <= ? "
+                "ORDER BY lane, created LIMIT 1",
+                (now, max_lane),
+            )
+            if not rows:
+                return None
+            job_id = rows[0][0]
+            claimed = self._update(
+                "UPDATE jobs SET status = 'running', owner = ?, lease_until = ?, updated = ? "
+                "WHERE id = ? AND (status = 'queued' OR (status = 'running' AND lease_until < ?))",
+                (self.owner, now + self.lease, now, job_id, now),
+            )
+            if claimed:
+                return job_id
+            # Another worker won the race; try the next job
+
+    async def _worker(self, max_lane: int = BULK_LANE) -> None:
+        while True:
+            job_id = self._claim(max_lane)
+            if job_id is None:
+                # Local submits wake us immediately; polling picks up jobs from other processes
+                try:
+                    await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wake.clear()
+                continue
+            await self._run(job_id)
+
+    async def _heartbeat(self, job_id: str) -> None:
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            self._update(
+                "UPDATE jobs SET lease_until = ? WHERE id = ? AND owner = ? AND status = 'running'",
+                (time.time() + self.lease, job_id, self.owner),
+            )
+
+    async def _run(self, job_id: str) -> None:
+        rows = self._execute("SELECT request, callback_url FROM jobs WHERE id = ?", (job_id,))
+        if not rows:
+            return
+        request, callback_url = rows[0]
+        self._publish(job_id)
+        heartbeat = asyncio.create_task(self._heartbeat(job_id))
+        try:
+            result = await self.handler(json.loads(request))
+            self._execute(
+                "UPDATE jobs SET status = 'done', result = ?, updated = ? WHERE id = ?",
+                (json.dumps(result, ensure_ascii=False), time.time(), job_id),
+            )
+        except Exception as e:
+            self._execute(
+                "UPDATE jobs SET status = 'failed', error = ?, updated = ? WHERE id = ?",
+                (str(getattr(e, "detail", None) or e), time.time(), job_id),
+            )
+        finally:
+            heartbeat.cancel()
+        self._publish(job_id)
+
+        if callback_url:
+            await asyncio.to_thread(self._deliver, callback_url, self.get(job_id))
+        self._execute(
+            "DELETE FROM jobs WHERE status IN ('done', 'failed') AND updated < ?", (time.time() - self.result_ttl,)
+        )
+
+    def _deliver(self, url: str, job: dict) -> None:
+        body = json.dumps(job, ensure_ascii=False).encode("utf-8")
+        opener = urllib.request.build_opener(_NoRedirect)
+        for attempt in range(self.callback_retries):
+            try:
+                # Checked again at delivery: the host may resolve differently than at submit time
+                check_callback_url(url, self.callback_allowed_hosts)
+                request = urllib.request.Request(url, data=body, headers={"Content-Type": "application/json"})
+                with opener.open(request, timeout=10):
+                    return
+            except InvalidCallback as e:
+                print(f"Job {job['id']} callback to {url} refused: {e}")
+                return
+            except Exception as e:
+                if attempt == self.callback_retries - 1:
+                    print(f"Job {job['id']} callback to {url} failed: {e}")
+                    return
+                time.sleep(2 ** attempt)
@@ -1,217 +1,671 @@
-import os, datetime
+import os, datetime, asyncio, time, functools
 from fastapi import FastAPI, HTTPException, Request
-from langchain_google_genai.chat_models import ChatGoogleGenerativeAI
-from langchain.prompts import ChatPromptTemplate
-from langchain.output_parsers import PydanticOutputParser
-from models import Payload, ChatRequest, PromptType, ProjectOverview, Summary, InsertEventRequest
+from models import CombinedPayload, Payload, ChatRequest, Message, PromptType, ProjectOverview, Summary, InsertEventRequest, BulkInsertEventRequest, SyncEventsRequest, BatchChatRequest, BatchItemResult
 from dotenv import load_dotenv
-import json
-import re
-from typing import Optional
-from google_auth_oauthlib.flow import Flow
+from typing import TYPE_CHECKING, List, Optional, Tuple
 from google.oauth2.credentials import Credentials
-from fastapi.responses import RedirectResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, RedirectResponse, StreamingResponse
 from pathlib import Path
-from googleapiclient.discovery import build
-from google.auth.transport.requests import Request as AuthRequest
+import metrics
+from cache import ResponseCache, make_key
+from dedup import TicketIndexStore
+from jobs import BULK_LANE, INTERACTIVE_LANE, InvalidCallback, JobQueue, QueueFull, check_callback_url
+from prompts import PROMPTS_DIR, PromptRegistry
+import calendar_sync
+import calendar_utils
+import dates
+from calendar_sync import CalendarSyncStore
+from calendar_utils import CalendarServiceCache, build_event, insert_event, insert_events
+from token_store import create_token_store
+from shared_state import create_shared_store, run_purge as run_shared_purge
+from ingest import ChannelStateStore, format_line
+from output import OutputParseError, parse_output
+from streaming import PartialFieldReader, chunk_text, format_event, tool_call_text
+from prefilter import prefilter
+from context_cache import ContextCachedModel, ContextCacheManager, GeminiContextCacheBackend
+from router import LazyModel, ModelRouter, NoModelAvailable, parse_routes
+import ratelimit
+from ratelimit import AdaptiveLimiter, RateLimited, call_with_quota, is_rate_limited
+from wire import DecodeBodyMiddleware
+from chunking import estimate_tokens, map_chunks, merge_summaries, reduce_combined, reduce_payloads, split_messages
+
+if TYPE_CHECKING:
+    from langchain_core.output_parsers import PydanticOutputParser
 
 os.environ["OAUTHLIB_INSECURE_TRANSPORT"] = "1"
 
 load_dotenv()                           
 app = FastAPI()
 
+# gzip/zstd-compressed and msgpack request bodies are decoded before they reach the JSON endpoints
+app.add_middleware(DecodeBodyMiddleware, max_body=int(os.getenv("MAX_REQUEST_BODY_BYTES", str(32 * 1024 * 1024))))
+
+# Send this header (any value) to get per-stage timings back in a Server-Timing header
+TRACE_HEADER = "X-Tickr-Trace"
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    trace = metrics.start_trace() if request.headers.get(TRACE_HEADER) else None
+    start = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    metrics.request_seconds.observe(
+        time.perf_counter() - start,
+        method=request.method,
+        path=getattr(route, "path", "unmatched"),
+        status=response.status_code,
+    )
+    if trace is not None:
+        response.headers["Server-Timing"] = metrics.server_timing(trace)
+    return response
+
 CLIENT_SECRETS_FILE = os.getenv("GOOGLE_CLIENT_SECRET")
 SCOPES = ["https://www.googleapis.com/auth/calendar"]
 
-# Load prompts from files
-PROMPTS_DIR = os.path.join(os.path.dirname(__file__), "testing_prompts_c", "prompts")
-
-def load_prompt(prompt_type: PromptType) -> str:
-    prompt_file = {
-        PromptType.TICKETS: "tickets.inp",
-        PromptType.SHORT_OVERVIEW: "short_overview.inp",
-        PromptType.LONG_OVERVIEW: "long_overview.inp",
-        PromptType.LIST_TASKS: "list_tasks.inp",
-        PromptType.SUMMARY: "summary.inp"
-    }.get(prompt_type)
-    
-    if not prompt_file:  # if the prompt file is not found
-        raise ValueError(f"Unknown prompt type: {prompt_type}")
-    
-    prompt_path = os.path.join(PROMPTS_DIR, prompt_file)
-    try:
-        with open(prompt_path, 'r', encoding='utf-8') as f:
-            return f.read()
-    except FileNotFoundError:
-        raise HTTPException(status_code=500, detail=f"Prompt file not found: {prompt_file}")
-    except UnicodeDecodeError as e:
-        raise HTTPException(status_code=500, detail=f"Error reading prompt file: {str(e)}")
-
-def clean_json_response(response: str) -> str:
-    # Remove markdown code block markers if present
-    response = re.sub(r'^```json\n', '', response)
-    response = re.sub(r'\n```$', '', response)
-    return response.strip()
+# State shared by every worker process (and host, with Redis); None keeps state process-local
+shared_store = create_shared_store()
+
+# OAuth tokens (refreshed before they expire) and the Calendar services built from them
+token_store = create_token_store(
+    SCOPES,
+    refresh_ahead=float(os.getenv("CALENDAR_REFRESH_AHEAD", "300")),
+    shared=shared_store,
+)
+calendar_services = CalendarServiceCache(token_store)
+# Per-user ticket-to-event mapping and Calendar sync token used by /sync_events
+calendar_sync_store = CalendarSyncStore(store=shared_store)
+
+# Longest a request waits for outbound quota before it is answered with a 429
+RATE_LIMIT_MAX_WAIT = float(os.getenv("RATE_LIMIT_MAX_WAIT", "30"))
+# Each worker enforces its share of the quotas below (gunicorn.conf.py sets WEB_CONCURRENCY)
+RATE_LIMIT_SHARE = float(os.getenv("RATE_LIMIT_SHARE") or 1 / max(1, int(os.getenv("WEB_CONCURRENCY", "1"))))
+
+def rate_limited_response(e: RateLimited) -> HTTPException:
+    return HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(max(1, round(e.retry_after)))})
+
+# Calendar quota is counted per inserted event, including events inside a batch request
+calendar_limiter = AdaptiveLimiter(
+    "calendar",
+    rpm=float(os.getenv("CALENDAR_RPM", "600")) * RATE_LIMIT_SHARE,
+    max_wait=RATE_LIMIT_MAX_WAIT,
+)
+CALENDAR_RATE_RETRIES = int(os.getenv("CALENDAR_RATE_RETRIES", "3"))
+
+@app.on_event("startup")
+async def start_token_expiry():
+    asyncio.create_task(token_store.run_expiry())
+    if shared_store is not None:
+        asyncio.create_task(run_shared_purge(shared_store, float(os.getenv("SHARED_STATE_PURGE_INTERVAL", "300"))))
+
+# Prompt templates are compiled once (during warm-up or on first use) and hot-reloaded when the files change
+prompt_registry = PromptRegistry(PROMPTS_DIR, check_interval=float(os.getenv("PROMPT_RELOAD_INTERVAL", "2")))
 
 # Initialize Gemini
-llm = ChatGoogleGenerativeAI(
-    model="gemini-2.0-flash",
-    api_key=os.getenv("GEMINI_API_KEY"),         
-    temperature=0.3,
-).bind_tools([Payload, ProjectOverview, Summary])
-
-def create_prompt_template(prompt_type: PromptType, counts: Optional[int] = None, timestamp: Optional[str] = None, days_of_week: Optional[str] = None) -> ChatPromptTemplate:
-    system_prompt = load_prompt(prompt_type)
-    
-    if prompt_type == PromptType.TICKETS:
-        return ChatPromptTemplate.from_messages([
-            ("system", system_prompt),
-            ("human", """
-[Date: {today}]
-
-### Few-shot Examples
-<example>
-User chat:
-- Alice: We need to finish the login page by tomorrow
-- Bob: I'll take care of it
-- Alice: Great, make sure to include password reset functionality
-- Bob: Will do, I'll prioritize that
-
-Assistant(JSON):
-{{
-    "tickets": [
-        {{
-            "title": "Complete login page",
-            "assignee": "Bob",
-            "due_date": "2024-02-21",
-            "priority": "HIGH",
-            "description": "Implement login page including password reset functionality"
-        }}
-    ]
-}}
-</example>
-
-### Chat to Analyze
-{chat_slice}
-
-Extract exactly {counts} tickets (or fewer if there aren't enough tasks) from the chat. For each task:
-1. Create a ticket with a clear title
-2. Assign it to the person who volunteered or was assigned
-3. Calculate the due date based on mentioned dates or relative time (using {timestamp} as reference)
-4. Set priority based on urgency (HIGH/MID/LOW)
-5. Write a detailed description
-
-If the message is in Korean, translate the task details to English but keep the original meaning.
-Return the tickets in JSON format matching the schema exactly.
-{format_instructions}"""
-            )
-        ]).partial(
-            today=datetime.date.today().isoformat(),
-            counts=counts or 3,  # Default to 3 if not specified
-            timestamp=timestamp or datetime.datetime.now().isoformat(),
-            days_of_week=days_of_week or datetime.datetime.now().strftime("%A").upper()
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
+
+def create_llm(model: str, tools: bool = True):
+    # Imported here: langchain_google_genai alone is most of the server's import time
+    from langchain_google_genai.chat_models import ChatGoogleGenerativeAI
+
+    llm = ChatGoogleGenerativeAI(
+        model=model,
+        api_key=os.getenv("GEMINI_API_KEY"),         
+        temperature=0.3,
+    )
+    # Gemini rejects tools on requests that use cached content, so the cached path gets a bare model
+    return llm.bind_tools([Payload, ProjectOverview, Summary, CombinedPayload]) if tools else llm
+
+# Provider-side caching of the static prompt prefix (system prompt, few-shot block, instructions).
+# Off by default: with it on, the per-request values move out of the prompt body into a trailing block.
+CONTEXT_CACHE = os.getenv("CONTEXT_CACHE", "off")
+CONTEXT_CACHE_PROMPT_TYPES = {
+    PromptType(name) for name in os.getenv("CONTEXT_CACHE_PROMPT_TYPES", "TICKETS,SUMMARY").split(",") if name
+}
+context_cache = ContextCacheManager(
+    GeminiContextCacheBackend(os.getenv("GEMINI_API_KEY")) if CONTEXT_CACHE == "gemini" else None,
+    ttl=float(os.getenv("CONTEXT_CACHE_TTL", "3600")),
+    renew_margin=float(os.getenv("CONTEXT_CACHE_RENEW_MARGIN", "300")),
+    retry_interval=float(os.getenv("CONTEXT_CACHE_RETRY_INTERVAL", "3600")),
+    store=shared_store,
+)
+
+def create_backend(model: str):
+    backend = LazyModel(functools.partial(create_llm, model))
+    if context_cache.backend is None:
+        return backend
+    return ContextCachedModel(model, backend, LazyModel(functools.partial(create_llm, model, tools=False)), context_cache)
+
+# Route each prompt type to its preferred models, failing over (and hedging slow calls) across them
+GEMINI_FALLBACK_MODELS = [name for name in os.getenv("GEMINI_FALLBACK_MODELS", "gemini-1.5-flash").split(",") if name]
+GEMINI_ROUTES = parse_routes(os.getenv("GEMINI_ROUTES", ""))
+GEMINI_LARGE_MODEL = os.getenv("GEMINI_LARGE_MODEL") or None
+llm_models = {GEMINI_MODEL, *GEMINI_FALLBACK_MODELS, *(name for route in GEMINI_ROUTES.values() for name in route)}
+if GEMINI_LARGE_MODEL:
+    llm_models.add(GEMINI_LARGE_MODEL)
+llm_router = ModelRouter(
+    {name: create_backend(name) for name in sorted(llm_models)},
+    default_route=[GEMINI_MODEL, *GEMINI_FALLBACK_MODELS],
+    routes=GEMINI_ROUTES,
+    large_model=GEMINI_LARGE_MODEL,
+    large_input_tokens=int(os.getenv("GEMINI_LARGE_INPUT_TOKENS", "100000")),
+    hedge=os.getenv("LLM_HEDGE", "1") == "1",
+    hedge_quantile=float(os.getenv("LLM_HEDGE_QUANTILE", "0.95")),
+    failure_threshold=int(os.getenv("LLM_BREAKER_FAILURES", "5")),
+    reset_timeout=float(os.getenv("LLM_BREAKER_RESET", "30")),
+    # Per-model request and token quotas, shared fairly across guilds and slowed down on 429s
+    limiters={
+        name: AdaptiveLimiter(
+            f"gemini:{name}",
+            rpm=float(os.getenv("GEMINI_RPM", "2000")) * RATE_LIMIT_SHARE,
+            tpm=float(os.getenv("GEMINI_TPM", "4000000")) * RATE_LIMIT_SHARE,
+            max_wait=RATE_LIMIT_MAX_WAIT,
         )
-    elif prompt_type == PromptType.SUMMARY:
-        return ChatPromptTemplate.from_messages([
-            ("system", system_prompt),
-            ("human", """
-[Date: {today}]
-
-### Chat to Analyze
-{chat_slice}
-
-Create a comprehensive written summary of the discussion. Focus on:
-1. Main decisions and outcomes
-2. Key points discussed
-3. Any concerns or blockers raised
-4. Future steps and recommendations
-
-Write in a natural, flowing style that captures the essence of the discussion.
-Return the summary in the specified JSON format.
-{format_instructions}"""
+        for name in sorted(llm_models)
+    },
+)
+
+# Cache parsed /extract responses so reruns over the same chat window skip the model call
+response_cache = ResponseCache(
+    max_entries=int(os.getenv("EXTRACT_CACHE_SIZE", "256")),
+    ttl=float(os.getenv("EXTRACT_CACHE_TTL", "3600")),
+    disk_path=os.getenv("EXTRACT_CACHE_PATH") or None,
+    store=shared_store,
+    max_disk_entries=int(os.getenv("EXTRACT_CACHE_DISK_SIZE", "10000")),
+)
+
+@app.on_event("startup")
+async def start_response_cache_purge():
+    asyncio.create_task(response_cache.run_purge(float(os.getenv("EXTRACT_CACHE_PURGE_INTERVAL", "300"))))
+
+metrics.registry.gauge("tickr_response_cache_hits", "Response cache hits since start", lambda: response_cache.hits)
+metrics.registry.gauge("tickr_response_cache_misses", "Response cache misses since start", lambda: response_cache.misses)
+
+# Rolling per-channel state for incremental ingestion
+channel_states = ChannelStateStore(
+    digest_chars=int(os.getenv("CHANNEL_DIGEST_CHARS", "4000")),
+    path=os.getenv("CHANNEL_STATE_PATH") or None,
+    store=shared_store,
+)
+
+# Long histories are split by token budget and map-reduced over these prompt types
+CHUNKED_PROMPT_TYPES = (PromptType.TICKETS, PromptType.SUMMARY, PromptType.COMBINED)
+EXTRACT_CHUNK_TOKENS = int(os.getenv("EXTRACT_CHUNK_TOKENS", "12000"))
+EXTRACT_CHUNK_PARALLELISM = int(os.getenv("EXTRACT_CHUNK_PARALLELISM", "4"))
+
+# Fused requests for these types share one COMBINED call (and its cached result) per chat slice
+FUSED_PROMPT_TYPES = (PromptType.TICKETS, PromptType.SUMMARY, PromptType.LONG_OVERVIEW)
+# Tickets asked of the COMBINED prompt; fused TICKETS requests get the first `counts` of them
+FUSED_TICKET_COUNTS = int(os.getenv("FUSED_TICKET_COUNTS", "10"))
+
+# Annotate relative date expressions in the chat with the dates they resolve to
+DATE_ANNOTATIONS = os.getenv("DATE_ANNOTATIONS", "1") == "1"
+
+# Extra model calls allowed when a response cannot be parsed or repaired
+OUTPUT_PARSE_RETRIES = int(os.getenv("OUTPUT_PARSE_RETRIES", "1"))
+
+# Local pre-filtering of greetings, links and off-topic chat before prompting
+PREFILTER_ENABLED = os.getenv("PREFILTER_ENABLED", "1") == "1"
+PREFILTER_TOKEN_BUDGET = int(os.getenv("PREFILTER_TOKEN_BUDGET", "32000"))
+
+# Bounded fan-out for /extract/batch
+BATCH_CONCURRENCY = int(os.getenv("EXTRACT_BATCH_CONCURRENCY", "8"))
+BATCH_MAX_ITEMS = int(os.getenv("EXTRACT_BATCH_MAX_ITEMS", "100"))
+
+# Per-guild index of open tickets used to flag or merge near-duplicates across runs
+ticket_indexes = TicketIndexStore(
+    store=shared_store,
+    threshold=float(os.getenv("DEDUP_THRESHOLD", "0.5")),
+    date_window=int(os.getenv("DEDUP_DATE_WINDOW_DAYS", "3")),
+)
+DEDUP_MERGE = os.getenv("DEDUP_MODE", "flag") == "merge"
+DEDUP_PROMPT_CONTEXT = os.getenv("DEDUP_PROMPT_CONTEXT", "1") == "1"
+
+def ticket_context(request: ChatRequest) -> str:
+    if request.prompt_type != PromptType.TICKETS or not request.guild_id or not DEDUP_PROMPT_CONTEXT:
+        return ""
+    return ticket_indexes.context(request.guild_id)
+
+def response_cache_key(request: ChatRequest, chat_slice: str) -> str:
+    # Relative due dates depend on the request day, so key on the date rather than the full timestamp.
+    # The open-ticket context is left out: it grows after every run, and the cached output is stored
+    # before dedupe, so a re-run on the same chat hits and is deduplicated against the current index.
+    reference_day = (request.timestamp or datetime.date.today().isoformat())[:10]
+    return make_key(
+        GEMINI_MODEL,
+        request.prompt_type.value,
+        request.counts,
+        prompt_registry.get(request.prompt_type).digest,
+        chat_slice,
+        reference_day,
+        request.days_of_week,
+    )
+
+def get_parser(prompt_type: PromptType) -> "PydanticOutputParser":
+    return prompt_registry.get(prompt_type).parser
+
+def annotate_messages(messages: List[Message], reference: datetime.datetime) -> List[Message]:
+    return [msg.model_copy(update={"content": dates.annotate(msg.content, reference)}) for msg in messages]
+
+async def render_chat(request: ChatRequest, messages: List[Message]) -> str:
+    if DATE_ANNOTATIONS:
+        # Resolve "tomorrow", "금요일까지", ... locally so the model copies dates instead of computing them.
+        # About 70ms per 1000 messages, so kept off the event loop like the prefilter
+        with metrics.span("date_annotate"):
+            messages = await asyncio.to_thread(annotate_messages, messages, dates.reference_time(request.timestamp))
+    # Format messages for analysis
+    if request.incremental and request.channel_id:
+        return channel_states.build_chat_slice(request.channel_id, messages)
+    return "\n".join(format_line(msg) for msg in messages)
+
+def build_prompt(request: ChatRequest, chat_slice: str) -> str:
+    with metrics.span("prompt_load"):
+        compiled = prompt_registry.get(request.prompt_type)
+    with metrics.span("prompt_format"):
+        if context_cache.backend is not None and request.prompt_type in CONTEXT_CACHE_PROMPT_TYPES:
+            return compiled.format_split(
+                chat_slice,
+                counts=request.counts,
+                timestamp=request.timestamp,
+                days_of_week=request.days_of_week,
+                existing_tickets=ticket_context(request)
             )
-        ]).partial(
-            today=datetime.date.today().isoformat(),
-            timestamp=timestamp or datetime.datetime.now().isoformat(),
-            days_of_week=days_of_week or datetime.datetime.now().strftime("%A").upper()
+        return compiled.format(
+            chat_slice,
+            counts=request.counts,
+            timestamp=request.timestamp,
+            days_of_week=request.days_of_week,
+            existing_tickets=ticket_context(request)
         )
+
+def parse_error_response(parse_error: OutputParseError) -> HTTPException:
+    if parse_error.invalid_json:
+        detail = f"Invalid JSON response: {str(parse_error)}"
     else:
-        return ChatPromptTemplate.from_messages([
-            ("system", system_prompt),
-            ("human", """
-[Date: {today}]
+        detail = f"Failed to parse AI response: {str(parse_error)}"
+    return HTTPException(status_code=500, detail=detail)
 
-### Chat to Analyze
-{chat_slice}
+def parse_response(content, parser: "PydanticOutputParser", tool_calls: Optional[List[dict]] = None, reference: Optional[datetime.datetime] = None):
+    try:
+        return parse_output(content, parser.pydantic_object, tool_calls, reference)
+    except OutputParseError as parse_error:
+        raise parse_error_response(parse_error)
 
-{format_instructions}"""
+async def invoke_prompt(request: ChatRequest, chat_slice: str, parser: "PydanticOutputParser"):
+    prompt = build_prompt(request, chat_slice)
+    
+    # Get AI response, asking again only if local repair could not salvage the output
+    for _ in range(OUTPUT_PARSE_RETRIES + 1):
+        with metrics.span("llm"):
+            result, _ = await llm_router.ainvoke(
+                prompt,
+                prompt_type=request.prompt_type.value,
+                prompt_tokens=estimate_tokens(prompt),
             )
-        ]).partial(today=datetime.date.today().isoformat())
+        metrics.record_usage(request.prompt_type.value, prompt, getattr(result, "usage_metadata", None))
+        try:
+            return parse_output(
+                result.content,
+                parser.pydantic_object,
+                getattr(result, "tool_calls", None),
+                reference=dates.reference_time(request.timestamp),
+            )
+        except OutputParseError as parse_error:
+            error = parse_error
+    raise parse_error_response(error)
 
-@app.post("/extract")
-async def extract(request: ChatRequest):
-    try:
-        # Format messages for analysis
-        chat_slice = "\n".join([
-            f"- {msg.author}: {msg.content}"
-            for msg in request.messages
-        ])
-        
-        # Create appropriate parser based on prompt type
+async def select_messages(request: ChatRequest) -> Tuple[List[Message], List[Message]]:
+    """Return the messages to prompt with and the new messages that advance the channel cursor."""
+    new_messages = request.messages
+    if request.incremental and request.channel_id:
+        new_messages = channel_states.new_messages(request.channel_id, new_messages)
+    if not (PREFILTER_ENABLED and request.prefilter):
+        return new_messages, new_messages
+
+    with metrics.span("prefilter"):
+        # CPU-bound on long histories, so kept off the event loop
+        messages, stats = await asyncio.to_thread(prefilter, new_messages, PREFILTER_TOKEN_BUDGET)
+    if not messages:
+        # Nothing looked actionable; let the model see the chat as-is rather than an empty prompt
+        return new_messages, new_messages
+    metrics.prefilter_tokens.inc(stats.tokens_in, prompt_type=request.prompt_type.value, stage="in")
+    metrics.prefilter_tokens.inc(stats.tokens_out, prompt_type=request.prompt_type.value, stage="out")
+    return messages, new_messages
+
+async def extract_cached(request: ChatRequest, messages: List[Message], chat_slice: str):
+    parser = get_parser(request.prompt_type)
+    cache_key = response_cache_key(request, chat_slice)
+    cached = response_cache.get(cache_key)
+    if cached is not None:
+        return parser.pydantic_object.model_validate(cached)
+
+    chunks = [messages]
+    if request.prompt_type in CHUNKED_PROMPT_TYPES and estimate_tokens(chat_slice) > EXTRACT_CHUNK_TOKENS:
+        chunks = split_messages(messages, EXTRACT_CHUNK_TOKENS)
+
+    if len(chunks) > 1:
+        # Map the prompt over chunks concurrently, then reduce to a single response
+        async def invoke_chunk(chunk: List[Message]):
+            return await invoke_prompt(request, await render_chat(request, chunk), parser)
+
+        partials = await map_chunks(chunks, invoke_chunk, EXTRACT_CHUNK_PARALLELISM)
         if request.prompt_type == PromptType.TICKETS:
-            parser = PydanticOutputParser(pydantic_object=Payload)
-        elif request.prompt_type == PromptType.SUMMARY:
-            parser = PydanticOutputParser(pydantic_object=Summary)
+            parsed = reduce_payloads(partials, request.counts or 3)
+        elif request.prompt_type == PromptType.COMBINED:
+            parsed = reduce_combined(partials, request.counts or 3)
         else:
-            parser = PydanticOutputParser(pydantic_object=ProjectOverview)
-        
-        # Create and format prompt
-        template = create_prompt_template(
-            request.prompt_type,
-            counts=request.counts,
-            timestamp=request.timestamp,
-            days_of_week=request.days_of_week
-        )
-        prompt = template.format(
-            chat_slice=chat_slice,
-            format_instructions=parser.get_format_instructions()
-        )
-        
-        # Get AI response
-        result = await llm.ainvoke(prompt)
-        
+            parsed = merge_summaries(partials)
+    else:
+        parsed = await invoke_prompt(request, chat_slice, parser)
+    response_cache.set(cache_key, parsed.model_dump())
+    return parsed
+
+def combined_request(request: ChatRequest) -> ChatRequest:
+    # Same fields for every fused type, so /ticket, /summary and /overview on one chat share a cache entry
+    return request.model_copy(update={
+        "prompt_type": PromptType.COMBINED,
+        "counts": max(request.counts or 0, FUSED_TICKET_COUNTS),
+        "fused": False,
+    })
+
+def project_combined(combined: CombinedPayload, request: ChatRequest):
+    """The part of a COMBINED result that a single-type request would have returned."""
+    if request.prompt_type == PromptType.TICKETS:
+        return Payload(tickets=(combined.tickets or [])[:request.counts or 3])
+    if request.prompt_type == PromptType.SUMMARY:
+        if not combined.summary:
+            raise HTTPException(status_code=500, detail="Combined response has no summary")
+        return Summary(summary=combined.summary)
+    if combined.overview is None:
+        raise HTTPException(status_code=500, detail="Combined response has no overview")
+    return combined.overview
+
+def empty_result(request: ChatRequest):
+    """What an incremental request returns when nothing arrived since the channel's cursor."""
+    if request.prompt_type == PromptType.TICKETS:
+        return Payload(tickets=[])
+    if request.prompt_type == PromptType.COMBINED:
+        return CombinedPayload(tickets=[], summary="")
+    if request.prompt_type == PromptType.SUMMARY:
+        return Summary(summary="")
+    return ProjectOverview(summary="", tasks=[], team_roles={})
+
+def nothing_new(request: ChatRequest, new_messages: List[Message]) -> bool:
+    # Prompting with only the already-processed digest would just re-derive earlier results
+    return bool(request.incremental and request.channel_id and not new_messages)
+
+async def run_extraction(request: ChatRequest):
+    metrics.bind(prompt_type=request.prompt_type.value)
+    ratelimit.bind(request.guild_id or request.channel_id)
+    messages, new_messages = await select_messages(request)
+    if nothing_new(request, new_messages):
+        return empty_result(request)
+    chat_slice = await render_chat(request, messages)
+
+    if request.fused and request.prompt_type in FUSED_PROMPT_TYPES:
+        parsed = project_combined(await extract_cached(combined_request(request), messages, chat_slice), request)
+    else:
+        parsed = await extract_cached(request, messages, chat_slice)
+    return finish_extraction(request, parsed, messages, new_messages)
+
+def finish_extraction(request: ChatRequest, parsed, messages: List[Message], new_messages: List[Message]):
+    """Advance the channel cursor and deduplicate tickets; shared by /extract and /extract/stream."""
+    if request.incremental and request.channel_id:
+        channel_states.commit(request.channel_id, messages, seen=new_messages)
+    if request.prompt_type == PromptType.TICKETS and request.guild_id and parsed.tickets:
+        with metrics.span("dedup"):
+            parsed = parsed.model_copy(update={"tickets": ticket_indexes.dedupe(request.guild_id, parsed.tickets, merge=DEDUP_MERGE)})
+    return parsed
+
+async def run_job(payload: dict) -> dict:
+    parsed = await run_extraction(ChatRequest.model_validate(payload))
+    return parsed.model_dump()
+
+# Async /extract jobs: short TICKETS requests get their own lane ahead of bulk work
+job_queue = JobQueue(
+    run_job,
+    path=os.getenv("JOB_QUEUE_PATH", "data/jobs.sqlite3"),
+    workers=int(os.getenv("JOB_WORKERS", "2")),
+    max_pending=int(os.getenv("JOB_MAX_PENDING", "100")),
+    store=shared_store,
+    # Extra workers that only run interactive-lane jobs
+    interactive_workers=int(os.getenv("JOB_INTERACTIVE_WORKERS", "1")),
+    # Comma-separated hosts callbacks may go to; unset allows any public host
+    callback_allowed_hosts=[host.strip() for host in os.getenv("JOB_CALLBACK_ALLOWED_HOSTS", "").split(",") if host.strip()],
+)
+JOB_INTERACTIVE_MAX_MESSAGES = int(os.getenv("JOB_INTERACTIVE_MAX_MESSAGES", "200"))
+
+@app.on_event("startup")
+async def start_job_queue():
+    await job_queue.start()
+
+# Heavy clients are built on first use; warming them up in the background hides that from the first request
+WARMUP_ON_START = os.getenv("WARMUP_ON_START", "1") == "1"
+
+def warm_up() -> None:
+    start = time.perf_counter()
+    try:
+        prompt_registry.load_all()
+        for backend in llm_router.backends.values():
+            if hasattr(backend, "warm"):
+                backend.warm()
+        calendar_utils.warm_up()
+        import google_auth_oauthlib.flow  # noqa: F401
+    except Exception as e:
+        print(f"Warm-up failed, clients will be built on first use: {e}")
+        return
+    metrics.stage_seconds.observe(time.perf_counter() - start, stage="warm_up", prompt_type="")
+
+@app.on_event("startup")
+async def start_warm_up():
+    if WARMUP_ON_START:
+        asyncio.create_task(asyncio.to_thread(warm_up))
+
+@app.on_event("shutdown")
+async def stop_job_queue():
+    await job_queue.stop()
+
+@app.on_event("shutdown")
+async def close_context_caches():
+    # Provider-side caches are billed until they expire, so drop this worker's on the way out
+    await context_cache.close()
+
+async def enqueue_extraction(request: ChatRequest):
+    if request.callback_url:
+        # Refused up front for a clear 400; delivery checks again before calling it
         try:
-            # Clean the response and parse as JSON
-            cleaned_response = clean_json_response(result.content)
-            json_response = json.loads(cleaned_response)
-            
-            # Then parse with Pydantic
-            parsed = parser.parse(cleaned_response)
-            return parsed
-        except json.JSONDecodeError as json_error:
-            raise HTTPException(
-                status_code=500,
-                detail=f"Invalid JSON response: {str(json_error)}"
-            )
-        except Exception as parse_error:
-            raise HTTPException(
-                status_code=500,
-                detail=f"Failed to parse AI response: {str(parse_error)}"
-            )
-        
+            await asyncio.to_thread(check_callback_url, request.callback_url, job_queue.callback_allowed_hosts)
+        except InvalidCallback as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    if request.prompt_type == PromptType.TICKETS and len(request.messages) <= JOB_INTERACTIVE_MAX_MESSAGES:
+        lane = INTERACTIVE_LANE
+    else:
+        lane = BULK_LANE
+    try:
+        job_id = job_queue.submit(
+            request.model_dump(mode="json", exclude={"callback_url"}),
+            lane=lane,
+            callback_url=request.callback_url,
+        )
+    except QueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "5"})
+    return JSONResponse(status_code=202, content={"job_id": job_id, "status": "queued"})
+
+@app.post("/extract")
+async def extract(request: ChatRequest, mode: str = "sync"):
+    if mode not in ("sync", "async"):
+        raise HTTPException(status_code=400, detail="mode must be sync or async")
+    if mode == "async":
+        return await enqueue_extraction(request)
+    try:
+        return await run_extraction(request)
+    except RateLimited as e:
+        raise rate_limited_response(e)
+    except NoModelAvailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"Error: {str(e)}"
         )
 
-@app.get('/auth')
-async def auth(user_id: str):
-    flow = Flow.from_client_secrets_file(
+@app.post("/extract/batch")
+async def extract_batch(request: BatchChatRequest):
+    if len(request.requests) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"Batch exceeds {BATCH_MAX_ITEMS} requests")
+
+    semaphore = asyncio.Semaphore(max(1, min(request.concurrency or BATCH_CONCURRENCY, BATCH_CONCURRENCY)))
+
+    async def run(index: int, item: ChatRequest) -> BatchItemResult:
+        async with semaphore:
+            try:
+                parsed = await run_extraction(item)
+                return BatchItemResult(index=index, ok=True, result=parsed.model_dump())
+            except Exception as e:
+                return BatchItemResult(index=index, ok=False, error=str(getattr(e, "detail", None) or e))
+
+    tasks = [asyncio.create_task(run(index, item)) for index, item in enumerate(request.requests)]
+
+    if request.stream:
+        async def ndjson():
+            for completed in asyncio.as_completed(tasks):
+                item = await completed
+                yield item.model_dump_json() + "\n"
+        return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+    return await asyncio.gather(*tasks)
+
+@app.post("/extract/stream")
+async def extract_stream(request: ChatRequest, format: str = "sse"):
+    """Like /extract, streaming the `summary` field as it is generated.
+
+    Fused requests are answered from the shared COMBINED extraction, so they only get the final result.
+    """
+    if format not in ("sse", "ndjson"):
+        raise HTTPException(status_code=400, detail="format must be sse or ndjson")
+
+    if request.fused and request.prompt_type in FUSED_PROMPT_TYPES:
+        async def fused_events():
+            try:
+                parsed = await run_extraction(request)
+                yield format_event("result", {"result": parsed.model_dump()}, format)
+            except Exception as e:
+                yield format_event("error", {"detail": str(getattr(e, "detail", None) or e)}, format)
+        media_type = "text/event-stream" if format == "sse" else "application/x-ndjson"
+        return StreamingResponse(fused_events(), media_type=media_type, headers={"Cache-Control": "no-cache"})
+
+    messages, new_messages = await select_messages(request)
+    if nothing_new(request, new_messages):
+        async def no_events():
+            yield format_event("result", {"result": empty_result(request).model_dump()}, format)
+        media_type = "text/event-stream" if format == "sse" else "application/x-ndjson"
+        return StreamingResponse(no_events(), media_type=media_type, headers={"Cache-Control": "no-cache"})
+
+    chat_slice = await render_chat(request, messages)
+    parser = get_parser(request.prompt_type)
+    cache_key = response_cache_key(request, chat_slice)
+
+    async def events():
+        metrics.bind(prompt_type=request.prompt_type.value)
+        ratelimit.bind(request.guild_id or request.channel_id)
+        try:
+            cached = response_cache.get(cache_key)
+            if cached is not None:
+                parsed = parser.pydantic_object.model_validate(cached)
+            else:
+                # Surface the human-readable field as it arrives, from the text or the tool-call arguments,
+                # then validate the full response
+                reader = PartialFieldReader("summary")
+                tool_reader = PartialFieldReader("summary")
+                tool_name = parser.pydantic_object.__name__
+                prompt = build_prompt(request, chat_slice)
+                metrics.record_usage(request.prompt_type.value, prompt, None)
+                stream = llm_router.astream(prompt, prompt_type=request.prompt_type.value, prompt_tokens=estimate_tokens(prompt))
+                async for chunk in stream:
+                    delta = reader.feed(chunk_text(chunk.content)) + tool_reader.feed(tool_call_text(chunk, tool_name))
+                    if delta:
+                        yield format_event("delta", {"text": delta}, format)
+                # Tool-call arguments are the output object itself, and win over text like in parse_output
+                content = tool_reader.text if tool_reader.text.strip() else reader.text
+                parsed = parse_response(content, parser, reference=dates.reference_time(request.timestamp))
+                response_cache.set(cache_key, parsed.model_dump())
+            parsed = finish_extraction(request, parsed, messages, new_messages)
+            yield format_event("result", {"result": parsed.model_dump()}, format)
+        except Exception as e:
+            yield format_event("error", {"detail": str(getattr(e, "detail", None) or e)}, format)
+
+    media_type = "text/event-stream" if format == "sse" else "application/x-ndjson"
+    return StreamingResponse(events(), media_type=media_type, headers={"Cache-Control": "no-cache"})
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/guilds/{guild_id}/tickets")
+async def guild_tickets(guild_id: str):
+    return [
+        entry.ticket.model_copy(update={"id": entry.id})
+        for entry in ticket_indexes.get(guild_id).open_tickets()
+    ]
+
+@app.delete("/guilds/{guild_id}/tickets/{ticket_id}")
+async def close_guild_ticket(guild_id: str, ticket_id: str):
+    if not ticket_indexes.remove(guild_id, ticket_id):
+        raise HTTPException(status_code=404, detail="Ticket not found")
+    return {"message": "Ticket closed"}
+
+@app.get("/metrics")
+async def get_metrics():
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/models/stats")
+async def model_stats():
+    return llm_router.stats()
+
+@app.get("/quotas")
+async def quotas():
+    return {
+        "calendar": calendar_limiter.stats(),
+        **{limiter.name: limiter.stats() for limiter in llm_router.limiters.values()},
+    }
+
+@app.get("/cache/context")
+async def context_cache_stats():
+    return context_cache.stats()
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return response_cache.stats()
+
+@app.get("/channels/{channel_id}/state")
+async def channel_state(channel_id: str):
+    state = channel_states.get(channel_id)
+    return {
+        "channel_id": channel_id,
+        "cursor": state.cursor,
+        "digest_lines": len(state.digest),
+        "updated": state.updated,
+    }
+
+@app.delete("/channels/{channel_id}/state")
+async def reset_channel_state(channel_id: str):
+    channel_states.reset(channel_id)
+    return {"message": "Channel state reset"}
+
+def oauth_flow():
+    from google_auth_oauthlib.flow import Flow
+
+    return Flow.from_client_secrets_file(
         CLIENT_SECRETS_FILE,
         scopes=SCOPES,
         redirect_uri="http://localhost:8000/oauth2callback"
     )
+
+@app.get('/auth')
+async def auth(user_id: str):
+    flow = oauth_flow()
     auth_url, _ = flow.authorization_url(
         access_type="offline",
         include_granted_scopes="true",
@@ -223,56 +677,135 @@ async def auth(user_id: str):
 @app.get('/oauth2callback')
 async def oauth2callback(request: Request):
     auth_response = str(request.url)
-    flow = Flow.from_client_secrets_file(
-        CLIENT_SECRETS_FILE,
-        scopes=SCOPES,
-        redirect_uri="http://localhost:8000/oauth2callback"
-    )
-    flow.fetch_token(authorization_response=auth_response)
+    flow = oauth_flow()
+    await asyncio.to_thread(flow.fetch_token, authorization_response=auth_response)
     creds: Credentials = flow.credentials
     
     user_id = request.query_params.get("state")
     if not user_id:
         raise HTTPException(status_code=400, detail="Missing user_id")
 
-    with open(f"data/{user_id}.json", "w") as f:
-        f.write(creds.to_json())
+    await token_store.save(user_id, creds)
+    calendar_services.invalidate(user_id)
+    # The account may have changed; the next sync rebuilds the mapping from the events themselves
+    calendar_sync_store.reset(user_id)
     
     return f"✅ Successfully authenticated! You can now close this window."
 
 @app.post("/create_event")
 async def create_event(request: InsertEventRequest):
     print(request)
-    token_path = f"data/{request.user_id}.json"
-    if not os.path.exists(token_path):
+    with metrics.span("calendar_auth"):
+        client = await calendar_services.get(request.user_id)
+    if client is None:
         raise HTTPException(status_code=401, detail="Unauthorized")
     
-    creds = Credentials.from_authorized_user_file(str(token_path), SCOPES)
-    if creds.expired and creds.refresh_token:
-        creds.refresh(AuthRequest())
-        
-        with open(token_path, "w") as f:
-            f.write(creds.to_json())
-    
-    service = build("calendar", "v3", credentials=creds)
-    
-    event = {
-        "summary": request.ticket.title,
-        "description": request.ticket.description,
-        "start": {
-            "dateTime": request.ticket.due_date
-        },
-        "end": {
-            "dateTime": request.ticket.due_date
-        },
-        "colorId": request.color_id
-    }
-    
-    created_event = service.events().insert(calendarId="primary", body=event).execute()
+    event = build_event(request.ticket, request.color_id)
+    with metrics.span("calendar_insert"):
+        try:
+            created_event = await call_with_quota(
+                calendar_limiter, insert_event, client, event, retries=CALENDAR_RATE_RETRIES, key=request.user_id
+            )
+        except RateLimited as e:
+            raise rate_limited_response(e)
     return {"message": "Event created", "link": created_event.get("htmlLink")}
+
+@app.post("/create_events")
+async def create_events(request: BulkInsertEventRequest):
+    with metrics.span("calendar_auth"):
+        client = await calendar_services.get(request.user_id)
+    if client is None:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    events = [build_event(ticket, request.color_id) for ticket in request.tickets]
+    with metrics.span("calendar_batch_insert"):
+        try:
+            results = await call_with_quota(
+                calendar_limiter, insert_events, client, events,
+                requests=len(events), retries=CALENDAR_RATE_RETRIES, key=request.user_id,
+            )
+            # Batch items fail individually; back off and resend only the rate-limited ones
+            for _ in range(CALENDAR_RATE_RETRIES):
+                limited = [i for i, result in enumerate(results) if is_rate_limited(result.get("error", ""))]
+                if not limited:
+                    break
+                calendar_limiter.record_rate_limited()
+                retried = await call_with_quota(
+                    calendar_limiter, insert_events, client, [events[i] for i in limited],
+                    requests=len(limited), retries=CALENDAR_RATE_RETRIES, key=request.user_id,
+                )
+                for i, result in zip(limited, retried):
+                    results[i] = result
+        except RateLimited as e:
+            raise rate_limited_response(e)
+    return {
+        "message": f"{sum(1 for r in results if 'error' not in r)} of {len(events)} events created",
+        "events": [{"title": ticket.title, **result} for ticket, result in zip(request.tickets, results)],
+    }
+
+@app.post("/sync_events")
+async def sync_events(request: SyncEventsRequest):
+    """Bring the user's calendar in line with `tickets`, only calling Calendar for tickets that changed."""
+    with metrics.span("calendar_auth"):
+        client = await calendar_services.get(request.user_id)
+    if client is None:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    async with calendar_sync_store.lock(request.user_id):
+        state = calendar_sync_store.load(request.user_id)
+        results = []
+        try:
+            with metrics.span("calendar_sync_pull"):
+                await call_with_quota(
+                    calendar_limiter, calendar_sync.pull_changes, client, state, retries=CALENDAR_RATE_RETRIES, key=request.user_id
+                )
+            ops, unchanged = calendar_sync.plan(
+                state, request.tickets, request.color_id, request.delete_missing, ticket_indexes.index_options
+            )
+            metrics.calendar_sync_ops.inc(unchanged, action="unchanged")
+            with metrics.span("calendar_sync_apply"):
+                if ops:
+                    results = await call_with_quota(
+                        calendar_limiter, calendar_sync.apply, client, state, ops,
+                        requests=len(ops), retries=CALENDAR_RATE_RETRIES, key=request.user_id,
+                    )
+                for _ in range(CALENDAR_RATE_RETRIES):
+                    limited = [i for i, result in enumerate(results) if is_rate_limited(result.get("error", ""))]
+                    if not limited:
+                        break
+                    calendar_limiter.record_rate_limited()
+                    retried = await call_with_quota(
+                        calendar_limiter, calendar_sync.apply, client, state, [ops[i] for i in limited],
+                        requests=len(limited), retries=CALENDAR_RATE_RETRIES, key=request.user_id,
+                    )
+                    for i, result in zip(limited, retried):
+                        results[i] = result
+        except RateLimited as e:
+            raise rate_limited_response(e)
+        finally:
+            # Saved even on failure, so events created before the error are not created again
+            calendar_sync_store.save(request.user_id, state)
+
+    counts = {"inserted": 0, "patched": 0, "deleted": 0, "unchanged": unchanged, "failed": 0}
+    for result in results:
+        if "error" in result:
+            counts["failed"] += 1
+        else:
+            counts[{"insert": "inserted", "patch": "patched", "delete": "deleted"}[result["action"]]] += 1
+            metrics.calendar_sync_ops.inc(action=result["action"])
+    return {
+        "message": ", ".join(f"{count} {name}" for name, count in counts.items()),
+        **counts,
+        "events": results,
+    }
     
     
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
+    workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+    if workers > 1:
+        # Multi-process mode needs an import string; prefer `gunicorn -c gunicorn.conf.py main:app` in production
+        uvicorn.run("main:app", host="0.0.0.0", port=8000, workers=workers)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
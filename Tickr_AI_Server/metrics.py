@@ -0,0 +1,199 @@
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Labels attached to every span in the current request (e.g. prompt_type)
+_bound_labels: contextvars.ContextVar[Dict[str, str]] = contextvars.ContextVar("metrics_labels", default={})
+# Per-request trace, only set when tracing was requested
+_trace: contextvars.ContextVar[Optional[List[Tuple[str, float]]]] = contextvars.ContextVar("metrics_trace", default=None)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value:g}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = buckets
+        # Per label set: [bucket counts..., sum, count]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [0.0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._values.items()):
+                cumulative = 0.0
+                for bound, count in zip(self.buckets, series):
+                    cumulative += count
+                    le = 'le="%g"' % bound
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative:g}")
+                le = 'le="+Inf"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {series[-1]:g}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {series[-2]:g}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {series[-1]:g}")
+        return lines
+
+
+class Gauge:
+    """Gauge whose values are read from a callback at scrape time."""
+
+    def __init__(self, name: str, help: str, collect: Callable[[], float]):
+        self.name = name
+        self.help = help
+        self.collect = collect
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge", f"{self.name} {self.collect():g}"]
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name: str, help: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        metric = Counter(name, help, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, help, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def gauge(self, name: str, help: str, collect: Callable[[], float]) -> Gauge:
+        metric = Gauge(name, help, collect)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+stage_seconds = registry.histogram(
+    "tickr_stage_seconds", "Time spent in each hot-path stage", ("stage", "prompt_type")
+)
+request_seconds = registry.histogram(
+    "tickr_http_request_seconds", "HTTP request latency", ("method", "path", "status")
+)
+llm_requests = registry.counter("tickr_llm_requests_total", "Model calls", ("prompt_type",))
+llm_tokens = registry.counter("tickr_llm_tokens_total", "Tokens reported by the model", ("prompt_type", "kind"))
+llm_model_calls = registry.counter("tickr_llm_model_calls_total", "Model calls per routed model", ("model", "outcome"))
+llm_hedges = registry.counter("tickr_llm_hedges_total", "Hedged duplicate requests sent", ("model",))
+llm_failovers = registry.counter("tickr_llm_failovers_total", "Requests that failed over away from a model", ("model",))
+ratelimit_throttled = registry.counter("tickr_ratelimit_throttled_total", "Outbound calls that had to wait for quota", ("limiter",))
+ratelimit_backoffs = registry.counter("tickr_ratelimit_backoffs_total", "429 responses that slowed a limiter down", ("limiter",))
+ratelimit_wait_seconds = registry.histogram(
+    "tickr_ratelimit_wait_seconds", "Time spent queued for outbound quota", ("limiter",)
+)
+context_cache_events = registry.counter(
+    "tickr_context_cache_events_total", "Provider-side prompt cache lifecycle (create, hit, renew, invalidate, create_failed)", ("event",)
+)
+context_cache_chars = registry.counter(
+    "tickr_context_cache_chars_total", "Prompt characters served from a provider-side cache instead of being sent", ("prompt_type",)
+)
+calendar_sync_ops = registry.counter(
+    "tickr_calendar_sync_ops_total", "Tickets handled by /sync_events, by Calendar call made (or unchanged)", ("action",)
+)
+due_dates_normalized = registry.counter(
+    "tickr_due_dates_normalized_total", "Model due dates rewritten locally instead of failing validation"
+)
+prompt_chars = registry.counter("tickr_prompt_chars_total", "Characters sent to the model", ("prompt_type",))
+prefilter_tokens = registry.counter(
+    "tickr_prefilter_tokens_total", "Estimated chat tokens before (in) and after (out) pre-filtering", ("prompt_type", "stage")
+)
+prompt_size = registry.histogram(
+    "tickr_prompt_chars", "Prompt size in characters", ("prompt_type",),
+    buckets=(1000, 2500, 5000, 10000, 25000, 50000, 100000, 250000, 500000, 1000000),
+)
+
+
+def bind(**labels: str) -> None:
+    """Attach labels (e.g. prompt_type) to every span recorded later in this request."""
+    _bound_labels.set({**_bound_labels.get(), **labels})
+
+
+@contextmanager
+def span(stage: str, **labels: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        stage_seconds.observe(elapsed, stage=stage, **{**_bound_labels.get(), **labels})
+        trace = _trace.get()
+        if trace is not None:
+            trace.append((stage, elapsed))
+
+
+def start_trace() -> List[Tuple[str, float]]:
+    trace: List[Tuple[str, float]] = []
+    _trace.set(trace)
+    return trace
+
+
+def server_timing(trace: List[Tuple[str, float]]) -> str:
+    """Render a trace as a Server-Timing header value (durations in ms)."""
+    return ", ".join(f"{stage};dur={elapsed * 1000:.2f}" for stage, elapsed in trace)
+
+
+def record_usage(prompt_type: str, prompt: str, usage: Optional[dict]) -> None:
+    llm_requests.inc(prompt_type=prompt_type)
+    prompt_chars.inc(len(prompt), prompt_type=prompt_type)
+    prompt_size.observe(len(prompt), prompt_type=prompt_type)
+    for kind in ("input_tokens", "output_tokens"):
+        if usage and usage.get(kind):
+            llm_tokens.inc(usage[kind], prompt_type=prompt_type, kind=kind.split("_")[0])
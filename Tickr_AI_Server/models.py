@@ -1,7 +1,8 @@
-from pydantic import BaseModel, Field, validator
+from pydantic import BaseModel, Field, model_validator, validator
 from typing import List, Optional, Dict, Any
 from enum import Enum
 from datetime import datetime
+from dates import normalize_due_date
 
 class PromptType(str, Enum):
     TICKETS = "TICKETS"
@@ -9,8 +10,10 @@ class PromptType(str, Enum):
     LONG_OVERVIEW = "LONG_OVERVIEW"
     LIST_TASKS = "LIST_TASKS"
     SUMMARY = "SUMMARY"
+    COMBINED = "COMBINED"
 
 class Message(BaseModel):
+    id: Optional[str] = Field(None, description="Discord message ID, required for incremental ingestion")
     author: str = Field(..., description="The author of the message")
     content: str = Field(..., description="The content of the message")
 
@@ -22,12 +25,54 @@ class Message(BaseModel):
             }
         }
 
+class MessageColumns(BaseModel):
+    """Compact, columnar alternative to `messages`: each author tag is sent once."""
+    authors: List[str] = Field(..., description="Distinct author tags")
+    author: List[int] = Field(..., description="Index into `authors` for each message")
+    content: List[str] = Field(..., description="Content of each message")
+    id: Optional[List[Optional[str]]] = Field(None, description="Discord message ID of each message")
+
+    def to_messages(self) -> List[Dict[str, Any]]:
+        count = len(self.content)
+        if len(self.author) != count or (self.id is not None and len(self.id) != count):
+            raise ValueError("columns must all have the same length")
+        if any(index < 0 or index >= len(self.authors) for index in self.author):
+            raise ValueError("author index out of range")
+        ids = self.id or [None] * count
+        authors = self.authors
+        # Plain dicts: pydantic-core validates these much faster than model_construct builds them
+        return [
+            {"id": message_id, "author": authors[index], "content": content}
+            for message_id, index, content in zip(ids, self.author, self.content)
+        ]
+
 class ChatRequest(BaseModel):
-    messages: List[Message] = Field(..., description="List of chat messages")
+    messages: List[Message] = Field(..., description="List of chat messages (or send `columns` instead)")
     prompt_type: PromptType = Field(default=PromptType.TICKETS, description="Type of analysis to perform")
     counts: Optional[int] = Field(None, description="Number of tickets to generate")
     timestamp: Optional[str] = Field(None, description="ISO timestamp of the request")
     days_of_week: Optional[str] = Field(None, description="Day of the week for the request")
+    channel_id: Optional[str] = Field(None, description="Discord channel ID used to track ingestion state")
+    incremental: bool = Field(default=False, description="Only send messages newer than the stored channel cursor")
+    callback_url: Optional[str] = Field(None, description="URL that receives the job result in async mode")
+    guild_id: Optional[str] = Field(None, description="Discord guild ID used to deduplicate tickets across runs")
+    prefilter: bool = Field(default=True, description="Drop non-actionable chat locally before prompting")
+    fused: bool = Field(default=False, description="Answer TICKETS, SUMMARY or LONG_OVERVIEW from one cached COMBINED pass over the chat")
+
+    @model_validator(mode="before")
+    @classmethod
+    def expand_columns(cls, data: Any) -> Any:
+        if isinstance(data, dict) and data.get("columns") is not None:
+            data = dict(data)
+            data["messages"] = MessageColumns.model_validate(data.pop("columns")).to_messages()
+        return data
+
+    @model_validator(mode="after")
+    def check_incremental_ids(self) -> "ChatRequest":
+        # The cursor is a message ID; without one a message would be re-sent and re-digested every time
+        if self.incremental and self.channel_id and any(not msg.id for msg in self.messages):
+            raise ValueError("incremental requests need an `id` on every message")
+        return self
 
     class Config:
         json_schema_extra = {
@@ -49,15 +94,30 @@ class ChatRequest(BaseModel):
             }
         }
 
+class BatchChatRequest(BaseModel):
+    requests: List[ChatRequest] = Field(..., description="Extraction requests to run, prompt types may be mixed")
+    concurrency: Optional[int] = Field(None, description="Maximum number of requests processed at once")
+    stream: bool = Field(default=False, description="Stream results as NDJSON in completion order")
+
+class BatchItemResult(BaseModel):
+    index: int = Field(..., description="Position of the request in the batch")
+    ok: bool = Field(..., description="Whether the extraction succeeded")
+    result: Optional[Dict[str, Any]] = Field(None, description="Parsed extraction result")
+    error: Optional[str] = Field(None, description="Error message if the extraction failed")
+
 class Ticket(BaseModel):
     title: str = Field(..., description="Title of the ticket")
     assignee: Optional[str] = Field(None, description="Person assigned to the ticket")
     due_date: str = Field(..., description="Due date in ISO 8601 format (YYYY-MM-DDTHH:MM:SS.000Z)")
     priority: str = Field(default="MID", pattern="LOW|MID|HIGH", description="Priority level of the ticket")
     description: str = Field(..., description="Detailed description of the ticket")
+    id: Optional[str] = Field(None, description="Server-side ticket ID when the ticket was indexed for deduplication")
+    duplicate_of: Optional[str] = Field(None, description="ID of an open ticket this one duplicates")
 
     @validator('due_date')
     def validate_due_date(cls, v):
+        # Accept other absolute formats (2024-02-21, 21-02-2024, ...) by rewriting them
+        v = normalize_due_date(v)
         try:
             # Try to parse the date string
             datetime.strptime(v, '%Y-%m-%dT%H:%M:%S.%fZ')
@@ -83,10 +143,24 @@ class Payload(BaseModel):
     overview: Optional[ProjectOverview] = Field(None, description="Project overview")
     tasks: Optional[List[Dict[str, Any]]] = Field(None, description="Simple task list")
 
+class CombinedPayload(Payload):
+    summary: Optional[str] = Field(None, description="Markdown summary of the discussion")
+
 class Summary(BaseModel):
     summary: str = Field(..., description="Comprehensive summary with markdown headers for Executive Summary, Discussion Summary, and Future Outlook sections")
 
 class InsertEventRequest(BaseModel):
     user_id: str = Field(..., description="User ID")
     ticket: Ticket
-    color_id: Optional[str] = Field(None, description="Color ID")
\ No newline at end of file
+    color_id: Optional[str] = Field(None, description="Color ID")
+
+class BulkInsertEventRequest(BaseModel):
+    user_id: str = Field(..., description="User ID")
+    tickets: List[Ticket] = Field(..., description="Tickets to add to the calendar")
+    color_id: Optional[str] = Field(None, description="Color ID")
+
+class SyncEventsRequest(BaseModel):
+    user_id: str = Field(..., description="User ID")
+    tickets: List[Ticket] = Field(..., description="Tickets whose calendar events should be created or brought up to date")
+    color_id: Optional[str] = Field(None, description="Color ID")
+    delete_missing: bool = Field(default=False, description="Delete events of previously synced tickets that are not in `tickets`")
@@ -0,0 +1,131 @@
+import datetime
+import re
+from typing import Any, List, Optional, Type
+
+from pydantic import BaseModel
+
+import metrics
+from dates import normalize_due_date
+
+try:
+    from orjson import JSONDecodeError, loads
+except ImportError:  # orjson is optional
+    from json import JSONDecodeError, loads
+
+_FENCE_START = re.compile(r"^\s*```(?:json)?\s*\n?")
+_FENCE_END = re.compile(r"\n?```\s*$")
+_TRAILING_COMMA = re.compile(r",(\s*[}\]])")
+
+
+class OutputParseError(ValueError):
+    """The model output could not be turned into the expected model."""
+
+    def __init__(self, message: str, invalid_json: bool = False):
+        super().__init__(message)
+        self.invalid_json = invalid_json
+
+
+def strip_code_fence(text: str) -> str:
+    # Remove markdown code block markers if present
+    text = _FENCE_START.sub("", text)
+    text = _FENCE_END.sub("", text)
+    return text.strip()
+
+
+def repair_json(text: str) -> str:
+    """Apply cheap local fixes for common model output damage: surrounding prose,
+    trailing commas and truncated strings/objects."""
+    starts = [i for i in (text.find("{"), text.find("[")) if i >= 0]
+    if not starts:
+        return text
+    text = text[min(starts):]
+
+    stack: List[str] = []
+    in_string = False
+    escaped = False
+    end = len(text)
+    for i, ch in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+            continue
+        if ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+        elif ch in "}]":
+            if stack:
+                stack.pop()
+            if not stack:
+                # Drop anything after the top-level value
+                end = i + 1
+                break
+
+    text = text[:end]
+    if in_string:
+        text += '"'
+    text = _TRAILING_COMMA.sub(r"\1", text)
+    text = re.sub(r"[,:]\s*$", "", text.rstrip())
+    return text + "".join(reversed(stack))
+
+
+def tool_call_args(tool_calls: Optional[List[dict]], model_cls: Type[BaseModel]) -> Optional[dict]:
+    for call in tool_calls or []:
+        if call.get("name") == model_cls.__name__ and isinstance(call.get("args"), dict):
+            return call["args"]
+    return None
+
+
+def parse_output(
+    content: Any,
+    model_cls: Type[BaseModel],
+    tool_calls: Optional[List[dict]] = None,
+    reference: Optional[datetime.datetime] = None,
+) -> BaseModel:
+    """Validate model output into `model_cls` with one JSON parse and one validation pass.
+
+    Native tool-call arguments win when present; otherwise the text content is parsed,
+    falling back to `repair_json` once before giving up. Ticket due dates are normalized
+    first, resolving relative ones ("tomorrow") against `reference`.
+    """
+    args = tool_call_args(tool_calls, model_cls)
+    if args is not None:
+        return _validate(args, model_cls, reference)
+
+    with metrics.span("json_parse"):
+        if not isinstance(content, str):
+            content = "".join(part.get("text", "") if isinstance(part, dict) else str(part) for part in content)
+        text = strip_code_fence(content)
+        try:
+            data = loads(text)
+        except JSONDecodeError:
+            try:
+                data = loads(repair_json(text))
+            except JSONDecodeError as e:
+                raise OutputParseError(str(e), invalid_json=True) from e
+    return _validate(data, model_cls, reference)
+
+
+def normalize_due_dates(data: Any, reference: Optional[datetime.datetime] = None) -> Any:
+    """Rewrite `tickets[].due_date` into the strict format Ticket validates, in place."""
+    tickets = data.get("tickets") if isinstance(data, dict) else None
+    for ticket in tickets if isinstance(tickets, list) else []:
+        if isinstance(ticket, dict) and isinstance(ticket.get("due_date"), str):
+            due_date = normalize_due_date(ticket["due_date"], reference)
+            if due_date != ticket["due_date"]:
+                metrics.due_dates_normalized.inc()
+                ticket["due_date"] = due_date
+    return data
+
+
+def _validate(data: Any, model_cls: Type[BaseModel], reference: Optional[datetime.datetime] = None) -> BaseModel:
+    with metrics.span("validate"):
+        normalize_due_dates(data, reference)
+        try:
+            return model_cls.model_validate(data)
+        except ValueError as e:
+            raise OutputParseError(str(e)) from e
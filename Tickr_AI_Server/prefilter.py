@@ -0,0 +1,157 @@
+import re
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from chunking import estimate_tokens
+from models import Message
+
+_URL = re.compile(r"https?://\S+|<a?:\w+:\d+>|<@!?\d+>")
+_NORMALIZE = re.compile(r"[^\w가-힣]+")
+# Laughter and reactions: ㅋㅋㅋ, ㅎㅎ, ㅠㅠ, hahaha, lololol
+_REACTION = re.compile(r"^([ㄱ-ㅎㅏ-ㅣ]+|(ha)+h?|(he)+h?|(lo)+l?|x+d+|a+h+)$")
+
+# Messages that carry no task signal on their own
+TRIVIAL = {
+    "hi", "hello", "hey", "yo", "thanks", "thank you", "thx", "ty", "lol", "lmao",
+    "nice", "cool", "great", "gm", "gn", "bye",
+    "안녕", "안녕하세요", "감사", "감사합니다", "고마워", "ㄱㅅ",
+}
+# Short answers: noise on their own, but they accept or turn down a task when they reply to one
+REPLIES = {
+    "ok", "okay", "k", "kk", "yes", "yeah", "yep", "no", "nope", "sure", "on it", "will do", "got it",
+    "네", "넵", "응", "ㅇㅇ", "ㅇㅋ", "오케이", "좋아", "좋아요", "아니", "아니요",
+}
+
+TASK_KEYWORDS = re.compile(
+    r"\b(i'?ll|i will|we need|need to|needs to|should|must|have to|todo|to-do|task|deadline|due|finish|complete|"
+    r"implement|fix|deploy|review|test|write|design|build|set up|setup|prepare|submit|assign|handle|take care|"
+    r"meeting|blocker|blocked|priority|urgent|asap)\b"
+    r"|해야|할게|할께|하겠|해줘|해주세요|까지|마감|작업|구현|수정|배포|검토|테스트|회의|담당|제출|준비|맡|부탁|급해|우선",
+    re.IGNORECASE,
+)
+
+DATE_EXPRESSIONS = re.compile(
+    r"\b(today|tonight|tomorrow|yesterday|next (week|month|monday|tuesday|wednesday|thursday|friday|saturday|sunday)|"
+    r"this (week|weekend)|monday|tuesday|wednesday|thursday|friday|saturday|sunday|"
+    r"jan(uary)?|feb(ruary)?|mar(ch)?|apr(il)?|may|jun(e)?|jul(y)?|aug(ust)?|sep(tember)?|oct(ober)?|nov(ember)?|dec(ember)?|"
+    r"eod|eow)\b"
+    r"|\b\d{1,4}[/.-]\d{1,2}([/.-]\d{1,4})?\b|\b\d{1,2}(:\d{2})?\s?(am|pm)\b"
+    r"|오늘|내일|모레|어제|이번\s?주|다음\s?주|주말|[월화수목금토일]요일|\d+\s?월|\d+\s?일|\d+\s?시",
+    re.IGNORECASE,
+)
+
+
+@dataclass
+class PrefilterStats:
+    messages_in: int
+    messages_out: int
+    tokens_in: int
+    tokens_out: int
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.tokens_in - self.tokens_out
+
+
+def _normalize(content: str) -> str:
+    return _NORMALIZE.sub(" ", _URL.sub(" ", content.lower())).strip()
+
+
+def has_signal(content: str) -> bool:
+    return bool(TASK_KEYWORDS.search(content) or DATE_EXPRESSIONS.search(content))
+
+
+def is_reply(content: str) -> bool:
+    normalized = _normalize(content)
+    return normalized in REPLIES or normalized.replace(" ", "") in REPLIES
+
+
+def is_trivial(content: str) -> bool:
+    # A task or date word ("내일", "5/3", "마감") is kept however short the message is
+    if has_signal(content):
+        return False
+    normalized = _normalize(content)
+    if not normalized:
+        # Only links, emoji, mentions or punctuation
+        return True
+    compact = normalized.replace(" ", "")
+    return (
+        normalized in TRIVIAL or compact in TRIVIAL or is_reply(content)
+        or len(compact) < 3 or bool(_REACTION.match(compact))
+    )
+
+
+def _asks(content: str) -> bool:
+    return has_signal(content) or content.rstrip().endswith("?")
+
+
+def task_score(content: str) -> float:
+    score = 1.0
+    score += 2.0 * len(TASK_KEYWORDS.findall(content))
+    score += 3.0 * len(DATE_EXPRESSIONS.findall(content))
+    if "@" in content or "<@" in content:
+        score += 1.0
+    return score
+
+
+def collapse_runs(messages: List[Message], positions: Optional[List[int]] = None) -> List[Message]:
+    """Merge consecutive messages from the same author into one, keeping the last message ID.
+
+    With `positions` (each message's index in the unfiltered chat), only messages that were
+    adjacent there are merged, so a dropped reply between them still separates them.
+    """
+    collapsed: List[Message] = []
+    last = None
+    for i, msg in enumerate(messages):
+        position = positions[i] if positions is not None else i
+        if collapsed and collapsed[-1].author == msg.author and position == last + 1:
+            previous = collapsed[-1]
+            collapsed[-1] = Message(id=msg.id or previous.id, author=msg.author, content=f"{previous.content} / {msg.content}")
+        else:
+            collapsed.append(msg)
+        last = position
+    return collapsed
+
+
+def prefilter(messages: List[Message], token_budget: int = 0) -> Tuple[List[Message], PrefilterStats]:
+    """Drop trivial and repeated chat, collapse speaker runs, then keep the highest-signal
+    messages that fit `token_budget` (0 = no budget) in their original order."""
+    tokens_in = sum(estimate_tokens(f"- {msg.author}: {msg.content}") for msg in messages)
+
+    seen = set()
+    kept: List[Message] = []
+    positions: List[int] = []
+    for i, msg in enumerate(messages):
+        if is_trivial(msg.content):
+            # "sure" right after someone else's request is the assignment itself
+            previous = messages[i - 1] if i else None
+            if not (is_reply(msg.content) and previous is not None and previous.author != msg.author and _asks(previous.content)):
+                continue
+        else:
+            key = _normalize(msg.content)
+            if key in seen:
+                continue
+            seen.add(key)
+        kept.append(msg)
+        positions.append(i)
+    kept = collapse_runs(kept, positions)
+
+    costs = [estimate_tokens(f"- {msg.author}: {msg.content}") for msg in kept]
+    if token_budget and sum(costs) > token_budget:
+        # Rank by task signal, breaking ties towards recent messages
+        ranked = sorted(range(len(kept)), key=lambda i: (task_score(kept[i].content), i), reverse=True)
+        chosen, used = set(), 0
+        for i in ranked:
+            if used + costs[i] <= token_budget:
+                chosen.add(i)
+                used += costs[i]
+        kept = [msg for i, msg in enumerate(kept) if i in chosen]
+        costs = [cost for i, cost in enumerate(costs) if i in chosen]
+
+    stats = PrefilterStats(
+        messages_in=len(messages),
+        messages_out=len(kept),
+        tokens_in=tokens_in,
+        tokens_out=sum(costs),
+    )
+    return kept, stats
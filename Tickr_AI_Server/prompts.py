@@ -0,0 +1,266 @@
+import datetime
+import hashlib
+import os
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Dict, Optional, Type
+
+from pydantic import BaseModel
+
+from models import CombinedPayload, Payload, ProjectOverview, PromptType, Summary
+
+if TYPE_CHECKING:
+    from langchain_core.output_parsers import PydanticOutputParser
+    from langchain_core.prompts import ChatPromptTemplate
+
+PROMPTS_DIR = os.path.join(os.path.dirname(__file__), "testing_prompts_c", "prompts")
+
+PROMPT_FILES = {
+    PromptType.TICKETS: "tickets.inp",
+    PromptType.SHORT_OVERVIEW: "short_overview.inp",
+    PromptType.LONG_OVERVIEW: "long_overview.inp",
+    PromptType.LIST_TASKS: "list_tasks.inp",
+    PromptType.SUMMARY: "summary.inp",
+    PromptType.COMBINED: "combined.inp",
+}
+
+TICKETS_HUMAN = """
+[Date: {today}]
+
+### Few-shot Examples
+<example>
+User chat:
+- Alice: We need to finish the login page by tomorrow
+- Bob: I'll take care of it
+- Alice: Great, make sure to include password reset functionality
+- Bob: Will do, I'll prioritize that
+
+Assistant(JSON):
+{{
+    "tickets": [
+        {{
+            "title": "Complete login page",
+            "assignee": "Bob",
+            "due_date": "2024-02-21",
+            "priority": "HIGH",
+            "description": "Implement login page including password reset functionality"
+        }}
+    ]
+}}
+</example>
+{existing_tickets}
+### Chat to Analyze
+{chat_slice}
+
+Extract exactly {counts} tickets (or fewer if there aren't enough tasks) from the chat. For each task:
+1. Create a ticket with a clear title
+2. Assign it to the person who volunteered or was assigned
+3. Calculate the due date based on mentioned dates or relative time (using {timestamp} as reference)
+4. Set priority based on urgency (HIGH/MID/LOW)
+5. Write a detailed description
+
+If the message is in Korean, translate the task details to English but keep the original meaning.
+Return the tickets in JSON format matching the schema exactly.
+{format_instructions}"""
+
+SUMMARY_HUMAN = """
+[Date: {today}]
+
+### Chat to Analyze
+{chat_slice}
+
+Create a comprehensive written summary of the discussion. Focus on:
+1. Main decisions and outcomes
+2. Key points discussed
+3. Any concerns or blockers raised
+4. Future steps and recommendations
+
+Write in a natural, flowing style that captures the essence of the discussion.
+Return the summary in the specified JSON format.
+{format_instructions}"""
+
+DEFAULT_HUMAN = """
+[Date: {today}]
+
+### Chat to Analyze
+{chat_slice}
+
+{format_instructions}"""
+
+COMBINED_HUMAN = """
+[Date: {today}]
+
+### Chat to Analyze
+{chat_slice}
+
+From this one chat, return all three outputs in a single JSON object:
+1. "tickets": exactly {counts} tickets (or fewer if there aren't enough tasks), due dates relative to {timestamp}
+2. "summary": the markdown summary of decisions, key points, blockers and next steps
+3. "overview": the project overview with summary, tasks, team_roles, tech_stack and progress
+
+If the message is in Korean, translate the details to English but keep the original meaning.
+Return the JSON object matching the schema exactly.
+{format_instructions}"""
+
+HUMAN_TEMPLATES = {
+    PromptType.TICKETS: TICKETS_HUMAN,
+    PromptType.SUMMARY: SUMMARY_HUMAN,
+    PromptType.COMBINED: COMBINED_HUMAN,
+}
+
+
+# Stand-ins for the per-request fields in the cacheable prefix; the real values follow it in the request suffix
+STATIC_PLACEHOLDERS = {
+    "today": "<TODAY>",
+    "counts": "<TICKET_COUNT>",
+    "timestamp": "<REFERENCE_TIMESTAMP>",
+    "days_of_week": "<DAY_OF_WEEK>",
+    "chat_slice": "<CHAT_SLICE>",
+    "existing_tickets": "",
+}
+
+REQUEST_SUFFIX = """
+
+### Request Context
+TODAY = {today}
+TICKET_COUNT = {counts}
+REFERENCE_TIMESTAMP = {timestamp}
+DAY_OF_WEEK = {days_of_week}
+{existing_tickets}
+### CHAT_SLICE
+{chat_slice}"""
+
+
+class SplitPrompt(str):
+    """A prompt whose static prefix is identical across requests and can be cached by the provider."""
+
+    def __new__(cls, static: str, dynamic: str, prompt_type: str = ""):
+        prompt = super().__new__(cls, static + dynamic)
+        prompt.static = static
+        prompt.dynamic = dynamic
+        prompt.prompt_type = prompt_type
+        return prompt
+
+
+def output_model(prompt_type: PromptType) -> Type[BaseModel]:
+    if prompt_type == PromptType.TICKETS:
+        return Payload
+    elif prompt_type == PromptType.COMBINED:
+        return CombinedPayload
+    elif prompt_type == PromptType.SUMMARY:
+        return Summary
+    else:
+        return ProjectOverview
+
+
+@dataclass
+class CompiledPrompt:
+    prompt_type: PromptType
+    text: str
+    digest: str
+    mtime: float
+    template: "ChatPromptTemplate"
+    parser: "PydanticOutputParser"
+    static_prefix: str
+
+    def format(
+        self,
+        chat_slice: str,
+        counts: Optional[int] = None,
+        timestamp: Optional[str] = None,
+        days_of_week: Optional[str] = None,
+        existing_tickets: str = "",
+    ) -> str:
+        # Only the per-request fields are bound here; everything else was compiled at load time
+        now = datetime.datetime.now()
+        return self.template.format(
+            chat_slice=chat_slice,
+            today=datetime.date.today().isoformat(),
+            counts=counts or 3,  # Default to 3 if not specified
+            timestamp=timestamp or now.isoformat(),
+            days_of_week=days_of_week or now.strftime("%A").upper(),
+            existing_tickets=existing_tickets,
+        )
+
+    def format_split(
+        self,
+        chat_slice: str,
+        counts: Optional[int] = None,
+        timestamp: Optional[str] = None,
+        days_of_week: Optional[str] = None,
+        existing_tickets: str = "",
+    ) -> SplitPrompt:
+        """Format as the compiled static prefix followed by a suffix holding every per-request value."""
+        now = datetime.datetime.now()
+        dynamic = REQUEST_SUFFIX.format(
+            chat_slice=chat_slice,
+            today=datetime.date.today().isoformat(),
+            counts=counts or 3,
+            timestamp=timestamp or now.isoformat(),
+            days_of_week=days_of_week or now.strftime("%A").upper(),
+            existing_tickets=existing_tickets,
+        )
+        return SplitPrompt(self.static_prefix, dynamic, self.prompt_type.value)
+
+
+class PromptRegistry:
+    """Prompt templates compiled once per PromptType and reloaded when the .inp file changes."""
+
+    def __init__(self, prompts_dir: str = PROMPTS_DIR, check_interval: float = 2.0):
+        self.prompts_dir = prompts_dir
+        self.check_interval = check_interval
+        self._prompts: Dict[PromptType, CompiledPrompt] = {}
+        self._checked: Dict[PromptType, float] = {}
+
+    def load_all(self) -> None:
+        for prompt_type in PROMPT_FILES:
+            self._prompts[prompt_type] = self._compile(prompt_type)
+            self._checked[prompt_type] = time.monotonic()
+
+    def get(self, prompt_type: PromptType) -> CompiledPrompt:
+        compiled = self._prompts.get(prompt_type)
+        now = time.monotonic()
+        if compiled is None:
+            compiled = self._prompts[prompt_type] = self._compile(prompt_type)
+            self._checked[prompt_type] = now
+        elif now - self._checked.get(prompt_type, 0.0) >= self.check_interval:
+            # Throttle mtime checks so hot reload costs at most one stat per interval
+            self._checked[prompt_type] = now
+            if os.stat(self._path(prompt_type)).st_mtime != compiled.mtime:
+                compiled = self._prompts[prompt_type] = self._compile(prompt_type)
+        return compiled
+
+    def _path(self, prompt_type: PromptType) -> str:
+        prompt_file = PROMPT_FILES.get(prompt_type)
+        if not prompt_file:
+            raise ValueError(f"Unknown prompt type: {prompt_type}")
+        return os.path.join(self.prompts_dir, prompt_file)
+
+    def _compile(self, prompt_type: PromptType) -> CompiledPrompt:
+        return compile_prompt(prompt_type, self._path(prompt_type))
+
+
+def compile_prompt(prompt_type: PromptType, path: str) -> CompiledPrompt:
+    """Compile the system prompt at `path` with the human template and output schema of `prompt_type`."""
+    mtime = os.stat(path).st_mtime
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+
+    # langchain_core is slow to import, so it is loaded with the first prompt rather than the module
+    from langchain_core.output_parsers import PydanticOutputParser
+    from langchain_core.prompts import ChatPromptTemplate
+
+    parser = PydanticOutputParser(pydantic_object=output_model(prompt_type))
+    template = ChatPromptTemplate.from_messages([
+        ("system", text),
+        ("human", HUMAN_TEMPLATES.get(prompt_type, DEFAULT_HUMAN)),
+    ]).partial(format_instructions=parser.get_format_instructions())
+    return CompiledPrompt(
+        prompt_type=prompt_type,
+        text=text,
+        digest=hashlib.sha256(text.encode("utf-8")).hexdigest(),
+        mtime=mtime,
+        template=template,
+        parser=parser,
+        static_prefix=template.format(**STATIC_PLACEHOLDERS),
+    )
@@ -0,0 +1,236 @@
+import asyncio
+import contextvars
+import random
+import re
+import time
+from collections import OrderedDict, deque
+from typing import Callable, Dict, Optional
+
+import metrics
+
+# Fairness key (guild, channel or user) for outbound calls made in the current request
+_key: contextvars.ContextVar[str] = contextvars.ContextVar("ratelimit_key", default="")
+
+_RETRY_AFTER = re.compile(r"retry[-_ ]after[\"':\s]*([\d.]+)|retry_delay\s*\{\s*seconds:\s*(\d+)|retry in ([\d.]+)\s*s", re.IGNORECASE)
+
+
+class RateLimited(Exception):
+    """Raised when a call could not get quota within the limiter's `max_wait`."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def bind(key: Optional[str]) -> None:
+    _key.set(key or "")
+
+
+def is_rate_limited(error: object) -> bool:
+    """Whether an exception (or error message) is an upstream 429 / quota error."""
+    status = getattr(getattr(error, "resp", None), "status", None)
+    if status == 429:
+        return True
+    text = f"{type(error).__name__} {error}".lower()
+    return (
+        "429" in text
+        or "resourceexhausted" in text
+        or "resource exhausted" in text
+        or "quota" in text
+        or "ratelimitexceeded" in text
+        or "rate limit exceeded" in text
+    )
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    """Server-suggested delay from a 429, if the error carries one."""
+    resp = getattr(error, "resp", None)
+    if resp is not None and hasattr(resp, "get") and resp.get("retry-after"):
+        try:
+            return float(resp.get("retry-after"))
+        except ValueError:
+            pass
+    match = _RETRY_AFTER.search(str(error))
+    if match:
+        return float(next(group for group in match.groups() if group))
+    return None
+
+
+class TokenBucket:
+    def __init__(self, per_minute: float, clock: Callable[[], float] = time.monotonic):
+        self.per_minute = per_minute
+        self.capacity = per_minute
+        self.clock = clock
+        self.tokens = per_minute
+        self.updated = clock()
+
+    def refill(self, factor: float) -> None:
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.per_minute * factor / 60)
+        self.updated = now
+
+    def wait_time(self, amount: float, factor: float) -> float:
+        # Requests larger than the whole bucket go through once it is full
+        missing = min(amount, self.capacity) - self.tokens
+        return max(0.0, missing * 60 / (self.per_minute * factor))
+
+
+class AdaptiveLimiter:
+    """Outbound quota for one upstream: requests and tokens per minute, shared fairly across keys.
+
+    Waiters queue per key and are served round-robin, so one busy guild cannot starve the others.
+    A 429 halves the allowed rate and pauses the limiter (honouring Retry-After, with jitter);
+    successes creep the rate back up towards the configured quota.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        rpm: float = 0,
+        tpm: float = 0,
+        max_wait: float = 30.0,
+        min_factor: float = 0.1,
+        recovery: float = 0.05,
+        backoff_base: float = 1.0,
+        backoff_max: float = 60.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.max_wait = max_wait
+        self.min_factor = min_factor
+        self.recovery = recovery
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.clock = clock
+        self.requests = TokenBucket(rpm, clock) if rpm else None
+        self.tokens = TokenBucket(tpm, clock) if tpm else None
+        self.factor = 1.0
+        self.strikes = 0
+        self.paused_until = 0.0
+        self._queues: "OrderedDict[str, deque]" = OrderedDict()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.requests is not None or self.tokens is not None
+
+    def _delay(self, requests: int, tokens: int) -> float:
+        delay = max(0.0, self.paused_until - self.clock())
+        for bucket, amount in ((self.requests, requests), (self.tokens, tokens)):
+            if bucket is not None:
+                bucket.refill(self.factor)
+                delay = max(delay, bucket.wait_time(amount, self.factor))
+        return delay
+
+    def _take(self, requests: int, tokens: int) -> None:
+        if self.requests is not None:
+            self.requests.tokens -= requests
+        if self.tokens is not None:
+            self.tokens.tokens -= tokens
+
+    def _ensure_pump(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._wakeup = asyncio.Event()
+            self._task = loop.create_task(self._pump())
+
+    async def _pump(self) -> None:
+        while True:
+            if not self._queues:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            key, queue = next(iter(self._queues.items()))
+            future, requests, tokens = queue[0]
+            if future.done():
+                # The caller gave up (timeout or cancellation)
+                queue.popleft()
+                if not queue:
+                    del self._queues[key]
+                continue
+            delay = self._delay(requests, tokens)
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            self._take(requests, tokens)
+            queue.popleft()
+            future.set_result(None)
+            if queue:
+                self._queues.move_to_end(key)
+            else:
+                del self._queues[key]
+
+    async def acquire(self, tokens: int = 0, key: Optional[str] = None, requests: int = 1) -> None:
+        """Wait until `requests` calls and `tokens` tokens fit the quota, queued fairly under `key`."""
+        if not self.enabled:
+            return
+        key = _key.get() if key is None else key
+        if not self._queues and self._delay(requests, tokens) == 0:
+            self._take(requests, tokens)
+            return
+
+        self._ensure_pump()
+        future = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(key, deque()).append((future, requests, tokens))
+        self._wakeup.set()
+        start = self.clock()
+        metrics.ratelimit_throttled.inc(limiter=self.name)
+        try:
+            await asyncio.wait_for(future, self.max_wait)
+        except asyncio.TimeoutError:
+            retry = self._delay(requests, tokens) or self.max_wait
+            raise RateLimited(f"{self.name} quota exhausted, gave up after {self.max_wait:g}s", retry)
+        finally:
+            metrics.ratelimit_wait_seconds.observe(self.clock() - start, limiter=self.name)
+
+    def settle(self, estimated: int, actual: Optional[int]) -> None:
+        """Charge the difference once the real token count of a call is known."""
+        if self.tokens is not None and actual:
+            self.tokens.tokens -= actual - estimated
+
+    def record_success(self) -> None:
+        self.strikes = 0
+        self.factor = min(1.0, self.factor + self.recovery)
+
+    def record_rate_limited(self, retry_after: Optional[float] = None) -> float:
+        """Back off after a 429; returns the pause applied."""
+        self.strikes += 1
+        self.factor = max(self.min_factor, self.factor / 2)
+        if retry_after is not None:
+            pause = retry_after + random.uniform(0, 0.1 * retry_after + 0.05)
+        else:
+            ceiling = min(self.backoff_max, self.backoff_base * 2 ** (self.strikes - 1))
+            pause = random.uniform(ceiling / 2, ceiling)
+        self.paused_until = max(self.paused_until, self.clock() + pause)
+        # Drop any saved-up burst so the limiter resumes at the reduced rate
+        for bucket in (self.requests, self.tokens):
+            if bucket is not None:
+                bucket.tokens = min(bucket.tokens, 0.0)
+        metrics.ratelimit_backoffs.inc(limiter=self.name)
+        return pause
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "rpm": self.requests.per_minute if self.requests else None,
+            "tpm": self.tokens.per_minute if self.tokens else None,
+            "rate_factor": round(self.factor, 3),
+            "paused_for": round(max(0.0, self.paused_until - self.clock()), 3),
+            "waiting": sum(1 for queue in self._queues.values() for future, _, _ in queue if not future.done()),
+            "keys_waiting": sum(1 for queue in self._queues.values() if any(not future.done() for future, _, _ in queue)),
+        }
+
+
+async def call_with_quota(limiter: AdaptiveLimiter, fn: Callable, *args, requests: int = 1, retries: int = 3, key: Optional[str] = None):
+    """Run blocking `fn(*args)` in a worker thread under `limiter`, backing off and retrying on 429s."""
+    for attempt in range(retries + 1):
+        await limiter.acquire(key=key, requests=requests)
+        try:
+            result = await asyncio.to_thread(fn, *args)
+        except Exception as e:
+            if not is_rate_limited(e) or attempt == retries:
+                raise
+            limiter.record_rate_limited(retry_after(e))
+            continue
+        limiter.record_success()
+        return result
@@ -0,0 +1,302 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import metrics
+from ratelimit import AdaptiveLimiter, RateLimited, is_rate_limited, retry_after
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class NoModelAvailable(Exception):
+    """Raised when every candidate model failed or has an open circuit."""
+
+
+class CircuitBreaker:
+    """Opens after `failure_threshold` consecutive failures, then lets one probe through every `reset_timeout` seconds."""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0, clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+
+    def allow(self) -> bool:
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and self.clock() - self.opened_at >= self.reset_timeout:
+            self.state = HALF_OPEN
+            self._probing = False
+        if self.state == HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def ready(self) -> bool:
+        """Whether `allow()` would let a call through, without claiming the half-open probe."""
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN:
+            return self.clock() - self.opened_at >= self.reset_timeout
+        return not self._probing
+
+    def release(self) -> None:
+        """Give back a half-open probe that was never sent."""
+        self._probing = False
+
+    def record_success(self) -> None:
+        self.state = CLOSED
+        self.failures = 0
+        self._probing = False
+
+    def record_failure(self, trip: bool = False) -> None:
+        self.failures += 1
+        # A failed probe or an explicit trip (e.g. 429) reopens immediately
+        if trip or self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = OPEN
+            self.opened_at = self.clock()
+            self._probing = False
+
+
+class LatencyWindow:
+    """Rolling window of recent call latencies."""
+
+    def __init__(self, size: int = 200):
+        self._samples = deque(maxlen=size)
+
+    def observe(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class LazyModel:
+    """Builds a chat model on first use (or `warm()`), keeping heavy client imports off the startup path."""
+
+    def __init__(self, factory: Callable[[], Any]):
+        self.factory = factory
+        self._model = None
+        self._lock = threading.Lock()
+
+    def warm(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    self._model = self.factory()
+        return self._model
+
+    async def _get(self):
+        return self._model if self._model is not None else await asyncio.to_thread(self.warm)
+
+    async def ainvoke(self, prompt, **kwargs):
+        model = await self._get()
+        return await model.ainvoke(prompt, **kwargs)
+
+    async def astream(self, prompt, **kwargs):
+        model = await self._get()
+        async for chunk in model.astream(prompt, **kwargs):
+            yield chunk
+
+
+class ModelRouter:
+    """Routes prompts to chat models by prompt type and size, with hedging, failover and per-model circuit breakers.
+
+    `backends` maps a model name to anything with `ainvoke`/`astream` (a bound ChatGoogleGenerativeAI
+    or a local fake). `routes` maps a prompt type to its preferred model order; `default_route` is
+    used for other prompt types. Prompts over `large_input_tokens` go to `large_model` first.
+    Models with an entry in `limiters` wait for quota before each call.
+    """
+
+    def __init__(
+        self,
+        backends: Dict[str, Any],
+        default_route: List[str],
+        routes: Optional[Dict[str, List[str]]] = None,
+        large_model: Optional[str] = None,
+        large_input_tokens: int = 0,
+        hedge: bool = True,
+        hedge_quantile: float = 0.95,
+        hedge_min_samples: int = 20,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        limiters: Optional[Dict[str, AdaptiveLimiter]] = None,
+    ):
+        self.backends = backends
+        self.default_route = default_route
+        self.routes = routes or {}
+        self.large_model = large_model
+        self.large_input_tokens = large_input_tokens
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_samples = hedge_min_samples
+        self.breakers = {name: CircuitBreaker(failure_threshold, reset_timeout) for name in backends}
+        self.latency = {name: LatencyWindow() for name in backends}
+        self.limiters = limiters or {}
+
+    def route(self, prompt_type: str, prompt_tokens: int = 0) -> List[str]:
+        names = list(self.routes.get(prompt_type, self.default_route))
+        if self.large_model and self.large_input_tokens and prompt_tokens > self.large_input_tokens:
+            names = [self.large_model] + [name for name in names if name != self.large_model]
+        return [name for name in names if name in self.backends]
+
+    def _hedge_delay(self, name: str) -> Optional[float]:
+        window = self.latency[name]
+        if not self.hedge or len(window) < self.hedge_min_samples:
+            return None
+        return window.quantile(self.hedge_quantile)
+
+    def _record_failure(self, name: str, error: Exception) -> None:
+        rate_limited = is_rate_limited(error)
+        self.breakers[name].record_failure(trip=rate_limited)
+        metrics.llm_model_calls.inc(model=name, outcome="rate_limited" if rate_limited else "error")
+        limiter = self.limiters.get(name)
+        if rate_limited and limiter is not None:
+            limiter.record_rate_limited(retry_after(error))
+
+    def _record_success(self, name: str) -> None:
+        self.breakers[name].record_success()
+        metrics.llm_model_calls.inc(model=name, outcome="ok")
+        limiter = self.limiters.get(name)
+        if limiter is not None:
+            limiter.record_success()
+
+    async def _call(self, name: str, prompt, prompt_tokens: int = 0, **kwargs):
+        limiter = self.limiters.get(name)
+        if limiter is not None:
+            # Local quota waits are not the model's fault, so they never trip the breaker
+            try:
+                await limiter.acquire(prompt_tokens)
+            except (RateLimited, asyncio.CancelledError):
+                self.breakers[name].release()
+                raise
+        start = time.perf_counter()
+        try:
+            result = await self.backends[name].ainvoke(prompt, **kwargs)
+        except asyncio.CancelledError:
+            # Lost a hedge race or the client went away: the call proved nothing either way
+            self.breakers[name].release()
+            raise
+        except Exception as e:
+            self._record_failure(name, e)
+            raise
+        self.latency[name].observe(time.perf_counter() - start)
+        self._record_success(name)
+        if limiter is not None:
+            usage = getattr(result, "usage_metadata", None) or {}
+            limiter.settle(prompt_tokens, usage.get("total_tokens"))
+        return result
+
+    async def _hedged(self, name: str, backup: Optional[str], prompt, prompt_tokens: int, **kwargs):
+        delay = self._hedge_delay(name)
+        primary = asyncio.create_task(self._call(name, prompt, prompt_tokens, **kwargs))
+        if delay is None:
+            return await primary, name
+
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done:
+            return primary.result(), name
+
+        # The primary is slower than its usual p95: race a duplicate on the backup (or the same) model
+        hedge_name = backup if backup is not None and self.breakers[backup].allow() else name
+        metrics.llm_hedges.inc(model=hedge_name)
+        hedge = asyncio.create_task(self._call(hedge_name, prompt, prompt_tokens, **kwargs))
+        owners = {primary: name, hedge: hedge_name}
+        pending = set(owners)
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result(), owners[task]
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def ainvoke(self, prompt, prompt_type: str = "", prompt_tokens: int = 0, **kwargs) -> Tuple[Any, str]:
+        """Return the first successful response and the name of the model that produced it."""
+        candidates = self.route(prompt_type, prompt_tokens)
+        error = None
+        for i, name in enumerate(candidates):
+            if not self.breakers[name].allow():
+                continue
+            backup = next((other for other in candidates[i + 1:] if self.breakers[other].ready()), None)
+            try:
+                return await self._hedged(name, backup, prompt, prompt_tokens, **kwargs)
+            except Exception as e:
+                error = e
+                metrics.llm_failovers.inc(model=name)
+        if error is None:
+            error = NoModelAvailable(f"All models are unavailable for {prompt_type or 'request'}: {', '.join(candidates)}")
+        raise error
+
+    async def astream(self, prompt, prompt_type: str = "", prompt_tokens: int = 0, **kwargs):
+        """Stream from the first healthy model, failing over only before any chunk was produced."""
+        candidates = self.route(prompt_type, prompt_tokens)
+        error = None
+        for name in candidates:
+            if not self.breakers[name].allow():
+                continue
+            started = False
+            try:
+                limiter = self.limiters.get(name)
+                if limiter is not None:
+                    await limiter.acquire(prompt_tokens)
+                async for chunk in self.backends[name].astream(prompt, **kwargs):
+                    started = True
+                    yield chunk
+                self._record_success(name)
+                return
+            except RateLimited as e:
+                self.breakers[name].release()
+                error = e
+                continue
+            except (asyncio.CancelledError, GeneratorExit):
+                self.breakers[name].release()
+                raise
+            except Exception as e:
+                self._record_failure(name, e)
+                if started:
+                    raise
+                error = e
+                metrics.llm_failovers.inc(model=name)
+        if error is None:
+            error = NoModelAvailable(f"All models are unavailable for {prompt_type or 'request'}: {', '.join(candidates)}")
+        raise error
+
+    def stats(self) -> Dict[str, dict]:
+        return {
+            name: {
+                "state": breaker.state,
+                "consecutive_failures": breaker.failures,
+                "p95_seconds": self.latency[name].quantile(0.95),
+                "samples": len(self.latency[name]),
+                "quota": self.limiters[name].stats() if name in self.limiters else None,
+            }
+            for name, breaker in self.breakers.items()
+        }
+
+
+def parse_routes(spec: str) -> Dict[str, List[str]]:
+    """Parse `TICKETS=model-a|model-b,SUMMARY=model-c` into a route table."""
+    routes: Dict[str, List[str]] = {}
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        prompt_type, _, names = entry.partition("=")
+        routes[prompt_type.strip().upper()] = [name.strip() for name in names.split("|") if name.strip()]
+    return routes
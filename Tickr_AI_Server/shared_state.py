@@ -0,0 +1,114 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+
+class SQLiteSharedStore:
+    """Namespaced key/value store in one SQLite file, shared by every worker process on a host."""
+
+    def __init__(self, path: str = "data/shared.sqlite3"):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS shared (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                expires REAL,
+                PRIMARY KEY (namespace, key)
+            )"""
+        )
+        self._db.commit()
+        self._lock = threading.Lock()
+
+    def get(self, namespace: str, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value, expires FROM shared WHERE namespace = ? AND key = ?", (namespace, key)
+            ).fetchone()
+            if row is not None and row[1] is not None and row[1] <= time.time():
+                with self._db:
+                    self._db.execute(
+                        "DELETE FROM shared WHERE namespace = ? AND key = ? AND expires = ?", (namespace, key, row[1])
+                    )
+                return None
+        return None if row is None else row[0]
+
+    def set(self, namespace: str, key: str, value: str, ttl: Optional[float] = None) -> None:
+        expires = time.time() + ttl if ttl else None
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO shared (namespace, key, value, expires) VALUES (?, ?, ?, ?)",
+                (namespace, key, value, expires),
+            )
+
+    def delete(self, namespace: str, key: str) -> None:
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM shared WHERE namespace = ? AND key = ?", (namespace, key))
+
+    def clear(self, namespace: str) -> None:
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM shared WHERE namespace = ?", (namespace,))
+
+    def purge_expired(self) -> int:
+        with self._lock, self._db:
+            return self._db.execute("DELETE FROM shared WHERE expires IS NOT NULL AND expires <= ?", (time.time(),)).rowcount
+
+
+class RedisSharedStore:
+    """Same interface over Redis, for workers spread across hosts. Needs the `redis` package."""
+
+    def __init__(self, url: str, prefix: str = "tickr"):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("SHARED_STATE_URL points at Redis but the `redis` package is not installed") from e
+        self._redis = redis.Redis.from_url(url, decode_responses=True)
+        self.prefix = prefix
+
+    def _key(self, namespace: str, key: str) -> str:
+        return f"{self.prefix}:{namespace}:{key}"
+
+    def get(self, namespace: str, key: str) -> Optional[str]:
+        return self._redis.get(self._key(namespace, key))
+
+    def set(self, namespace: str, key: str, value: str, ttl: Optional[float] = None) -> None:
+        self._redis.set(self._key(namespace, key), value, px=int(ttl * 1000) if ttl else None)
+
+    def delete(self, namespace: str, key: str) -> None:
+        self._redis.delete(self._key(namespace, key))
+
+    def clear(self, namespace: str) -> None:
+        keys = list(self._redis.scan_iter(match=self._key(namespace, "*"), count=500))
+        for start in range(0, len(keys), 500):
+            self._redis.delete(*keys[start:start + 500])
+
+    def purge_expired(self) -> int:
+        # Redis expires keys on its own
+        return 0
+
+
+async def run_purge(store, interval: float = 300.0) -> None:
+    """Periodically drop expired entries that are never read again (job results, old cache keys, ...)."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(store.purge_expired)
+        except Exception as e:
+            print(f"Shared state purge failed: {e}")
+
+
+def create_shared_store(url: Optional[str] = None):
+    """Build the shared store from SHARED_STATE_URL (`sqlite:///path` or `redis://host:port/db`), or None."""
+    url = os.getenv("SHARED_STATE_URL", "") if url is None else url
+    if not url:
+        return None
+    if url.startswith("sqlite:///"):
+        return SQLiteSharedStore(url[len("sqlite:///"):])
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisSharedStore(url)
+    raise ValueError(f"Unknown shared state URL: {url}")
@@ -0,0 +1,94 @@
+import json
+import re
+from typing import Any, Optional
+
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+
+class PartialFieldReader:
+    """Decode a top-level JSON string field while the surrounding object is still streaming in."""
+
+    def __init__(self, field: str):
+        self._start = re.compile(r'"%s"\s*:\s*"' % re.escape(field))
+        self._buffer = ""
+        self._pos: Optional[int] = None
+        self._done = False
+
+    def feed(self, text: str) -> str:
+        """Append raw model output and return newly decoded field text."""
+        self._buffer += text
+        if self._done:
+            return ""
+        if self._pos is None:
+            match = self._start.search(self._buffer)
+            if match is None:
+                return ""
+            self._pos = match.end()
+
+        out = []
+        i = self._pos
+        buffer = self._buffer
+        while i < len(buffer):
+            ch = buffer[i]
+            if ch == '"':
+                self._done = True
+                i += 1
+                break
+            if ch != "\\":
+                out.append(ch)
+                i += 1
+                continue
+            # Stop at an escape sequence that has not fully arrived yet
+            if i + 1 >= len(buffer):
+                break
+            code = buffer[i + 1]
+            if code == "u":
+                if i + 6 > len(buffer):
+                    break
+                unit = int(buffer[i + 2:i + 6], 16)
+                if 0xD800 <= unit < 0xDC00:
+                    # Characters outside the BMP (emoji) arrive as a \uD83D\uDE00 surrogate pair
+                    paired = buffer[i + 6:i + 8] == "\\u"
+                    if i + (12 if paired else 8) > len(buffer):
+                        break
+                    low = int(buffer[i + 8:i + 12], 16) if paired else 0
+                    if 0xDC00 <= low < 0xE000:
+                        out.append(chr(0x10000 + ((unit - 0xD800) << 10) + (low - 0xDC00)))
+                        i += 12
+                        continue
+                    unit = 0xFFFD
+                elif 0xDC00 <= unit < 0xE000:
+                    unit = 0xFFFD
+                out.append(chr(unit))
+                i += 6
+            else:
+                out.append(_ESCAPES.get(code, code))
+                i += 2
+        self._pos = i
+        return "".join(out)
+
+    @property
+    def text(self) -> str:
+        return self._buffer
+
+
+def chunk_text(content: Any) -> str:
+    # Streamed message chunks carry either a string or a list of content parts
+    if isinstance(content, str):
+        return content
+    return "".join(part.get("text", "") if isinstance(part, dict) else str(part) for part in content)
+
+
+def tool_call_text(chunk: Any, name: str) -> str:
+    """Streamed argument JSON of the `name` tool call in a message chunk."""
+    return "".join(
+        part.get("args") or ""
+        for part in getattr(chunk, "tool_call_chunks", None) or []
+        if part.get("name") in (None, name)
+    )
+
+
+def format_event(event: str, data: dict, fmt: str = "sse") -> str:
+    if fmt == "ndjson":
+        return json.dumps({"type": event, **data}, ensure_ascii=False) + "\n"
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
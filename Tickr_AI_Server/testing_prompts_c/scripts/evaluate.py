@@ -0,0 +1,272 @@
+"""Run every prompt against every sample chat and score the outputs against the server's schemas.
+
+Run from anywhere:
+    python testing_prompts_c/scripts/evaluate.py                         # prompts/*.inp x samples/*.inp
+    python testing_prompts_c/scripts/evaluate.py --backend fake          # offline, no API key needed
+    python testing_prompts_c/scripts/evaluate.py --prompts prompts/long_overview.inp --inputs out/tasks2.json --print
+
+The prompt type (and so the schema) comes from the file name: `tickets.inp`, `tickets_v2.inp` and
+`tickets.terse.inp` are all TICKETS prompts. Model responses are cached under `<out>/cache` by prompt,
+input, model and request parameters, so only pairs that changed are sent again; cached responses are
+still re-validated. Each run appends one line per prompt version to `<out>/history.jsonl` with its
+latency, token counts and schema pass rate.
+"""
+import argparse
+import asyncio
+import datetime
+import hashlib
+import json
+import os
+import statistics
+import sys
+import time
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional, Tuple
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURES_DIR = os.path.dirname(SCRIPTS_DIR)
+SERVER_DIR = os.path.dirname(FIXTURES_DIR)
+sys.path[:0] = [SERVER_DIR, os.path.join(SERVER_DIR, "benchmarks")]
+
+import dates
+from chunking import estimate_tokens
+from output import OutputParseError, parse_output
+from prompts import PROMPT_FILES, CompiledPrompt, compile_prompt
+
+PROMPT_TYPES = {os.path.splitext(name)[0]: prompt_type for prompt_type, name in PROMPT_FILES.items()}
+
+
+@dataclass
+class Result:
+    prompt: str
+    version: str
+    input: str
+    cached: bool
+    valid: bool
+    latency_ms: float
+    input_tokens: int
+    output_tokens: int
+    error: Optional[str] = None
+
+
+def prompt_type_for(path: str):
+    stem = os.path.basename(path).split(".")[0]
+    # Longest match first so e.g. `long_overview_v2` is not taken for some shorter prompt name
+    for name in sorted(PROMPT_TYPES, key=len, reverse=True):
+        if stem == name or stem.startswith(name + "_") or stem.startswith(name + "-"):
+            return PROMPT_TYPES[name]
+    return None
+
+
+def collect(paths: List[str], pattern_ext: Tuple[str, ...]) -> List[str]:
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            found.extend(
+                os.path.join(path, name) for name in sorted(os.listdir(path)) if name.endswith(pattern_ext)
+            )
+        else:
+            found.append(path)
+    return found
+
+
+def digest(*parts: str) -> str:
+    return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()
+
+
+def create_model(args):
+    if args.backend == "fake":
+        from fakes import FakeLLM
+
+        return FakeLLM(latency=args.fake_latency, jitter=args.fake_latency / 2)
+
+    from langchain_google_genai.chat_models import ChatGoogleGenerativeAI
+
+    from models import CombinedPayload, Payload, ProjectOverview, Summary
+
+    api_key = os.getenv("GEMINI_API_KEY") or os.getenv("MY_API_KEY")
+    if not api_key:
+        raise SystemExit("Set GEMINI_API_KEY (or MY_API_KEY), or run with --backend fake")
+    # Same model setup as the server, so pass rates carry over
+    llm = ChatGoogleGenerativeAI(model=args.model, api_key=api_key, temperature=0.3)
+    return llm.bind_tools([Payload, ProjectOverview, Summary, CombinedPayload])
+
+
+class Evaluator:
+    def __init__(self, args, model):
+        self.args = args
+        self.model = model
+        self.cache_dir = os.path.join(args.out, "cache")
+        self.outputs_dir = os.path.join(args.out, "outputs")
+        self.semaphore = asyncio.Semaphore(args.concurrency)
+        self.reference = dates.reference_time(args.timestamp)
+        self.days_of_week = args.days_of_week or self.reference.strftime("%A").upper()
+        os.makedirs(self.cache_dir, exist_ok=True)
+        os.makedirs(self.outputs_dir, exist_ok=True)
+
+    def cache_key(self, compiled: CompiledPrompt, chat: str) -> str:
+        return digest(
+            compiled.prompt_type.value,
+            compiled.digest,
+            hashlib.sha256(chat.encode("utf-8")).hexdigest(),
+            self.args.backend,
+            self.args.model,
+            str(self.args.counts),
+            self.args.timestamp,
+            self.days_of_week,
+        )
+
+    async def respond(self, compiled: CompiledPrompt, chat: str) -> Tuple[dict, bool]:
+        path = os.path.join(self.cache_dir, self.cache_key(compiled, chat) + ".json")
+        if not self.args.no_cache and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f), True
+
+        prompt = compiled.format(
+            chat,
+            counts=self.args.counts,
+            timestamp=self.args.timestamp,
+            days_of_week=self.days_of_week,
+        )
+        async with self.semaphore:
+            start = time.perf_counter()
+            result = await self.model.ainvoke(prompt)
+            latency = time.perf_counter() - start
+        content = result.content if isinstance(result.content, str) else json.dumps(result.content, ensure_ascii=False)
+        usage = getattr(result, "usage_metadata", None) or {}
+        response = {
+            "content": content,
+            "tool_calls": [{"name": call["name"], "args": call["args"]} for call in getattr(result, "tool_calls", None) or []],
+            "latency_ms": latency * 1000,
+            "input_tokens": usage.get("input_tokens") or estimate_tokens(prompt),
+            "output_tokens": usage.get("output_tokens") or estimate_tokens(content),
+        }
+        # Write then rename so an interrupted run never leaves a truncated cache entry
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(response, f, ensure_ascii=False)
+        os.replace(path + ".tmp", path)
+        return response, False
+
+    async def evaluate(self, prompt_path: str, compiled: CompiledPrompt, input_path: str) -> Result:
+        with open(input_path, "r", encoding="utf-8") as f:
+            chat = f.read()
+        prompt_name = os.path.splitext(os.path.basename(prompt_path))[0]
+        input_name = os.path.splitext(os.path.basename(input_path))[0]
+        result = Result(prompt_name, compiled.digest[:8], input_name, False, False, 0.0, 0, 0)
+        try:
+            response, result.cached = await self.respond(compiled, chat)
+        except Exception as e:
+            result.error = f"{type(e).__name__}: {e}"
+            return result
+        result.latency_ms = response["latency_ms"]
+        result.input_tokens = response["input_tokens"]
+        result.output_tokens = response["output_tokens"]
+        try:
+            parsed = parse_output(
+                response["content"],
+                compiled.parser.pydantic_object,
+                response["tool_calls"],
+                reference=self.reference,
+            )
+            result.valid = True
+            text = parsed.model_dump_json(indent=2)
+        except OutputParseError as e:
+            result.error = str(e).splitlines()[0]
+            text = response["content"]
+        with open(os.path.join(self.outputs_dir, f"{prompt_name}__{input_name}.out"), "w", encoding="utf-8") as f:
+            f.write(text)
+        if self.args.print:
+            print(f"===== {prompt_name} x {input_name}\n{text}\n")
+        return result
+
+
+def summarize(results: List[Result]) -> List[dict]:
+    by_version: Dict[Tuple[str, str], List[Result]] = {}
+    for result in results:
+        by_version.setdefault((result.prompt, result.version), []).append(result)
+    rows = []
+    for (prompt, version), group in sorted(by_version.items()):
+        answered = [result for result in group if result.latency_ms] or group
+        latencies = [result.latency_ms for result in answered]
+        rows.append({
+            "prompt": prompt,
+            "version": version,
+            "pairs": len(group),
+            "cached": sum(result.cached for result in group),
+            "pass_rate": sum(result.valid for result in group) / len(group),
+            "latency_p50_ms": statistics.median(latencies),
+            "latency_mean_ms": statistics.fmean(latencies),
+            "input_tokens": sum(result.input_tokens for result in group),
+            "output_tokens": sum(result.output_tokens for result in group),
+        })
+    return rows
+
+
+async def run(args) -> List[Result]:
+    prompt_paths = []
+    for path in collect(args.prompts, (".inp",)):
+        if prompt_type_for(path) is None:
+            print(f"skipping {path}: name matches no prompt type ({', '.join(sorted(PROMPT_TYPES))})", file=sys.stderr)
+        else:
+            prompt_paths.append(path)
+    input_paths = collect(args.inputs, tuple(args.input_ext.split(",")))
+    if not prompt_paths or not input_paths:
+        raise SystemExit("Nothing to evaluate: no prompts or no inputs found")
+
+    evaluator = Evaluator(args, create_model(args))
+    compiled = {path: compile_prompt(prompt_type_for(path), path) for path in prompt_paths}
+    return await asyncio.gather(*(
+        evaluator.evaluate(prompt_path, compiled[prompt_path], input_path)
+        for prompt_path in prompt_paths
+        for input_path in input_paths
+    ))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--prompts", nargs="+", default=[os.path.join(FIXTURES_DIR, "prompts")], help="Prompt files or directories of *.inp")
+    parser.add_argument("--inputs", nargs="+", default=[os.path.join(FIXTURES_DIR, "samples")], help="Input files or directories")
+    parser.add_argument("--input-ext", default=".inp,.txt,.json", help="Extensions picked up from input directories")
+    parser.add_argument("--out", default=os.path.join(FIXTURES_DIR, "out", "eval"), help="Cache, outputs and history directory")
+    parser.add_argument("--backend", choices=("gemini", "fake"), default="gemini", help="Model backend; `fake` runs offline")
+    parser.add_argument("--model", default="gemini-2.0-flash", help="Gemini model name")
+    parser.add_argument("-j", "--concurrency", type=int, default=4, help="Model calls in flight at once")
+    parser.add_argument("--counts", type=int, default=3, help="Tickets asked for by TICKETS prompts")
+    parser.add_argument("--timestamp", default="2025-05-17T12:00:00", help="Reference timestamp for due dates")
+    parser.add_argument("--days-of-week", default=None, help="Reference day of week (default: from --timestamp)")
+    parser.add_argument("--fake-latency", type=float, default=0.2, help="Fake model latency in seconds")
+    parser.add_argument("--no-cache", action="store_true", help="Call the model even for unchanged pairs")
+    parser.add_argument("--print", action="store_true", help="Print every output")
+    parser.add_argument("--fail-under", type=float, default=0.0, help="Exit non-zero if any prompt's pass rate is below this")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    results = asyncio.run(run(args))
+    elapsed = time.perf_counter() - started
+
+    for result in results:
+        if result.error:
+            print(f"FAIL {result.prompt} x {result.input}: {result.error}", file=sys.stderr)
+
+    rows = summarize(results)
+    print(f"{'prompt':<22}{'version':<10}{'pairs':>6}{'cached':>7}{'pass':>7}{'p50 ms':>9}{'mean ms':>9}{'in tok':>9}{'out tok':>9}")
+    for row in rows:
+        print(
+            f"{row['prompt']:<22}{row['version']:<10}{row['pairs']:>6}{row['cached']:>7}{row['pass_rate']:>7.0%}"
+            f"{row['latency_p50_ms']:>9.0f}{row['latency_mean_ms']:>9.0f}{row['input_tokens']:>9}{row['output_tokens']:>9}"
+        )
+    print(f"{len(results)} pairs in {elapsed:.2f}s, {sum(result.cached for result in results)} from cache")
+
+    run_at = datetime.datetime.now().isoformat(timespec="seconds")
+    with open(os.path.join(args.out, "history.jsonl"), "a", encoding="utf-8") as f:
+        for row in rows:
+            f.write(json.dumps({"run_at": run_at, "backend": args.backend, "model": args.model, **row}) + "\n")
+    with open(os.path.join(args.out, "last_run.json"), "w", encoding="utf-8") as f:
+        json.dump([asdict(result) for result in results], f, ensure_ascii=False, indent=2)
+
+    if any(row["pass_rate"] < args.fail_under for row in rows):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,13 @@
+import os
+import sys
+import tempfile
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [SERVER_DIR, os.path.join(SERVER_DIR, "benchmarks")]
+
+# Keep the server's on-disk state out of the working tree if a test imports main
+_STATE_DIR = tempfile.mkdtemp(prefix="tickr-tests-")
+os.environ.setdefault("TOKEN_STORE_PATH", os.path.join(_STATE_DIR, "tokens.sqlite3"))
+os.environ.setdefault("JOB_QUEUE_PATH", os.path.join(_STATE_DIR, "jobs.sqlite3"))
+os.environ.setdefault("GEMINI_API_KEY", "offline-tests")
+os.environ.setdefault("WARMUP_ON_START", "0")
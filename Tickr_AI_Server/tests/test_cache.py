@@ -0,0 +1,44 @@
+import sqlite3
+import time
+
+from cache import ResponseCache
+
+
+def disk_keys(path):
+    with sqlite3.connect(path) as db:
+        return {row[0] for row in db.execute("SELECT key FROM responses")}
+
+
+def test_purge_drops_expired_disk_rows(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = ResponseCache(ttl=0.01, disk_path=path)
+    cache.set("old", {"n": 1})
+    time.sleep(0.02)
+
+    assert cache.purge() == 1
+    assert disk_keys(path) == set()
+
+
+def test_purge_caps_disk_rows_by_last_use(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = ResponseCache(max_entries=1, disk_path=path, max_disk_entries=2)
+    for key in ("a", "b", "c"):
+        cache.set(key, {"key": key})
+        time.sleep(0.001)
+    # "a" is read back from disk (it fell out of memory), so "b" is now the least recently used
+    assert cache.get("a") == {"key": "a"}
+
+    assert cache.purge() == 1
+    assert disk_keys(path) == {"a", "c"}
+
+
+def test_disk_file_without_used_column_is_upgraded(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    with sqlite3.connect(path) as db:
+        db.execute("CREATE TABLE responses (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL)")
+        db.execute("INSERT INTO responses VALUES ('k', ?, ?)", ('{"n": 1}', time.time() + 60))
+
+    cache = ResponseCache(disk_path=path)
+
+    assert cache.get("k") == {"n": 1}
+    assert cache.purge() == 0
@@ -0,0 +1,125 @@
+import pytest
+
+import calendar_sync
+from calendar_sync import SyncState, ticket_key
+from calendar_utils import CalendarClient
+from fakes import FakeCalendarService
+from models import Ticket
+
+
+def ticket(i: int, title: str = None, **fields) -> Ticket:
+    return Ticket(
+        title=title or f"Set up the staging database {i}",
+        assignee=f"user{i}",
+        due_date=f"2025-06-{i + 1:02d}T17:00:00.000Z",
+        description=f"Provision Postgres for staging, run migrations and seed fixtures ({i})",
+        **fields,
+    )
+
+
+@pytest.fixture
+def calendar():
+    service = FakeCalendarService()
+    return service, CalendarClient(creds=None, service=service)
+
+
+def sync(client, state, tickets, delete_missing=False):
+    calendar_sync.pull_changes(client, state)
+    ops, unchanged = calendar_sync.plan(state, tickets, delete_missing=delete_missing)
+    results = calendar_sync.apply(client, state, ops) if ops else []
+    return [op.action for op in ops], unchanged, results
+
+
+def live_events(service):
+    return [event for event in service.events_by_id.values() if event.get("status") != "cancelled"]
+
+
+def test_first_sync_inserts_then_unchanged_is_free(calendar):
+    service, client = calendar
+    state = SyncState()
+    tickets = [ticket(i, id=f"ticket-{i}") for i in range(3)]
+
+    assert sync(client, state, tickets)[:2] == (["insert"] * 3, 0)
+    calls = dict(service.calls)
+    assert sync(client, state, tickets)[:2] == ([], 3)
+    # Only the incremental listing, no writes
+    assert {method: count - calls.get(method, 0) for method, count in service.calls.items()} == {
+        "insert": 0, "list": 1,
+    }
+
+
+def test_changed_ticket_is_patched_and_missing_deleted(calendar):
+    service, client = calendar
+    state = SyncState()
+    sync(client, state, [ticket(i, id=f"ticket-{i}") for i in range(3)])
+
+    tickets = [ticket(0, id="ticket-0", title="Set up the staging database (moved)"), ticket(1, id="ticket-1")]
+    actions, unchanged, results = sync(client, state, tickets, delete_missing=True)
+
+    assert sorted(actions) == ["delete", "patch"]
+    assert unchanged == 1
+    assert not any("error" in result for result in results)
+    assert len(live_events(service)) == 2
+    assert set(state.records) == {"ticket-0", "ticket-1"}
+
+
+def test_event_deleted_in_calendar_is_not_recreated_until_ticket_changes(calendar):
+    service, client = calendar
+    state = SyncState()
+    tickets = [ticket(0, id="ticket-0")]
+    sync(client, state, tickets)
+    service.remove(state.records["ticket-0"].event_id)
+
+    assert sync(client, state, tickets)[:2] == ([], 1)
+    assert state.records["ticket-0"].cancelled
+
+    assert sync(client, state, [ticket(0, id="ticket-0", title="Set up the staging database again")])[0] == ["insert"]
+    assert len(live_events(service)) == 1
+
+
+def test_expired_sync_token_relists(calendar):
+    service, client = calendar
+    state = SyncState()
+    tickets = [ticket(i, id=f"ticket-{i}") for i in range(3)]
+    sync(client, state, tickets)
+    service.edit(state.records["ticket-1"].event_id, location="Room 4")
+    service.oldest_sync_version = service._version + 1
+
+    seen = calendar_sync.pull_changes(client, state)
+
+    # Full listing after the 410, and the mapping survives it
+    assert seen == 3
+    assert state.sync_token == str(service._version)
+    assert calendar_sync.plan(state, tickets) == ([], 3)
+
+
+def test_renamed_ticket_without_id_keeps_its_event(calendar):
+    service, client = calendar
+    state = SyncState()
+    original = ticket(0)
+    sync(client, state, [original])
+    event_id = state.records[ticket_key(original)].event_id
+
+    renamed = ticket(0, title="Set up the staging database and backups")
+    actions, _, _ = sync(client, state, [renamed], delete_missing=True)
+
+    assert actions == ["patch"]
+    assert state.records[ticket_key(renamed)].event_id == event_id
+    assert ticket_key(original) not in state.records
+    assert [event["summary"] for event in live_events(service)] == [renamed.title]
+
+    # The event now carries the new key, so later pulls and syncs keep it
+    assert sync(client, state, [renamed], delete_missing=True)[:2] == ([], 1)
+    assert len(live_events(service)) == 1
+
+
+def test_unrelated_new_ticket_is_not_taken_for_a_rename(calendar):
+    service, client = calendar
+    state = SyncState()
+    sync(client, state, [ticket(0)])
+
+    other = Ticket(title="Write the launch blog post", assignee="user0", due_date="2025-06-01T17:00:00.000Z", description="Draft and review")
+    actions, _, _ = sync(client, state, [other], delete_missing=True)
+
+    assert sorted(actions) == ["delete", "insert"]
+    assert [event["summary"] for event in live_events(service)] == [other.title]
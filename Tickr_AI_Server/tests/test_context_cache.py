@@ -0,0 +1,101 @@
+import asyncio
+
+from context_cache import ContextCachedModel, ContextCacheManager
+from fakes import FakeContextCacheBackend, FakeLLM
+from prompts import SplitPrompt
+
+STATIC = "You are a project assistant. Extract exactly the requested tickets.\n" * 20
+
+
+class Clock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def make_manager(min_chars: int = 0):
+    clock = Clock()
+    backend = FakeContextCacheBackend(min_chars=min_chars, clock=clock)
+    manager = ContextCacheManager(backend, ttl=3600.0, renew_margin=300.0, retry_interval=600.0, clock=clock)
+    return manager, backend, clock
+
+
+def prompt(static: str = STATIC, dynamic: str = "chat log") -> SplitPrompt:
+    return SplitPrompt(static, dynamic, "TICKETS")
+
+
+def test_create_once_then_hit():
+    manager, backend, _ = make_manager()
+
+    first = asyncio.run(manager.handle("gemini", prompt()))
+    second = asyncio.run(manager.handle("gemini", prompt(dynamic="another chat")))
+
+    assert first is not None and first == second
+    assert backend.created == 1
+
+
+def test_renews_inside_margin_and_recreates_after_expiry():
+    manager, backend, clock = make_manager()
+    name = asyncio.run(manager.handle("gemini", prompt()))
+
+    clock.now += 3600 - 100
+    assert asyncio.run(manager.handle("gemini", prompt())) == name
+    assert backend.renewed == 1
+    assert backend.created == 1
+
+    clock.now += 3600 + 1
+    assert asyncio.run(manager.handle("gemini", prompt())) != name
+    assert backend.created == 2
+
+
+def test_changed_prefix_deletes_old_cache():
+    manager, backend, _ = make_manager()
+    old = asyncio.run(manager.handle("gemini", prompt()))
+
+    new = asyncio.run(manager.handle("gemini", prompt(static=STATIC + "Use ISO dates.\n")))
+
+    assert new != old
+    assert old not in backend.caches
+    assert backend.deleted == 1
+
+
+def test_create_failure_backs_off():
+    manager, backend, clock = make_manager(min_chars=len(STATIC) + 1)
+
+    assert asyncio.run(manager.handle("gemini", prompt())) is None
+    assert asyncio.run(manager.handle("gemini", prompt())) is None
+    assert manager.stats()["backing_off"] == 1
+
+    backend.min_chars = 0
+    clock.now += 601
+    assert asyncio.run(manager.handle("gemini", prompt())) is not None
+
+
+def test_model_falls_back_to_full_prompt_when_cache_is_gone():
+    manager, backend, _ = make_manager()
+    full, cached = FakeLLM(latency=0), FakeLLM(latency=0, context_caches=backend)
+    model = ContextCachedModel("gemini", full, cached, manager)
+
+    asyncio.run(model.ainvoke(prompt()))
+    assert (full.calls, cached.calls) == (0, 1)
+
+    # Deleted on the provider side, e.g. by another deployment
+    name = next(iter(backend.caches))
+    backend.delete(name)
+    asyncio.run(model.ainvoke(prompt()))
+
+    assert full.calls == 1
+    assert manager.stats()["handles"] == []
+
+
+def test_uncacheable_prefix_sends_full_prompt():
+    manager, _, _ = make_manager(min_chars=len(STATIC) + 1)
+    full, cached = FakeLLM(latency=0), FakeLLM(latency=0)
+    model = ContextCachedModel("gemini", full, cached, manager)
+
+    asyncio.run(model.ainvoke(prompt()))
+
+    assert (full.calls, cached.calls) == (1, 0)
+    assert full.prompt_chars == len(prompt())
@@ -0,0 +1,60 @@
+import datetime
+
+import pytest
+
+from dates import annotate, normalize_due_date, reference_time
+
+REFERENCE = datetime.datetime(2024, 2, 20, 9, 0)
+
+
+@pytest.mark.parametrize("text", ["this is 3/4 done", "we are 2/3 of the way", "I may 2 hours on it", "March 5 miles before lunch"])
+def test_annotate_skips_fractions_and_words(text):
+    assert annotate(text, REFERENCE) == text
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("due 3/4", "due 3/4 [=2024-03-04]"),
+    ("by May 2", "by May 2 [=2024-05-02]"),
+    ("Fri 3/4", "Fri 3/4 [=2024-03-04]"),
+    ("5/3까지", "5/3 [=2024-05-03]까지"),
+    ("May 2 at 3pm", "May 2 at 3pm [=2024-05-02 15:00]"),
+    ("June 7", "June 7 [=2024-06-07]"),
+    ("tomorrow", "tomorrow [=2024-02-21]"),
+])
+def test_annotate_dates_in_context(text, expected):
+    assert annotate(text, REFERENCE) == expected
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("2024-03-01T09:00:00+09:00", "2024-03-01T00:00:00.000Z"),
+    ("2024-03-01T23:30:00-05:00", "2024-03-02T04:30:00.000Z"),
+    ("2024-03-01T09:00:00Z", "2024-03-01T09:00:00.000Z"),
+    ("2024-03-01T09:00:00", "2024-03-01T09:00:00.000Z"),
+    ("2024-03-01", "2024-03-01T23:59:59.999Z"),
+])
+def test_normalize_due_date_converts_offsets_to_utc(value, expected):
+    assert normalize_due_date(value) == expected
+
+
+@pytest.mark.parametrize("value", [
+    "tomorrow at 7pm",
+    "2024-02-21T19:00:00+09:00",
+    "2024-02-21T19:00:00",
+    "2024-02-21T10:00:00.000Z",
+])
+def test_local_and_explicit_times_agree_for_offset_reference(value):
+    reference = reference_time("2024-02-20T23:30:00+09:00")
+
+    assert normalize_due_date(value, reference) == "2024-02-21T10:00:00.000Z"
+
+
+def test_relative_dates_resolve_on_the_senders_calendar():
+    # 23:30 in Seoul is still the 20th, while UTC has already moved on in other zones
+    reference = reference_time("2024-02-20T23:30:00+09:00")
+
+    assert annotate("ship it tomorrow at 7pm", reference) == "ship it tomorrow at 7pm [=2024-02-21 19:00 +09:00]"
+    assert normalize_due_date("tomorrow", reference) == "2024-02-21T14:59:59.999Z"
+
+
+def test_naive_timestamp_is_utc():
+    assert reference_time("2024-02-20T09:00:00").utcoffset() == datetime.timedelta(0)
@@ -0,0 +1,80 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from fakes import FakeLLM
+
+
+@pytest.fixture
+def client(monkeypatch):
+    fake = FakeLLM(latency=0)
+    monkeypatch.setattr(main.llm_router, "backends", {name: fake for name in main.llm_router.backends})
+    main.response_cache.clear()
+    with TestClient(main.app) as client:
+        yield client, fake
+
+
+def incremental(channel_id, prompt_type="TICKETS"):
+    return {
+        "prompt_type": prompt_type,
+        "counts": 3,
+        "channel_id": channel_id,
+        "incremental": True,
+        "timestamp": "2024-02-20T09:00:00Z",
+        "messages": [
+            {"id": "1", "author": "ana", "content": "Can someone set up the staging database by Friday?"},
+            {"id": "2", "author": "ben", "content": "I'll take it, and also write the migration scripts"},
+        ],
+    }
+
+
+@pytest.mark.parametrize("prompt_type", ["TICKETS", "SUMMARY", "LONG_OVERVIEW"])
+def test_incremental_request_with_nothing_new_skips_the_model(client, prompt_type):
+    client, fake = client
+    body = incremental(f"nothing-new-{prompt_type}", prompt_type)
+
+    assert client.post("/extract", json=body).status_code == 200
+    calls = fake.calls
+    second = client.post("/extract", json=body)
+
+    assert second.status_code == 200
+    assert fake.calls == calls
+    if prompt_type == "TICKETS":
+        assert second.json()["tickets"] == []
+
+
+def test_stream_with_nothing_new_returns_empty_result(client):
+    client, fake = client
+    body = incremental("nothing-new-stream")
+    client.post("/extract", json=body)
+    calls = fake.calls
+
+    response = client.post("/extract/stream?format=ndjson", json=body)
+
+    assert response.status_code == 200
+    assert fake.calls == calls
+    assert '"tickets":[]' in response.text.replace(" ", "")
+
+
+def test_chunked_tickets_default_to_three(client, monkeypatch):
+    client, fake = client
+    monkeypatch.setattr(main, "EXTRACT_CHUNK_TOKENS", 50)
+    messages = [
+        {"id": str(i), "author": f"user{i % 3}", "content": f"I'll finish the deployment checklist item {i} by Friday"}
+        for i in range(40)
+    ]
+
+    response = client.post("/extract", json={"prompt_type": "TICKETS", "prefilter": False, "messages": messages})
+
+    assert response.status_code == 200
+    assert fake.calls > 1
+    assert len(response.json()["tickets"]) == 3
+
+
+def test_unknown_mode_is_rejected(client):
+    client, fake = client
+
+    response = client.post("/extract?mode=bogus", json=incremental("bad-mode"))
+
+    assert response.status_code == 400
+    assert fake.calls == 0
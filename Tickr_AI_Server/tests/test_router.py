@@ -0,0 +1,72 @@
+import asyncio
+
+from fakes import FakeLLM
+from router import CLOSED, HALF_OPEN, OPEN, ModelRouter
+
+
+def half_open_router(primary_latency: float) -> ModelRouter:
+    router = ModelRouter(
+        {"primary": FakeLLM(latency=primary_latency), "backup": FakeLLM(latency=0.01)},
+        default_route=["primary", "backup"],
+        hedge_min_samples=1,
+        reset_timeout=0.0,
+    )
+    # Usual p95 of 10ms, so a slow primary is hedged almost at once
+    router.latency["primary"].observe(0.01)
+    router.breakers["primary"].state = OPEN
+    return router
+
+
+def test_hedge_won_by_backup_releases_half_open_probe():
+    router = half_open_router(primary_latency=1.0)
+
+    _, model = asyncio.run(router.ainvoke("Extract exactly 3 tickets"))
+
+    assert model == "backup"
+    breaker = router.breakers["primary"]
+    assert breaker.state == HALF_OPEN
+    # The cancelled probe proved nothing, so the next request may probe again
+    assert breaker.ready()
+    assert breaker.allow()
+
+
+def test_cancelled_call_releases_half_open_probe():
+    router = half_open_router(primary_latency=1.0)
+    router.hedge = False
+
+    async def cancel_midway():
+        task = asyncio.create_task(router.ainvoke("Extract exactly 3 tickets"))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    asyncio.run(cancel_midway())
+
+    assert router.breakers["primary"].ready()
+
+
+def test_closed_stream_releases_half_open_probe():
+    router = half_open_router(primary_latency=0.0)
+
+    async def read_one_chunk():
+        stream = router.astream("Extract exactly 3 tickets")
+        await stream.__anext__()
+        await stream.aclose()
+
+    asyncio.run(read_one_chunk())
+
+    breaker = router.breakers["primary"]
+    assert breaker.state == HALF_OPEN
+    assert breaker.ready()
+
+
+def test_successful_probe_closes_breaker():
+    router = half_open_router(primary_latency=0.0)
+
+    _, model = asyncio.run(router.ainvoke("Extract exactly 3 tickets"))
+
+    assert model == "primary"
+    assert router.breakers["primary"].state == CLOSED
@@ -0,0 +1,37 @@
+import asyncio
+import sqlite3
+import time
+
+from shared_state import SQLiteSharedStore, run_purge
+
+
+def rows(path):
+    with sqlite3.connect(path) as db:
+        return {(row[0], row[1]) for row in db.execute("SELECT namespace, key FROM shared")}
+
+
+def test_expired_row_is_deleted_when_read(tmp_path):
+    path = str(tmp_path / "shared.sqlite3")
+    store = SQLiteSharedStore(path)
+    store.set("responses", "old", "{}", ttl=0.01)
+    store.set("responses", "kept", "{}")
+    time.sleep(0.02)
+
+    assert store.get("responses", "old") is None
+    assert rows(path) == {("responses", "kept")}
+
+
+def test_purge_task_drops_rows_never_read_again(tmp_path):
+    path = str(tmp_path / "shared.sqlite3")
+    store = SQLiteSharedStore(path)
+    store.set("jobs", "done", "{}", ttl=0.01)
+    store.set("tickets", "guild", "[]")
+
+    async def purge_once():
+        task = asyncio.create_task(run_purge(store, interval=0.05))
+        await asyncio.sleep(0.1)
+        task.cancel()
+
+    asyncio.run(purge_once())
+
+    assert rows(path) == {("tickets", "guild")}
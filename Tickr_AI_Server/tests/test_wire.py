@@ -0,0 +1,41 @@
+import gzip
+
+import pytest
+from starlette.exceptions import HTTPException
+
+from wire import _Decoder
+
+LIMIT = 1 << 20
+CHUNK = 64 * 1024
+
+
+def decode(body: bytes, encoding: str, limit: int = LIMIT) -> bytes:
+    decoder = _Decoder(encoding, limit)
+    return b"".join(decoder.decompress(body[i:i + CHUNK]) for i in range(0, len(body), CHUNK)) + decoder.flush()
+
+
+def compress(encoding: str, body: bytes) -> bytes:
+    if encoding == "gzip":
+        return gzip.compress(body)
+    zstandard = pytest.importorskip("zstandard")
+    return zstandard.ZstdCompressor(level=3).compress(body)
+
+
+@pytest.mark.parametrize("encoding", ["gzip", "zstd"])
+def test_round_trip(encoding):
+    body = b'{"messages": [' + b",".join(b'{"author": "a", "content": "hello %d"}' % i for i in range(20000)) + b"]}"
+    assert decode(compress(encoding, body), encoding, limit=len(body)) == body
+
+
+@pytest.mark.parametrize("encoding", ["gzip", "zstd"])
+def test_bomb_is_refused_before_it_is_inflated(encoding):
+    bomb = compress(encoding, b"\0" * (256 << 20))
+    decoder = _Decoder(encoding, LIMIT)
+
+    with pytest.raises(HTTPException) as error:
+        for i in range(0, len(bomb), CHUNK):
+            decoder.decompress(bomb[i:i + CHUNK])
+
+    assert error.value.status_code == 413
+    # Stopped within about a block of the limit, not after inflating the whole body
+    assert decoder.size < LIMIT + 512 * 1024
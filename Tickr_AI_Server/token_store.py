@@ -0,0 +1,226 @@
+import asyncio
+import datetime
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from google.oauth2.credentials import Credentials
+
+
+class FileTokenBackend:
+    """Legacy layout: one `{user_id}.json` file per user."""
+
+    def __init__(self, directory: str = "data"):
+        self.directory = directory
+
+    def _path(self, user_id: str) -> str:
+        return os.path.join(self.directory, f"{user_id}.json")
+
+    def load(self, user_id: str) -> Optional[str]:
+        try:
+            with open(self._path(user_id), "r") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def save(self, user_id: str, token: str) -> None:
+        # Write to a temp file and rename so readers never see a half-written token
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=f".{user_id}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(token)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self._path(user_id))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def delete(self, user_id: str) -> None:
+        try:
+            os.remove(self._path(user_id))
+        except FileNotFoundError:
+            pass
+
+
+class SQLiteTokenBackend:
+    """Tokens in a single SQLite table; each write is its own transaction."""
+
+    def __init__(self, path: str = "data/tokens.sqlite3"):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS tokens (user_id TEXT PRIMARY KEY, token TEXT NOT NULL, updated REAL NOT NULL)"
+        )
+        self._db.commit()
+        self._lock = threading.Lock()
+
+    def load(self, user_id: str) -> Optional[str]:
+        with self._lock:
+            row = self._db.execute("SELECT token FROM tokens WHERE user_id = ?", (user_id,)).fetchone()
+        return row[0] if row else None
+
+    def save(self, user_id: str, token: str) -> None:
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO tokens (user_id, token, updated) VALUES (?, ?, ?)",
+                (user_id, token, time.time()),
+            )
+
+    def delete(self, user_id: str) -> None:
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM tokens WHERE user_id = ?", (user_id,))
+
+
+class SharedTokenBackend:
+    """Tokens in the shared store (shared_state.py), visible to every worker and host."""
+
+    def __init__(self, store):
+        self.store = store
+
+    def load(self, user_id: str) -> Optional[str]:
+        return self.store.get("tokens", user_id)
+
+    def save(self, user_id: str, token: str) -> None:
+        self.store.set("tokens", user_id, token)
+
+    def delete(self, user_id: str) -> None:
+        self.store.delete("tokens", user_id)
+
+
+def _refresh(creds: Credentials) -> None:
+    # Pulls in `requests`; only needed once a token is actually due
+    from google.auth.transport.requests import Request as AuthRequest
+
+    creds.refresh(AuthRequest())
+
+
+@dataclass
+class _Entry:
+    creds: Credentials
+    touched: float
+
+
+class TokenStore:
+    """In-memory credential cache in front of a durable backend, with single-flight refresh per user."""
+
+    def __init__(
+        self,
+        backend,
+        scopes: List[str],
+        refresh_ahead: float = 300.0,
+        idle_ttl: float = 900.0,
+        legacy: Optional[FileTokenBackend] = None,
+    ):
+        self.backend = backend
+        self.scopes = scopes
+        self.refresh_ahead = datetime.timedelta(seconds=refresh_ahead)
+        self.idle_ttl = idle_ttl
+        self.legacy = legacy
+        self._entries: Dict[str, _Entry] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    def _needs_refresh(self, creds: Credentials) -> bool:
+        if not creds.refresh_token:
+            return False
+        if creds.expiry is None:
+            return not creds.valid
+        return creds.expiry - datetime.datetime.utcnow() < self.refresh_ahead
+
+    def _load(self, user_id: str) -> Optional[str]:
+        raw = self.backend.load(user_id)
+        if raw is None and self.legacy is not None:
+            # Import tokens written by the flat-file layout on first use
+            raw = self.legacy.load(user_id)
+            if raw is not None:
+                self.backend.save(user_id, raw)
+        return raw
+
+    async def get(self, user_id: str) -> Optional[Credentials]:
+        """Return valid credentials for `user_id`, refreshing at most once across concurrent callers."""
+        entry = self._entries.get(user_id)
+        if entry is not None and not self._needs_refresh(entry.creds):
+            entry.touched = time.monotonic()
+            return entry.creds
+
+        lock = self._locks.setdefault(user_id, asyncio.Lock())
+        async with lock:
+            # Another caller may have loaded or refreshed while we waited
+            entry = self._entries.get(user_id)
+            if entry is not None and not self._needs_refresh(entry.creds):
+                return entry.creds
+            if entry is not None:
+                creds = entry.creds
+                # Another worker sharing the backend may already have refreshed
+                raw = await asyncio.to_thread(self._load, user_id)
+                if raw is not None:
+                    stored = Credentials.from_authorized_user_info(json.loads(raw), self.scopes)
+                    if not self._needs_refresh(stored):
+                        creds = stored
+            else:
+                raw = await asyncio.to_thread(self._load, user_id)
+                if raw is None:
+                    return None
+                creds = Credentials.from_authorized_user_info(json.loads(raw), self.scopes)
+
+            if self._needs_refresh(creds):
+                await asyncio.to_thread(_refresh, creds)
+                await asyncio.to_thread(self.backend.save, user_id, creds.to_json())
+
+            self._entries[user_id] = _Entry(creds=creds, touched=time.monotonic())
+            return creds
+
+    async def save(self, user_id: str, creds: Credentials) -> None:
+        await asyncio.to_thread(self.backend.save, user_id, creds.to_json())
+        self._entries[user_id] = _Entry(creds=creds, touched=time.monotonic())
+
+    async def delete(self, user_id: str) -> None:
+        self._entries.pop(user_id, None)
+        await asyncio.to_thread(self.backend.delete, user_id)
+
+    def evict_idle(self) -> int:
+        cutoff = time.monotonic() - self.idle_ttl
+        idle = [user_id for user_id, entry in self._entries.items() if entry.touched < cutoff]
+        for user_id in idle:
+            self._entries.pop(user_id, None)
+            lock = self._locks.get(user_id)
+            if lock is not None and not lock.locked():
+                del self._locks[user_id]
+        return len(idle)
+
+    async def run_expiry(self, interval: float = 60.0) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            self.evict_idle()
+
+
+def create_token_store(scopes: List[str], refresh_ahead: float = 300.0, shared=None) -> TokenStore:
+    """Build the token store from TOKEN_STORE (sqlite|file|shared) and TOKEN_STORE_PATH."""
+    kind = os.getenv("TOKEN_STORE", "shared" if shared is not None else "sqlite")
+    if kind == "shared":
+        if shared is None:
+            raise ValueError("TOKEN_STORE=shared needs SHARED_STATE_URL")
+        backend = SharedTokenBackend(shared)
+        legacy = FileTokenBackend("data")
+    elif kind == "file":
+        backend = FileTokenBackend(os.getenv("TOKEN_STORE_PATH", "data"))
+        legacy = None
+    elif kind == "sqlite":
+        backend = SQLiteTokenBackend(os.getenv("TOKEN_STORE_PATH", "data/tokens.sqlite3"))
+        legacy = FileTokenBackend("data")
+    else:
+        raise ValueError(f"Unknown token store: {kind}")
+    return TokenStore(
+        backend,
+        scopes,
+        refresh_ahead=refresh_ahead,
+        idle_ttl=float(os.getenv("TOKEN_CACHE_TTL", "900")),
+        legacy=legacy,
+    )
@@ -0,0 +1,174 @@
+import zlib
+from typing import Callable, Optional
+
+from starlette.datastructures import Headers
+from starlette.exceptions import HTTPException
+from starlette.responses import PlainTextResponse
+
+try:
+    from orjson import dumps as _dumps
+except ImportError:  # orjson is optional
+    import json
+
+    def _dumps(value) -> bytes:
+        return json.dumps(value, ensure_ascii=False).encode("utf-8")
+
+MSGPACK_TYPES = ("application/msgpack", "application/x-msgpack", "application/vnd.msgpack")
+ENCODINGS = ("gzip", "zstd", "identity")
+# Largest zstd block, and the fewest input bytes that can encode one (3-byte header + 1 RLE byte)
+ZSTD_BLOCK = 128 * 1024
+ZSTD_MIN_BLOCK_INPUT = 4
+# Caps the decoder's own memory; covers every standard compression level
+ZSTD_MAX_WINDOW = 8 * 1024 * 1024
+
+
+class _Decoder:
+    """Incremental decompressor that refuses to expand past `limit` bytes."""
+
+    def __init__(self, encoding: str, limit: int):
+        self.encoding = encoding
+        self.limit = limit
+        self.size = 0
+        self._obj = None
+        self._errors: tuple = (zlib.error,)
+        if encoding == "gzip":
+            self._obj = zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)
+        elif encoding == "zstd":
+            import zstandard
+
+            self._obj = zstandard.ZstdDecompressor(max_window_size=ZSTD_MAX_WINDOW).decompressobj()
+            self._errors = (zstandard.ZstdError,)
+
+    def _count(self, data: bytes) -> bytes:
+        self.size += len(data)
+        if self.size > self.limit:
+            raise HTTPException(status_code=413, detail=f"Request body exceeds {self.limit} bytes")
+        return data
+
+    def decompress(self, chunk: bytes) -> bytes:
+        if self._obj is None:
+            return self._count(chunk)
+        try:
+            if self.encoding == "gzip":
+                # Bounded so a small compressed body cannot balloon in memory before the check
+                return self._count(self._obj.decompress(chunk, self.limit - self.size + 1))
+            return self._zstd(chunk)
+        except self._errors as e:
+            raise HTTPException(status_code=400, detail=f"Invalid {self.encoding} body: {e}") from e
+
+    def _zstd(self, chunk: bytes) -> bytes:
+        # zstd decompressobj has no output bound, so feed it slices small enough that even
+        # all-RLE input cannot expand much past what is left of the limit before the check
+        out = []
+        view = memoryview(chunk)
+        while view:
+            step = ZSTD_MIN_BLOCK_INPUT * max(1, (self.limit - self.size) // ZSTD_BLOCK)
+            out.append(self._count(self._obj.decompress(view[:step])))
+            view = view[step:]
+        return b"".join(out)
+
+    def flush(self) -> bytes:
+        if self.encoding != "gzip":
+            return b""
+        return self._count(self._obj.flush())
+
+
+def msgpack_to_json(body: bytes) -> bytes:
+    try:
+        import msgpack
+    except ImportError as e:
+        raise HTTPException(status_code=415, detail="msgpack bodies need the `msgpack` package on the server") from e
+    try:
+        return _dumps(msgpack.unpackb(body, raw=False))
+    except (ValueError, msgpack.ExtraData, msgpack.FormatError, msgpack.StackError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid msgpack body: {e}") from e
+
+
+class DecodeBodyMiddleware:
+    """Accepts gzip/zstd `Content-Encoding` and msgpack request bodies on top of plain JSON.
+
+    Compressed bodies are inflated chunk by chunk as the app reads them, so only the decoded
+    body is ever held in memory. msgpack bodies are rewritten to JSON for the JSON endpoints.
+    """
+
+    def __init__(self, app, max_body: int = 32 * 1024 * 1024):
+        self.app = app
+        self.max_body = max_body
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        headers = Headers(scope=scope)
+        encoding = headers.get("content-encoding", "identity").strip().lower() or "identity"
+        content_type = headers.get("content-type", "").split(";")[0].strip().lower()
+        msgpack_body = content_type in MSGPACK_TYPES
+        if encoding == "identity" and not msgpack_body:
+            return await self.app(scope, receive, send)
+
+        if encoding not in ENCODINGS:
+            response = PlainTextResponse(f"Unsupported Content-Encoding: {encoding}", status_code=415)
+            return await response(scope, receive, send)
+        if encoding == "zstd" and not _has_zstd():
+            response = PlainTextResponse("zstd bodies need the `zstandard` package on the server", status_code=415)
+            return await response(scope, receive, send)
+
+        # Downstream sees a plain (JSON) body of unknown length
+        replaced = {b"content-encoding", b"content-length"} | ({b"content-type"} if msgpack_body else set())
+        raw_headers = [(k, v) for k, v in scope["headers"] if k not in replaced]
+        if msgpack_body:
+            raw_headers.append((b"content-type", b"application/json"))
+        scope = {**scope, "headers": raw_headers}
+
+        decoder = _Decoder(encoding, self.max_body)
+        receive = _msgpack_receive(receive, decoder) if msgpack_body else _streaming_receive(receive, decoder)
+        await self.app(scope, receive, send)
+
+
+def _has_zstd() -> bool:
+    try:
+        import zstandard  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _streaming_receive(receive: Callable, decoder: _Decoder) -> Callable:
+    done = False
+
+    async def wrapped():
+        nonlocal done
+        if done:
+            return await receive()
+        message = await receive()
+        if message["type"] != "http.request":
+            return message
+        body = decoder.decompress(message.get("body", b""))
+        more = message.get("more_body", False)
+        if not more:
+            body += decoder.flush()
+            done = True
+        return {"type": "http.request", "body": body, "more_body": more}
+
+    return wrapped
+
+
+def _msgpack_receive(receive: Callable, decoder: _Decoder) -> Callable:
+    body: Optional[bytes] = None
+
+    async def wrapped():
+        nonlocal body
+        if body is not None:
+            return await receive()
+        parts = []
+        while True:
+            message = await receive()
+            if message["type"] != "http.request":
+                return message
+            parts.append(decoder.decompress(message.get("body", b"")))
+            if not message.get("more_body", False):
+                break
+        parts.append(decoder.flush())
+        body = msgpack_to_json(b"".join(parts))
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    return wrapped